@@ -11,6 +11,8 @@ import padloper as p
 import json
 from datetime import datetime
 from urllib.parse import unquote
+import os
+import threading
 
 # The flask application
 app = Flask(__name__)
@@ -21,6 +23,38 @@ print("=================================")
 
 p.set_user("test")
 
+# Hold all the component/property/flag types in memory. With gunicorn
+# --preload, this runs once in the master, whose connection is then closed so
+# that it does not hold a websocket for its whole life nor pass it on to the
+# workers, which open their own on first use.
+p.preload_types()
+p.end_connection()
+
+# The process whose background threads have been started.
+_background_pid = None
+_background_lock = threading.Lock()
+
+@app.before_request
+def start_background_threads():
+    """Start, once per process, the periodic refresh of the types, to pick up
+    changes made by other workers, and the health checks that reopen dead
+    connections. This is done on the first request rather than at import, so
+    that with gunicorn --preload the threads run in each worker rather than
+    in the master.
+    """
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _background_lock:
+        if _background_pid != os.getpid():
+            p.start_type_refresh(
+                float(os.environ.get('PADLOPER_TYPE_REFRESH', 300))
+            )
+            p.connection_pool().start_health_checks(
+                float(os.environ.get('PADLOPER_HEALTH_CHECK', 30))
+            )
+            _background_pid = os.getpid()
+
 def tmp_timestamp(t, uid, comments):
     print("Note: needs to be replaced with proper user registration.")
     return p.Timestamp.__raw_init__(t, uid, int(time.time()), comments)
@@ -73,14 +107,22 @@ def get_component_by_name(name):
     """Given a name of a component, return a dictionary containing the
     dictionary representation of the component in its 'result' field.
 
+    The URL parameters are:
+
+    time - only include the properties, connections and flags in effect at
+    this time; optional.
+
     :param name: The component name
     :type name: str
     :return: Return a dictionary with a key/value pair of 'result' and the
     dictionary representation of the component with said name
     :rtype: dict
     """
+    val_time = request.args.get('time')
+    at_time = int(escape(val_time)) if val_time is not None else None
     return {
-        'result': p.Component.from_db(str(escape(name))).as_dict()
+        'result': p.Component.from_db(str(escape(name)), depth=2)\
+                   .as_dict(at_time=at_time)
     }
 
 
@@ -139,6 +181,7 @@ def get_component_list():
             range=range_bounds,
             order_by=[(order_by, order_direction)],
             filters=filt,
+            depth=2
         )
     
         return {'result': [c.as_dict(bare=True) for c in components]}
@@ -172,7 +215,7 @@ def set_component_type():
         # Need to initialize an instance of a component type first.
         component_type = p.ComponentType(name=val_name, comments=val_comments)
 
-        component_type.add()
+        component_type.upsert()
 
         return {'result': True}
 
@@ -252,7 +295,7 @@ def set_component_version():
         component_version = p.ComponentVersion(
             name=val_name, type=component_type, comments=val_comments)
 
-        component_version.add()
+        component_version.upsert()
 
         return {'result': True}
 
@@ -354,12 +397,11 @@ def set_component():
         else:
             component_version = None
 
-        for name in val_name:
-            # Need to initialize an instance of a component first.
-            component = p.Component(name=name, type=component_type,
-                                    version=component_version)
-            component.add()
-
+        # Need to initialize the instances of the components first.
+        components = [p.Component(name=name, type=component_type,
+                                  version=component_version)
+                      for name in val_name]
+        p.Component.add_many(components)
 
         return {'result': True}
     except Exception as e:
@@ -491,7 +533,7 @@ def set_property_type():
                                        n_values=int(val_values), 
                                        allowed_types=allowed_list,
                                        comments=val_comments)
-        property_type.add()
+        property_type.upsert()
 
         return {'result': True}
 
@@ -1214,6 +1256,105 @@ def get_connections():
         ]
     }
 
+@app.route("/api/trace_chain")
+def trace_chain():
+    """Given a component name and a time, follow its connections at that time
+    to the ends of the chain(s) it is part of.
+
+    The URL parameters are:
+
+    name - the name of the component to start from.
+
+    time - the time to follow the connections at.
+
+    depth - the maximum number of hops; defaults to 20.
+
+    stop_types - the component types at which to stop, of the form
+    "<str>;<str>;...;<str>"; optional.
+
+    :return: Return a dictionary with a key 'result' and value being a
+    dictionary with the keys 'components', a dictionary of the (bare)
+    dictionary representations of the components on the paths keyed by name,
+    and 'paths', a list of paths, each a dictionary with the list of component
+    names 'components' in order from the starting component, and the list of
+    'connections' between them.
+    :rtype: dict
+    """
+    try:
+        val_name = escape(request.args.get('name'))
+        val_time = int(escape(request.args.get('time')))
+        val_depth = int(escape(request.args.get('depth', 20)))
+        val_stop_types = request.args.get('stop_types')
+
+        stop_types = escape(val_stop_types).split(';') \
+                     if val_stop_types else None
+
+        c = p.Component.from_db(val_name)
+
+        paths = c.trace_chain(at_time=val_time, max_depth=val_depth,
+                              stop_types=stop_types)
+
+        components = {}
+        for comps, conns in paths:
+            for comp in comps:
+                if comp.name not in components:
+                    components[comp.name] = comp.as_dict(bare=True)
+
+        return {
+            'result': {
+                'components': components,
+                'paths': [
+                    {
+                        'components': [comp.name for comp in comps],
+                        'connections': [
+                            {**conn.as_dict(), 'id': conn.id()}
+                            for conn in conns
+                        ]
+                    }
+                    for comps, conns in paths
+                ]
+            }
+        }
+
+    except Exception as e:
+        print(e)
+        return {'error': json.dumps(e, default=str)}
+
+
+@app.route("/api/connection_graph")
+def connection_graph():
+    """Given a component name, a time and a depth, return all the components
+    within that many hops of the component along connections and subcomponent
+    relations at that time, and the edges between them.
+
+    The URL parameters are:
+
+    name - the name of the component at the centre.
+
+    time - the time to check the connections at.
+
+    depth - the maximum number of hops; defaults to 1.
+
+    :return: Return a dictionary with a key 'result' and value being a
+    dictionary with the keys 'nodes' and 'edges', as returned by
+    Component.connection_graph().
+    :rtype: dict
+    """
+    try:
+        val_name = escape(request.args.get('name'))
+        val_time = int(escape(request.args.get('time')))
+        val_depth = int(escape(request.args.get('depth', 1)))
+
+        c = p.Component.from_db(val_name)
+
+        return {'result': c.connection_graph(at_time=val_time,
+                                             depth=val_depth)}
+
+    except Exception as e:
+        print(e)
+        return {'error': json.dumps(e, default=str)}
+
+
 @app.route("/api/get_subcomponents", methods=['GET'])
 def get_subcomponents():
     """Given a component name, return the names of all subcomponents of the component.
@@ -1330,7 +1471,7 @@ def set_flag_type():
 
         # Need to initialize an instance of a component version first.
         flag_type = p.FlagType(name=val_name, comments=val_comments)
-        flag_type.add()
+        flag_type.upsert()
 
         return {'result': True}
 
@@ -1389,7 +1530,7 @@ def set_flag_severity():
 
         # Need to initialize an instance of a component version first.
         flag_severity = p.FlagSeverity(val_name)
-        flag_severity.add()
+        flag_severity.upsert()
 
         return {'result': True}
     
@@ -1902,3 +2043,15 @@ def set_user():
     user.add()
 
     return {'result': True}
+
+
+@app.route("/api/cache_stats")
+def get_cache_stats():
+    """Return a dictionary with a key 'result' and corresponding value being
+    the counters and sizes of the vertex cache of this worker.
+
+    :return: A dictionary with a key 'result' and corresponding value being
+    the dictionary returned by padloper.cache_stats().
+    :rtype: dict
+    """
+    return {'result': p.cache_stats()}
@@ -12,13 +12,13 @@ start = mgmt.makePropertyKey('start_time').dataType(Long.class).make()
 end = mgmt.makePropertyKey('end_time').dataType(Long.class).make()
 mgmt.makePropertyKey('start_uid').dataType(String.class).make()
 mgmt.makePropertyKey('start_comments').dataType(String.class).make()
-mgmt.makePropertyKey('start_edit_time').dataType(Long.class).make()
+startEdit = mgmt.makePropertyKey('start_edit_time').dataType(Long.class).make()
 mgmt.makePropertyKey('end_uid').dataType(String.class).make()
 mgmt.makePropertyKey('end_comments').dataType(String.class).make()
-mgmt.makePropertyKey('end_edit_time').dataType(Long.class).make()
-mgmt.makePropertyKey('time_added').dataType(Long.class).make()
+endEdit = mgmt.makePropertyKey('end_edit_time').dataType(Long.class).make()
+added = mgmt.makePropertyKey('time_added').dataType(Long.class).make()
 mgmt.makePropertyKey('uid_added').dataType(String.class).make()
-mgmt.makePropertyKey('time_disabled').dataType(Long.class).make()
+disabled = mgmt.makePropertyKey('time_disabled').dataType(Long.class).make()
 mgmt.makePropertyKey('uid_disabled').dataType(String.class).make()
 mgmt.makePropertyKey('replacement').dataType(String.class).make()
 mgmt.makePropertyKey('comments').dataType(String.class).make()
@@ -29,7 +29,7 @@ mgmt.makePropertyKey('values').dataType(String.class).cardinality(Cardinality.LI
 
 // Edges
 connection = mgmt.makeEdgeLabel("rel_connection").make()
-mgmt.makeEdgeLabel("rel_property").make()
+property = mgmt.makeEdgeLabel("rel_property").make()
 mgmt.makeEdgeLabel("rel_version").make()
 mgmt.makeEdgeLabel("rel_version_allowed_type").make()
 mgmt.makeEdgeLabel("rel_component_type").make()
@@ -51,6 +51,12 @@ mgmt.buildIndex('byCategoryAndActiveComposite', Vertex.class).addKey(category).a
 mgmt.buildIndex('byCategoryAndActiveAndNameComposite', Vertex.class).addKey(category).addKey(active).addKey(name).buildCompositeIndex()
 mgmt.buildIndex('byCategoryAndNameMixed', Vertex.class).addKey(category).addKey(name).buildMixedIndex("search")
 mgmt.buildIndex('startAndEndMixed', Edge.class).addKey(start).addKey(end).indexOnly(connection).buildMixedIndex("search")
+// For finding the properties and flags that start or end in a time range.
+mgmt.buildIndex('propertyStartAndEndMixed', Edge.class).addKey(start).addKey(end).indexOnly(property).buildMixedIndex("search")
+mgmt.buildIndex('flagStartAndEndMixed', Vertex.class).addKey(start).addKey(end).buildMixedIndex("search")
+// For finding what was edited since a given time.
+mgmt.buildIndex('editTimesMixed', Vertex.class).addKey(added).addKey(disabled).addKey(startEdit).addKey(endEdit).buildMixedIndex("search")
+mgmt.buildIndex('editTimesMixedEdge', Edge.class).addKey(added).addKey(disabled).addKey(startEdit).addKey(endEdit).buildMixedIndex("search")
 mgmt.buildIndex('byActiveCompositeEdge', Edge.class).addKey(active).buildCompositeIndex()
 mgmt.commit()
 
@@ -61,6 +67,10 @@ mgmt.updateIndex(mgmt.getGraphIndex("byActiveCompositeEdge"), SchemaAction.REIND
 mgmt.updateIndex(mgmt.getGraphIndex("byCategoryComposite"), SchemaAction.REINDEX).get()
 mgmt.updateIndex(mgmt.getGraphIndex("byCategoryAndNameMixed"), SchemaAction.REINDEX).get()
 mgmt.updateIndex(mgmt.getGraphIndex("startAndEndMixed"), SchemaAction.REINDEX).get()
+mgmt.updateIndex(mgmt.getGraphIndex("propertyStartAndEndMixed"), SchemaAction.REINDEX).get()
+mgmt.updateIndex(mgmt.getGraphIndex("flagStartAndEndMixed"), SchemaAction.REINDEX).get()
+mgmt.updateIndex(mgmt.getGraphIndex("editTimesMixed"), SchemaAction.REINDEX).get()
+mgmt.updateIndex(mgmt.getGraphIndex("editTimesMixedEdge"), SchemaAction.REINDEX).get()
 mgmt.updateIndex(mgmt.getGraphIndex("byNameAndActiveComposite"),SchemaAction.REINDEX).get()
 mgmt.updateIndex(mgmt.getGraphIndex("byCategoryAndActiveComposite"),SchemaAction.REINDEX).get()
 mgmt.updateIndex(mgmt.getGraphIndex("byCategoryAndActiveAndNameComposite"),SchemaAction.REINDEX).get()
@@ -1,7 +1,11 @@
 # For relative imports to work in Python 3.6
 # https://stackoverflow.com/a/49375740
 import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+from _audit import *
 from _base import *
+from _bulk import *
+from _cache import *
+from _changes import *
 #from _base import _RawTimestamp
 from _component_nodes import *
 from _edges import *
@@ -9,4 +13,7 @@ from _exceptions import *
 from _flag_nodes import *
 from _global import *
 from _permissions import *
+from _pool import *
 from _property_nodes import *
+from _registry import *
+from _snapshot import *
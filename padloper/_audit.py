@@ -0,0 +1,228 @@
+"""
+_audit.py
+
+Offline checks of the invariants that the rest of padloper assumes, such as a
+pair of components having at most one connection at a time, over the whole
+DB.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gremlin_python.process.graph_traversal import __
+
+import _global as g
+from _component_nodes import ComponentType, ComponentVersion, Component
+from _edges import RelationConnection, RelationProperty, RelationPropertyType
+from _flag_nodes import FlagType, FlagSeverity
+from _property_nodes import PropertyType
+
+# The kinds of problem that the audit reports.
+AUDIT_CHECKS = ["duplicate_names", "overlapping_connections",
+                "overlapping_properties", "dangling_connections",
+                "dangling_properties"]
+
+# The vertex classes whose active vertices must have unique names.
+_NAMED_CLASSES = [ComponentType, ComponentVersion, Component, PropertyType,
+                  FlagType, FlagSeverity]
+
+class AuditReport(object):
+    """The problems found by an audit.
+
+    :ivar components: The number of components scanned.
+    :ivar edges: The number of connections and properties scanned.
+    :ivar issues: A list of dictionaries, one per problem, each with the key
+        "check" set to one of `AUDIT_CHECKS`, and the IDs and names needed to
+        find the offending vertices and edges.
+    :ivar elapsed: The number of seconds the audit took.
+    """
+
+    def __init__(self):
+        self.components = 0
+        self.edges = 0
+        self.issues = []
+        self.elapsed = 0.0
+
+    def ok(self):
+        """Return whether no problems were found."""
+        return len(self.issues) == 0
+
+    def counts(self):
+        """Return the number of problems found by each check."""
+        ret = {c: 0 for c in AUDIT_CHECKS}
+        for issue in self.issues:
+            ret[issue["check"]] += 1
+        return ret
+
+    def as_dict(self):
+        """Return a dictionary representation."""
+        return {
+            "components": self.components,
+            "edges": self.edges,
+            "elapsed": self.elapsed,
+            "counts": self.counts(),
+            "issues": self.issues
+        }
+
+    def to_json(self, **kwargs):
+        """Return the report as JSON; the keyword arguments are passed on to
+        json.dumps().
+        """
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def __str__(self):
+        s = "%d components and %d edges audited in %.1f s: %d problems." %\
+            (self.components, self.edges, self.elapsed, len(self.issues))
+        for check, n in self.counts().items():
+            if n > 0:
+                s += "\n  %s: %d" % (check, n)
+        return s
+
+def audit(workers: int = 8, partition_size: int = 1000,
+          batch_size: int = 10000):
+    """Check the whole DB for:
+
+    - active vertices of the same category with the same name;
+    - connections between the same two components whose time intervals
+      overlap;
+    - properties of the same type on the same component whose time intervals
+      overlap;
+    - active connections to inactive components, and active properties whose
+      property vertex or property type is inactive.
+
+    The components are split into partitions of consecutive IDs, whose
+    connections and properties are scanned in parallel, one traversal per
+    partition.
+
+    :param workers: The number of partitions scanned at the same time.
+    :type workers: int
+    :param partition_size: The number of components in each partition.
+    :type partition_size: int
+    :param batch_size: The number of results the server sends per message.
+    :type batch_size: int
+
+    :rtype: AuditReport
+    """
+    report = AuditReport()
+    start = time.time()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        names = dict(zip(_NAMED_CLASSES,
+                         pool.map(lambda c: _scan_names(c, batch_size),
+                                  _NAMED_CLASSES)))
+        for cls, vertices in names.items():
+            report.issues.extend(_duplicate_names(cls, vertices))
+
+        ids = sorted(i for i, _ in names[Component])
+        report.components = len(ids)
+        partitions = [ids[i:i + partition_size] \
+                      for i in range(0, len(ids), partition_size)]
+        for n_edges, issues in pool.map(
+                lambda p: _scan_partition(p, batch_size), partitions):
+            report.edges += n_edges
+            report.issues.extend(issues)
+
+    report.elapsed = time.time() - start
+    return report
+
+def _scan_names(cls, batch_size):
+    """Return the (ID, name) of all the active vertices of class :param cls:.
+    """
+    q = g.t.V().has("category", cls.category).has("active", True) \
+           .project("id", "name").by(__.id_()).by(__.values("name"))
+    return [(r["id"], r["name"]) for r in g._stream_traversal(q, batch_size)]
+
+def _duplicate_names(cls, vertices):
+    """Return the issues for the names used by more than one of
+    :param vertices:.
+    """
+    by_name = {}
+    for i, name in vertices:
+        by_name.setdefault(name, []).append(i)
+    return [{"check": "duplicate_names", "category": cls.category,
+             "name": name, "ids": sorted(ids)} \
+            for name, ids in by_name.items() if len(ids) > 1]
+
+def _overlaps(intervals):
+    """Return the pairs of IDs of :param intervals:, a list of
+    (start, end, ID), whose intervals overlap.
+    """
+    ret = []
+    intervals = sorted(intervals)
+    for n, (s, e, i) in enumerate(intervals):
+        for s2, e2, i2 in intervals[n + 1:]:
+            if s2 >= e:
+                break
+            ret.append([i, i2])
+    return ret
+
+def _edge_id(e):
+    return e["@value"]["relationId"]
+
+def _scan_partition(ids, batch_size):
+    """Check the connections and properties of the components with IDs
+    :param ids:.
+
+    :return: The number of edges scanned, and the issues found.
+    :rtype: tuple[int, list[dict]]
+    """
+    q = g.t.V(*ids) \
+           .project("id", "name", "conns", "props") \
+           .by(__.id_()).by(__.values("name")) \
+           .by(__.bothE(RelationConnection.category).has("active", True) \
+                 .project("e", "o", "on", "oa", "s", "t") \
+                 .by(__.id_()).by(__.otherV().id_()) \
+                 .by(__.otherV().values("name")) \
+                 .by(__.otherV().values("active")) \
+                 .by(__.values("start_time")).by(__.values("end_time")) \
+                 .fold()) \
+           .by(__.outE(RelationProperty.category).has("active", True) \
+                 .project("e", "p", "pa", "ty", "s", "t") \
+                 .by(__.id_()).by(__.inV().id_()) \
+                 .by(__.inV().values("active")) \
+                 .by(__.inV().out(RelationPropertyType.category) \
+                       .has("active", True).values("name").fold()) \
+                 .by(__.values("start_time")).by(__.values("end_time")) \
+                 .fold())
+
+    n_edges = 0
+    issues = []
+    for r in g._stream_traversal(q, batch_size):
+        comp = {"id": r["id"], "name": r["name"]}
+
+        pairs = {}
+        for c in r["conns"]:
+            if not c["oa"]:
+                issues.append({"check": "dangling_connections",
+                               "component": comp, "edge": _edge_id(c["e"]),
+                               "other": {"id": c["o"], "name": c["on"]}})
+            # Each connection is seen from both of its components, so only
+            # count and check it from the one with the smaller ID, unless the
+            # other one is inactive and therefore not scanned.
+            if c["o"] > r["id"] or not c["oa"]:
+                n_edges += 1
+                pairs.setdefault((c["o"], c["on"]), []) \
+                     .append((c["s"], c["t"], _edge_id(c["e"])))
+        for (o, on), intervals in pairs.items():
+            for edges in _overlaps(intervals):
+                issues.append({"check": "overlapping_connections",
+                               "components": [comp, {"id": o, "name": on}],
+                               "edges": edges})
+
+        types = {}
+        for p in r["props"]:
+            n_edges += 1
+            if not p["pa"] or len(p["ty"]) != 1:
+                issues.append({"check": "dangling_properties",
+                               "component": comp, "edge": _edge_id(p["e"]),
+                               "property": p["p"]})
+                continue
+            types.setdefault(p["ty"][0], []) \
+                 .append((p["s"], p["t"], _edge_id(p["e"])))
+        for ty, intervals in types.items():
+            for edges in _overlaps(intervals):
+                issues.append({"check": "overlapping_properties",
+                               "component": comp, "property_type": ty,
+                               "edges": edges})
+
+    return n_edges, issues
@@ -50,6 +50,39 @@ def set_user(uid):
     g._user = dict()
     g._user["id"] = uid
 
+def set_vertex_cache(cache):
+    """Replace the cache of vertices read from the DB, e.g., to change its
+    limits.
+
+    :param cache: The new cache; it should behave like VertexCache.
+    :type cache: VertexCache
+    """
+    g._vertex_cache = cache
+
+def cache_stats():
+    """Return the hit/miss/eviction counters and sizes of the vertex cache.
+
+    :return: See VertexCache.stats().
+    :rtype: dict
+    """
+    return g._vertex_cache.stats()
+
+def set_interval_index(index):
+    """Start or stop answering time queries on connections and properties
+    from a client-side index of their intervals.
+
+    :param index: The index, e.g., IntervalIndex(), or None to stop using one.
+    :type index: IntervalIndex or None
+    """
+    g._interval_index = index
+
+def _invalidate_intervals(*ids):
+    """Drop the intervals of the vertices with IDs :param ids: from the
+    interval index, if there is one, because their edges changed.
+    """
+    if g._interval_index is not None:
+        g._interval_index.invalidate(*ids)
+
 def _get_user():
     try:
         return g._user["id"]
@@ -69,6 +102,34 @@ def _parse_time(t):
             return t
     raise RuntimeError("Should not have reached here!")
 
+def _copy_edges(edges, new_id, outgoing):
+    """Return an anonymous traversal that, from a vertex, re-creates the edges
+    selected by :param edges: on the vertex with ID :param new_id:, with the
+    same label, other endpoint and properties.
+
+    :param edges: An anonymous traversal selecting edges of the vertex.
+    :param new_id: The ID of the vertex to copy the edges to.
+    :param outgoing: Whether the edges are outgoing (True) or incoming (False)
+        edges of the vertex.
+    """
+    t = edges.as_('e')
+    if outgoing:
+        t = t.inV().as_('o').V(new_id).addE(__.select('e').label()).to('o')
+    else:
+        t = t.outV().as_('o').V(new_id).addE(__.select('e').label()).from_('o')
+    return t.as_('ne').select('e').properties().as_('p') \
+            .select('ne').property(__.select('p').key(), __.select('p').value())
+
+def _edge_properties(t, category, time_added):
+    """Append to the edge-creating traversal :param t: the properties that
+    every edge gets when it is added, and return it.
+    """
+    return t.property('category', category) \
+            .property('time_added', time_added) \
+            .property('time_disabled', g._TIMESTAMP_NO_EDITTIME_VALUE) \
+            .property('active', True) \
+            .property('replacement', 0)
+
 class Element(object):
     """
     The simplest element. Contains an ID.
@@ -175,6 +236,8 @@ class Vertex(Element):
     category: str = None
     primary_attr: str = None
     _vertex_attrs: list = []
+    # Whether instances stay in the vertex cache rather than being evicted.
+    _cache_pinned: bool = False
 
     time_added: int
     uid_added: str
@@ -186,10 +249,13 @@ class Vertex(Element):
     def __new__(cls, _id: int = g._VIRTUAL_ID_PLACEHOLDER, 
                  _time_added: int = g._TIMESTAMP_NO_EDITTIME_VALUE,
                  _uid_added: str = None, **kwargs):
-        if _id is not g._VIRTUAL_ID_PLACEHOLDER and _id in g._vertex_cache:
-            return g._vertex_cache[_id]
-        else:
-            return object.__new__(cls)
+        # A single lookup, since another thread may evict the vertex between
+        # a membership test and a read.
+        if _id is not g._VIRTUAL_ID_PLACEHOLDER:
+            vertex = g._vertex_cache.peek(_id)
+            if vertex is not None:
+                return vertex
+        return object.__new__(cls)
 
     def __init__(self, _id: int = g._VIRTUAL_ID_PLACEHOLDER, 
                  _time_added: int = g._TIMESTAMP_NO_EDITTIME_VALUE,
@@ -250,8 +316,15 @@ class Vertex(Element):
         pass
 
     @classmethod
-    def _attrs_query(cls, d, allow_disabled):
-        """Helper class for from_db() and from_id()."""
+    def _attrs_query(cls, d, allow_disabled, depth=0):
+        """Helper class for from_db() and from_id().
+
+        :param depth: If greater than zero, then instead of only projecting the
+            IDs of linked vertices, inline their full attribute projection,
+            recursing this many levels deep. The resulting query is larger, but
+            no follow-up queries are needed to build the linked vertices.
+        :type depth: int
+        """
         projector = []
         for a in cls._vertex_attrs:
             if issubclass(a.type, Timestamp):
@@ -265,15 +338,21 @@ class Vertex(Element):
         if not allow_disabled:
             d = d.has("active", True)
         d = d.project("id", "time_added", "uid_added", "time_disabled",
-                      "uid_disabled", *projector)\
+                      "uid_disabled", "active", "replacement", *projector)\
              .by(__.id_())\
              .by(__.values("time_added"))\
              .by(__.values("uid_added"))\
              .by(__.values("time_disabled"))\
-             .by(__.values("uid_disabled"))
+             .by(__.values("uid_disabled"))\
+             .by(__.values("active"))\
+             .by(__.values("replacement"))
         for a in cls._vertex_attrs:
             if issubclass(a.type, Vertex):
-                if allow_disabled:
+                if depth > 0:
+                    d = d.by(a.type._attrs_query(
+                                __.both(a.edge_class.category),
+                                allow_disabled, depth - 1).fold())
+                elif allow_disabled:
                     d = d.by(__.both(a.edge_class.category).id_().fold())
                 else:
                     d = d.by(__.both(a.edge_class.category) \
@@ -291,7 +370,8 @@ class Vertex(Element):
         return d
 
     @classmethod
-    def from_db(cls, primary_attr: str, allow_disabled: bool = False):
+    def from_db(cls, primary_attr: str, allow_disabled: bool = False,
+                depth: int = 0):
         """Query the database and return an instance of the Vertex by searching
         for its primary attribute (typically "name").
         
@@ -300,25 +380,76 @@ class Vertex(Element):
         :type primary_attr: str
         :param allow_disabled: Whether to only select vertices with active=True.
         :type allow_disabled: bool
+        :param depth: How many levels of linked vertices to fetch in the same
+            query; see _attrs_query().
+        :type depth: int
 
         :return: The vertex.
         :rtype: Vertex subclass.
 
         """
+        # Active vertices can be served from the vertex cache; disabled ones
+        # are not indexed by name, so they always need a query.
+        if not allow_disabled:
+            vertex = g._vertex_cache.find_name(cls.category, primary_attr)
+            if vertex is not None:
+                return vertex
+            if g._vertex_cache.is_known_missing(cls.category, primary_attr):
+                raise NotInDatabase("Could not find %s in the DB." %\
+                                    primary_attr)
+
         d = g.t.V()\
              .has("category", cls.category)\
              .has(cls.primary_attr, primary_attr)
-        d = cls._attrs_query(d, allow_disabled)
+        d = cls._attrs_query(d, allow_disabled, depth)
         try:
             d = d.next()
         except StopIteration:
+            if not allow_disabled:
+                g._vertex_cache.mark_missing(cls.category, primary_attr)
             raise NotInDatabase("Could not find %s in the DB." %\
                                 primary_attr)
 
-        return cls._from_attrs(d) 
+        return cls._from_attrs_list([d], allow_disabled)[0]
 
     @classmethod
-    def from_id(cls, id: int, allow_disabled: bool = False):
+    def from_db_many(cls, primary_attrs: list, allow_disabled: bool = False,
+                     depth: int = 0):
+        """Query the database and return instances of the Vertex for each of
+        the primary attributes (typically "name") in :param primary_attrs:,
+        using a single query.
+
+        :param primary_attrs: The primary attribute names of the vertices
+            serverside.
+        :type primary_attrs: list[str]
+        :param allow_disabled: Whether to only select vertices with active=True.
+        :type allow_disabled: bool
+        :param depth: How many levels of linked vertices to fetch in the same
+            query; see _attrs_query().
+        :type depth: int
+
+        :return: The vertices, in the same order as :param primary_attrs:.
+        :rtype: list[Vertex subclass]
+        """
+        if len(primary_attrs) == 0:
+            return []
+
+        d = g.t.V()\
+             .has("category", cls.category)\
+             .has(cls.primary_attr, P.within(*set(primary_attrs)))
+        d = cls._attrs_query(d, allow_disabled, depth)
+        found = {getattr(v, cls.primary_attr): v \
+                 for v in cls._from_attrs_list(d.toList(), allow_disabled)}
+
+        missing = [pa for pa in primary_attrs if pa not in found]
+        if len(missing) > 0:
+            raise NotInDatabase("Could not find %s in the DB." %\
+                                ", ".join(missing))
+
+        return [found[pa] for pa in primary_attrs]
+
+    @classmethod
+    def from_id(cls, id: int, allow_disabled: bool = False, depth: int = 0):
         """Query the database and return a Vertex subclass instance based on
         the ID.
 
@@ -327,20 +458,101 @@ class Vertex(Element):
         :return: Return a Vertex subclass instance from that ID.
         :param allow_disabled: Whether to only select vertices with active=True.
         :type allow_disabled: bool
+        :param depth: How many levels of linked vertices to fetch in the same
+            query; see _attrs_query().
+        :type depth: int
 
         :rtype: Vertex subclass
         """
-        if id not in g._vertex_cache:
+        vertex = g._vertex_cache.get(id)
+        if vertex is None:
             d = g.t.V(id)
-            d = cls._attrs_query(d, allow_disabled)
+            d = cls._attrs_query(d, allow_disabled, depth)
             try:
                 d = d.next()
             except StopIteration:
                 raise NotInDatabase
 
-            return cls._from_attrs(d)
+            return cls._from_attrs_list([d], allow_disabled)[0]
         else:
-            return g._vertex_cache[id]
+            return vertex
+
+    @classmethod
+    def from_ids(cls, ids: list, allow_disabled: bool = False,
+                 depth: int = 0):
+        """Query the database and return Vertex subclass instances based on
+        their IDs. Only the vertices not already in the vertex cache are
+        queried, and they are all fetched in a single query.
+
+        :param ids: The serverside IDs of the vertices.
+        :type ids: list[int]
+        :param allow_disabled: Whether to only select vertices with active=True.
+        :type allow_disabled: bool
+        :param depth: How many levels of linked vertices to fetch in the same
+            query; see _attrs_query().
+        :type depth: int
+
+        :return: The vertices, in the same order as :param ids:.
+        :rtype: list[Vertex subclass]
+        """
+        found = {}
+        for i in dict.fromkeys(ids):
+            vertex = g._vertex_cache.get(i)
+            if vertex is not None:
+                found[i] = vertex
+
+        missing = [i for i in dict.fromkeys(ids) if i not in found]
+        if len(missing) > 0:
+            d = cls._attrs_query(g.t.V(*missing), allow_disabled, depth)
+            for vertex in cls._from_attrs_list(d.toList(), allow_disabled):
+                found[vertex.id()] = vertex
+
+        try:
+            return [found[i] for i in ids]
+        except KeyError as e:
+            raise NotInDatabase("Could not find %s with ID %s in the DB." %\
+                                (cls.__name__, e.args[0]))
+
+    @classmethod
+    def _from_attrs_list(cls, attrs_list, allow_disabled: bool = False):
+        """Create Vertex instances from a list of query results.
+
+        Before any instance is created, the IDs of all the linked vertices
+        that are not yet cached are collected and fetched with one query per
+        vertex class, so that building a page of results costs a fixed number
+        of queries rather than one per linked vertex. Linked vertices that
+        were projected inline (see the depth parameter of _attrs_query()) are
+        built directly, without querying.
+
+        :param attrs_list: The attributes as returned by _attrs_query().
+        :type attrs_list: list[dict]
+        :param allow_disabled: The value passed to _attrs_query(), which is
+            also used when fetching the links of the linked vertices.
+        :type allow_disabled: bool
+
+        :return: The vertices
+        :rtype: list[Vertex or one of its subclasses]
+        """
+        missing = {}
+        inline = {}
+        for attrs in attrs_list:
+            for a in cls._vertex_attrs:
+                if issubclass(a.type, Vertex):
+                    for i in attrs[a.name]:
+                        if isinstance(i, dict):
+                            inline.setdefault(a.type, []).append(i)
+                        elif i not in g._vertex_cache:
+                            missing.setdefault(a.type, []).append(i)
+
+        for vtype, vattrs in inline.items():
+            vtype._from_attrs_list(vattrs, allow_disabled)
+
+        # The linked IDs were filtered on "active" (or not) by _attrs_query();
+        # filter the links of the linked vertices in the same way.
+        for vtype, vids in missing.items():
+            vtype.from_ids(vids, allow_disabled=allow_disabled)
+
+        return [cls._from_attrs(attrs) for attrs in attrs_list]
 
     @classmethod
     def _from_attrs(cls, attrs):
@@ -366,13 +578,15 @@ class Vertex(Element):
                                          "outside allowed range (%d, %d)." %\
                                          (a.type.__class__.__name__,
                                           len_a, a.list_len[0], a.list_len[1]))
-                    val = [Vertex._cache_vertex(a.type.from_id(i_attr)) \
+                    val = [Vertex._cache_vertex(
+                               a.type.from_id(Vertex._linked_id(i_attr))) \
                            for i_attr in attrs[a.name]]
                 elif len_a > 1:
                     raise ValueError("Only one %s should exist for %s." %
                                      (a.type.__class__.__name__, a.name))
                 elif len_a == 1:
-                    val = Vertex._cache_vertex(a.type.from_id(attrs[a.name][0]))
+                    val = Vertex._cache_vertex(
+                              a.type.from_id(Vertex._linked_id(attrs[a.name][0])))
                 else:
                     if a.optional:
                         val = None
@@ -385,22 +599,46 @@ class Vertex(Element):
             else:
                 arg[a.name] = attrs[a.name]
             
-        return Vertex._cache_vertex(cls(**arg))
+        # __init__() marks the vertex as active, so restore what is in the DB
+        # before caching it, lest a disabled vertex be indexed by name.
+        vertex = cls(**arg)
+        vertex.time_disabled = attrs["time_disabled"]
+        vertex.uid_disabled = attrs["uid_disabled"]
+        vertex.active = attrs["active"]
+        vertex.replacement = attrs["replacement"]
+
+        # This vertex was just read from the DB, so there is no need to ask the
+        # DB whether it exists.
+        vertex = Vertex._cache_vertex(vertex, verify=False)
+        g._vertex_cache.refresh_name(vertex)
+        return vertex
+
+    @staticmethod
+    def _linked_id(attr):
+        """Return the ID of a linked vertex as returned by _attrs_query(),
+        which is either the ID itself or, for deep queries, its projection.
+        """
+        if isinstance(attr, dict):
+            return attr["id"]
+        return attr
 
     @classmethod
-    def _cache_vertex(cls, vertex):
+    def _cache_vertex(cls, vertex, verify=True):
         """Add a vertex and its ID to the vertex cache if not already added,
         and return this new cached vertex. 
 
+        :param verify: If True, check that the vertex is in the DB before
+            caching it.
+        :type verify: bool
+
         TODO: Raise an error if already cached, because that'd mean there's
         an implementation error with the caching.
         """
         if vertex.id() not in g._vertex_cache:
-            if not vertex.in_db():
+            if verify and not vertex.in_db():
                 raise NotInDatabase("Was expecting Vertex ID to be in the "\
                                     "database since it has an ID.")
-            g._vertex_cache[vertex.id()] = vertex
-        return g._vertex_cache[vertex.id()]
+        return g._vertex_cache.setdefault(vertex.id(), vertex)
 
 
     def add(self, strict_add=False, strict_check=True):
@@ -413,75 +651,302 @@ class Vertex(Element):
             exists in the database with the same name and category.
         : type strict_check: bool
 
-        :return: self
+        :return: self, or the vertex already in the DB
         :rtype: self
         """
-        if self.in_db(strict_check=strict_check):
+        if strict_check and self.primary_attr is not None and \
+           self.id() == g._VIRTUAL_ID_PLACEHOLDER:
+            v, added = self._upsert()
+            if not added:
+                strictraise(strict_add, VertexAlreadyAddedError,
+                            f"Vertex already exists in the database.")
+            return v
+        elif self.in_db(strict_check=strict_check):
             strictraise(strict_add, VertexAlreadyAddedError,
                         f"Vertex already exists in the database.")
             return self.__class__.from_db(self.name)
         else:
-            self.uid_added = _get_user()
-            self.time_added = int(time.time())
-            self.active = True
-            self.replacement = 0
-            self.time_disabled = g._TIMESTAMP_NO_EDITTIME_VALUE
-
-            t = g.t.addV().property('category', self.category) \
-                   .property('time_added', self.time_added) \
-                   .property('uid_added', self.uid_added) \
-                   .property('time_disabled', self.time_disabled) \
-                   .property('uid_disabled', self.uid_disabled) \
-                   .property('active', self.active) \
-                   .property('replacement', self.replacement)
-
-            edges = []
-            for a in self._vertex_attrs:
-                if issubclass(a.type, Vertex):
-                    # If the "attribute" is a connexion to another vertex, then
-                    # create the edge; also create the vertex if it does not
-                    # exist.
-                    if getattr(self, a.name) is not None:
-                        if a.is_list:
-                            attr_list = getattr(self, a.name)
-                        else:
-                            attr_list = [getattr(self, a.name)]
-                        for attr in attr_list:
-                            if not attr.in_db():
-                                attr.add()
-                            edges.append(
-                                a.edge_class(inVertex=attr, outVertex=self))
-                    elif not a.optional:
-                        raise ValueError("%s should not be None!" % a.name)
-                elif issubclass(a.type, Timestamp):
-                    if a.is_list:
-                        raise NotImplementedError("Lists of Timestamps are "\
-                                                  "not yet supported.")
-                    val = getattr(self, a.name)
-                    t = t.property("%s_time" % a.name, val.time)\
-                         .property("%s_uid" % a.name, val.uid)\
-                         .property("%s_edit_time" % a.name, val.edit_time)\
-                         .property("%s_comments" % a.name, val.comments)
-                elif a.is_list:
-                    for val in getattr(self, a.name):
-                        t = t.property(a.name, val)
-                else:
-                    t = t.property(a.name, getattr(self, a.name))
-            v = t.next()
+            self._add_linked()
+            self._set_added()
+            v = self._add_traversal(g.t).next()
 
             # this is NOT the id of a Vertex instance,
             # but rather the id of the GremlinPython vertex returned
             # by the traversal.
             self._set_id(v.id)
 
-            # Add any edges.
-            for e in edges:
-                e.add()
-
-            Vertex._cache_vertex(self)
+            # Caching also indexes the name and forgets any earlier lookup
+            # that did not find it.
+            Vertex._cache_vertex(self, verify=False)
 
             return self
 
+    def upsert(self):
+        """Return the active vertex in the DB with the same category and primary
+        attribute as this one, adding this one if there is none.
+
+        The check and the addition are done server-side in a single traversal
+        (fold().coalesce(unfold(), addV(...))), so this costs one round trip,
+        rather than one for in_db() and another for add(), and two clients
+        adding the same vertex at the same time do not race between the two.
+        If some of the linked vertices are not in the DB yet, they are only
+        added after a lookup has found no existing vertex.
+
+        A vertex that already has an ID, i.e., that was read from or added to
+        the DB, is returned as is.
+
+        :return: self if it was added, otherwise the existing vertex.
+        :rtype: Vertex
+        """
+        return self._upsert()[0]
+
+    def _upsert(self):
+        """Do the work of upsert().
+
+        :return: The vertex, and whether it was added.
+        :rtype: tuple(Vertex, bool)
+        """
+        if self.primary_attr is None:
+            raise TypeError("%s has no primary attribute to upsert on." %\
+                            self.__class__.__name__)
+        if self.id() != g._VIRTUAL_ID_PLACEHOLDER:
+            return self, False
+        v = g._vertex_cache.find_name(self.category,
+                                      getattr(self, self.primary_attr))
+        if v is not None:
+            return v, False
+
+        if any(x.id() == g._VIRTUAL_ID_PLACEHOLDER for _, x in self._linked()):
+            # Adding the linked vertices writes to the DB, so only do it if
+            # this vertex does not exist yet.
+            res = self._attrs_query(
+                g.t.V().has("category", self.category) \
+                       .has(self.primary_attr,
+                            getattr(self, self.primary_attr)), False
+            ).toList()
+            if len(res) > 0:
+                return self._from_attrs_list(res[:1])[0], False
+            self._add_linked()
+        else:
+            self._check_linked()
+
+        # _add_traversal() writes the bookkeeping attributes, but they must
+        # only stay set on self if it is the vertex that gets added.
+        saved = {k: getattr(self, k) for k in ("uid_added", "time_added",
+                 "active", "replacement", "time_disabled")}
+        self._set_added()
+        res = self._upsert_traversal(g.t).next()
+
+        if isinstance(res, dict):
+            # It already existed; res is its projection.
+            for k, v in saved.items():
+                setattr(self, k, v)
+            return self._from_attrs_list([res])[0], False
+        else:
+            self._set_id(res)
+            Vertex._cache_vertex(self, verify=False)
+            return self, True
+
+    def _upsert_traversal(self, t):
+        """Append to :param t: the steps that, if there is an active vertex
+        with the same category and primary attribute as this one, project its
+        attributes as _attrs_query() does, and otherwise add this vertex and
+        return its ID. The linked vertices must already be in the DB.
+
+        :param t: The traversal (or traversal source) to extend.
+        :return: The extended traversal.
+        """
+        return t.V().has("category", self.category) \
+                .has(self.primary_attr, getattr(self, self.primary_attr)) \
+                .has("active", True).fold() \
+                .coalesce(self._attrs_query(__.unfold(), False),
+                          self._add_traversal(__).id_())
+
+    @classmethod
+    def add_many(cls, vertices: list, strict_add: bool = False,
+                 chunk_size: int = 100):
+        """Add many vertices of this class to the DB, along with the edges to
+        the vertices that classify them, in a few round trips.
+
+        Vertices whose primary attribute matches an active vertex already in
+        the DB (or an earlier vertex in :param vertices:) are not added again;
+        this is checked with a single lookup. Linked vertices that are not yet
+        in the DB are added first, also in bulk. The new vertices are then
+        written :param chunk_size: at a time, one traversal per chunk.
+
+        :param vertices: The vertices to add; they must all be instances of
+            this class.
+        :type vertices: list[Vertex]
+        :param strict_add: If True, raise an error if any of the vertices
+            already exists; otherwise print a message and use the existing one.
+        :type strict_add: bool
+        :param chunk_size: The maximum number of vertices to write per
+            traversal.
+        :type chunk_size: int
+
+        :return: The vertices in the DB, in the same order as
+            :param vertices:. For those that already existed, this is the
+            existing vertex.
+        :rtype: list[Vertex]
+        """
+        for v in vertices:
+            if not isinstance(v, cls):
+                raise TypeError("Expected instances of %s, got %s." %\
+                                (cls.__name__, v.__class__.__name__))
+            v._check_linked()
+
+        # Add the linked vertices that are not yet in the DB, grouped by class,
+        # and point to the DB vertices.
+        unadded = {}
+        for v in vertices:
+            for a, x in v._linked():
+                if x.id() == g._VIRTUAL_ID_PLACEHOLDER:
+                    unadded.setdefault(x.__class__, {})[id(x)] = x
+        added = {}
+        for vtype, xs in unadded.items():
+            xs = list(xs.values())
+            for x, x_db in zip(xs, vtype.add_many(xs, chunk_size=chunk_size)):
+                added[id(x)] = x_db
+        if len(added) > 0:
+            for v in vertices:
+                v._add_linked(added)
+
+        # Find which vertices already exist, with one lookup.
+        existing = {}
+        if cls.primary_attr is not None and len(vertices) > 0:
+            pas = set(getattr(v, cls.primary_attr) for v in vertices)
+            d = g.t.V().has("category", cls.category) \
+                       .has(cls.primary_attr, P.within(*pas))
+            d = cls._attrs_query(d, False)
+            for v in cls._from_attrs_list(d.toList()):
+                existing[getattr(v, cls.primary_attr)] = v
+        if len(existing) > 0:
+            strictraise(strict_add, VertexAlreadyAddedError,
+                        "Vertices already exist in the database: %s." %\
+                        ", ".join(str(pa) for pa in existing))
+
+        result = []
+        to_add = []
+        for v in vertices:
+            if cls.primary_attr is not None:
+                pa = getattr(v, cls.primary_attr)
+                if pa in existing:
+                    result.append(existing[pa])
+                    continue
+                # So that duplicates further down the list resolve to v.
+                existing[pa] = v
+            result.append(v)
+            to_add.append(v)
+
+        for i in _range(0, len(to_add), chunk_size):
+            chunk = to_add[i:i + chunk_size]
+            t = g.t
+            for v in chunk:
+                v._set_added()
+                t = v._add_traversal(t).id_().store("ids")
+            ids = t.cap("ids").next()
+            for v, v_id in zip(chunk, ids):
+                v._set_id(v_id)
+                Vertex._cache_vertex(v, verify=False)
+
+        return result
+
+    def _linked(self):
+        """Return a list of (VertexAttr, Vertex) for every vertex that this one
+        is linked to via its vertex attributes.
+        """
+        ret = []
+        for a in self._vertex_attrs:
+            if issubclass(a.type, Vertex) and getattr(self, a.name) is not None:
+                if a.is_list:
+                    ret.extend((a, x) for x in getattr(self, a.name))
+                else:
+                    ret.append((a, getattr(self, a.name)))
+        return ret
+
+    def _check_linked(self):
+        """Check that all the required links to other vertices are set."""
+        for a in self._vertex_attrs:
+            if issubclass(a.type, Vertex) and getattr(self, a.name) is None \
+               and not a.optional:
+                raise ValueError("%s should not be None!" % a.name)
+
+    def _add_linked(self, added=None):
+        """Make sure that the vertices linked to this one are in the DB.
+
+        :param added: A dictionary mapping id() of linked vertices to their
+            instance in the DB, for those that were added or looked up
+            elsewhere; linked vertices not in it are added if they have no ID.
+        :type added: dict or None
+        """
+        self._check_linked()
+        for a in self._vertex_attrs:
+            if not issubclass(a.type, Vertex) or \
+               getattr(self, a.name) is None:
+                continue
+            vals = getattr(self, a.name) if a.is_list \
+                   else [getattr(self, a.name)]
+            for i, x in enumerate(vals):
+                if added is not None and id(x) in added:
+                    vals[i] = added[id(x)]
+                elif added is None and x.id() == g._VIRTUAL_ID_PLACEHOLDER:
+                    # If the vertex already exists, this returns the one in
+                    # the DB rather than x.
+                    vals[i] = x.add()
+            setattr(self, a.name, vals if a.is_list else vals[0])
+
+    def _set_added(self):
+        """Set the bookkeeping attributes of a vertex about to be added."""
+        self.uid_added = _get_user()
+        self.time_added = int(time.time())
+        self.active = True
+        self.replacement = 0
+        self.time_disabled = g._TIMESTAMP_NO_EDITTIME_VALUE
+
+    def _add_traversal(self, t):
+        """Append to :param t: the steps that create this vertex with all its
+        attributes, and the edges to the vertices it is linked to, which must
+        already be in the DB. The traversal is left on the new vertex.
+
+        :param t: The traversal (or traversal source) to extend.
+        :return: The extended traversal.
+        """
+        t = t.addV().property('category', self.category) \
+             .property('time_added', self.time_added) \
+             .property('uid_added', self.uid_added) \
+             .property('time_disabled', self.time_disabled) \
+             .property('uid_disabled', self.uid_disabled) \
+             .property('active', self.active) \
+             .property('replacement', self.replacement)
+
+        for a in self._vertex_attrs:
+            if issubclass(a.type, Vertex):
+                continue
+            elif issubclass(a.type, Timestamp):
+                if a.is_list:
+                    raise NotImplementedError("Lists of Timestamps are "\
+                                              "not yet supported.")
+                val = getattr(self, a.name)
+                t = t.property("%s_time" % a.name, val.time)\
+                     .property("%s_uid" % a.name, val.uid)\
+                     .property("%s_edit_time" % a.name, val.edit_time)\
+                     .property("%s_comments" % a.name, val.comments)
+            elif a.is_list:
+                for val in getattr(self, a.name):
+                    t = t.property(a.name, val)
+            else:
+                t = t.property(a.name, getattr(self, a.name))
+
+        # If the "attribute" is a connexion to another vertex, then create the
+        # edge going out of this vertex.
+        for a, x in self._linked():
+            t = t.sideEffect(_edge_properties(__.addE(a.edge_class.category)\
+                                                .to(__.V(x.id())),
+                                              a.edge_class.category,
+                                              self.time_added))
+
+        return t
+
     def in_db(self, strict_check=True, allow_removed=False) -> bool:
         """Return whether this Vertex has been added to the database.
 
@@ -560,7 +1025,7 @@ class Vertex(Element):
             return False
         return True
 
-    def replace(self, newVertex, disable_time: int = int(time.time())):
+    def replace(self, newVertex, disable_time: int = None):
         """Replaces the vertex in the JanusGraph DB with the new vertex by
         changing its property 'active' from true to false and transfering
         all the edges to the new vertex. The old vertex contains the ID of
@@ -570,8 +1035,8 @@ class Vertex(Element):
         :type newVertex: Component
 
         :param disable_time: When this vertex was disabled in the database (UNIX
-            time).
-        :type disable_time: int
+            time); if None, the current time is used.
+        :type disable_time: int or None
 
         :return: newVertex
         :rtype: Vertex
@@ -584,115 +1049,112 @@ class Vertex(Element):
         if newVertex.category != self.category:
             raise TypeError("The newVertex must be of the same category as "\
                             "the vertex it is replacing.")
+        if disable_time is None:
+            disable_time = int(time.time())
 
         if not newVertex.in_db(strict_check=False):
             newVertex.add(strict_add=True, strict_check=False)
 
-        # The 'replacement' property now points to the new vertex that replaced
-        # the self vertex, and it needs to be disabled.
-        g.t.V(self.id()).property('replacement', newVertex.id()) \
-                        .property('active', False) \
-                        .property('time_disabled', disable_time) \
-                        .property('uid_disabled', _get_user()).iterate()
-
-        # List of all the properties of the outgoing edges from the self vertex.
-        o_edges_values_list = g.t.V(self.id()).bothE().valueMap().toList()
-
-        # List of all the outgoing vertices connected to the self vertex.
-        o_vertices_list = g.t.V(self.id()).out().id_().toList()
-
         # These edges are not copied when replacing a vertex because these edges
         # are selected by the user while adding a new component version, or a
         # new property type, or a new flag or a new component respectively.
-        for i in range(len(o_vertices_list)):
-
-            if o_edges_values_list[i]['category'] == \
-                RelationVersionAllowedType.category:
-                continue
-            if o_edges_values_list[i]['category'] == \
-                RelationPropertyAllowedType.category:
-                continue
-            if o_edges_values_list[i]['category'] == \
-                RelationFlagSeverity.category:
-                continue
-            if o_edges_values_list[i]['category'] == \
-                RelationFlagType.category:
-                continue
-            if o_edges_values_list[i]['category'] == \
-                RelationComponentType.category:
-                continue
-            if o_edges_values_list[i]['category'] == \
-                RelationVersion.category:
-                continue
-
-            # Adds an outgoing edge from the new vertex to the vertices in the
-            # list o_vertices_list.
-            add_edge_1 = g.t.V(newVertex.id()) \
-                            .addE(o_edges_values_list[i]['category'])\
-                            .to(__.V().hasId(o_vertices_list[i])).as_('e1')\
-                            .select('e1')
-
-            # Copies all the properties of an outgoing edge and stores them in a
-            # list.
-            traversal = g.t.V(self.id()).outE()[i].properties().toList()
-
-            for i2 in range(len(traversal)):
-                add_edge_1 = add_edge_1.property(
-                    traversal[i2].key, traversal[i2].value)
-
-                if i2 == (len(traversal)-1):
-                    add_edge_1 = add_edge_1.next()
-
-            # After all the properties have been copied from all the edges, the
-            # edges of the self vertex are dropped.
-            if i == (len(o_vertices_list)-1):
-                g.t.V(self.id()).outE().drop().iterate()
-
-        i_edges_values_list = g.t.V(self.id()).inE().valueMap().toList()
-        i_vertices_list = g.t.V(self.id()).in_().id_().toList()
-
-        for j in range(len(i_vertices_list)):
-
-            add_edge_2 = g.t.V(newVertex.id()) \
-                            .addE(i_edges_values_list[j]['category'])\
-                            .from_(__.V().hasId(i_vertices_list[j])).as_('e2')\
-                            .select('e2')
-
-            traversal = g.t.V(self.id()).inE()[j].properties().toList()
-
-            for j2 in range(len(traversal)):
-                add_edge_2 = add_edge_2.property(
-                    traversal[j2].key, traversal[j2].value)
-
-                if j2 == (len(traversal)-1):
-                    add_edge_2 = add_edge_2.next()
-
-            if j == (len(i_vertices_list)-1):
-                g.t.V(self.id()).inE().drop().iterate()
+        # They are left on the old vertex, which keeps describing what it was.
+        excluded = [RelationVersionAllowedType.category,
+                    RelationPropertyAllowedType.category,
+                    RelationFlagSeverity.category,
+                    RelationFlagType.category,
+                    RelationComponentType.category,
+                    RelationVersion.category]
+
+        # In a single traversal: the 'replacement' property now points to the
+        # new vertex that replaced the self vertex, which gets disabled; every
+        # other outgoing and every incoming edge is re-created on the new
+        # vertex with all its properties; then the originals are dropped.
+        g.t.V(self.id()).property('replacement', newVertex.id()) \
+                        .property('active', False) \
+                        .property('time_disabled', disable_time) \
+                        .property('uid_disabled', _get_user()) \
+           .sideEffect(_copy_edges(__.outE().has('category',
+                                                 P.without(*excluded)),
+                                   newVertex.id(), outgoing=True)) \
+           .sideEffect(_copy_edges(__.inE(), newVertex.id(), outgoing=False)) \
+           .sideEffect(__.union(__.outE().has('category', P.without(*excluded)),
+                                __.inE()).drop()) \
+           .iterate()
+
+        self.replacement = newVertex.id()
+        self.active = False
+        self.time_disabled = disable_time
+        self.uid_disabled = _get_user()
+        g._vertex_cache.refresh_name(self)
+        g._vertex_cache.refresh_name(newVertex)
+
+        # The edges of all the neighbours were moved too.
+        if g._interval_index is not None:
+            g._interval_index.clear()
+
+        # Cached vertices that were linked to this one are now linked to the
+        # new vertex serverside, so point them there too.
+        for v in g._vertex_cache.values():
+            for a in v._vertex_attrs:
+                if not issubclass(a.type, Vertex):
+                    continue
+                val = getattr(v, a.name, None)
+                if a.is_list and val is not None:
+                    setattr(v, a.name, [newVertex if x is self else x \
+                                        for x in val])
+                elif val is self:
+                    setattr(v, a.name, newVertex)
 
         return newVertex
 
-    def disable(self, disable_time: int = int(time.time())):
+    def disable(self, disable_time: int = None):
         """Disables the vertex as well all the edges connected to the vertex by
             setting the property from 'active' from true to false.
 
+        This is done in a single traversal, so that the vertex and its edges
+        are disabled together.
+
         :ivar disable_time: When this vertex was disabled in the database (UNIX
-            time).
+            time); if None, the current time is used.
 
         """
+        Vertex.disable_many([self], disable_time=disable_time)
 
-        # Sets the active property from true to false and registers the time
-        # when this self vertex was disabled.
-        g.t.V(self.id()).property(
-            'active', False).property('time_disabled', disable_time).iterate()
-
-        # Counts the total number of edges connected to this vertex.
-        edge_count = g.t.V(self.id()).bothE().toList()
-
-        # Disables all the connnected edges.
-        for i in range(len(edge_count)):
-            g.t.V(self.id()).bothE()[i].property('active', False).property(
-                'time_disabled', disable_time).next()
+    @classmethod
+    def disable_many(cls, vertices: list, disable_time: int = None):
+        """Disable several vertices, as well as all the edges connected to any
+        of them, in a single traversal, e.g., to decommission a whole signal
+        chain at once.
+
+        Edges that were already disabled keep their original time_disabled.
+
+        :param vertices: The vertices to disable.
+        :type vertices: list[Vertex]
+        :param disable_time: When these vertices were disabled in the database
+            (UNIX time); if None, the current time is used.
+        :type disable_time: int or None
+        """
+        if disable_time is None:
+            disable_time = int(time.time())
+        if len(vertices) == 0:
+            return
+
+        g.t.V(*[v.id() for v in vertices]) \
+           .sideEffect(__.bothE().has('active', True) \
+                         .property('active', False) \
+                         .property('time_disabled', disable_time)) \
+           .property('active', False) \
+           .property('time_disabled', disable_time).iterate()
+
+        for v in vertices:
+            v.active = False
+            v.time_disabled = disable_time
+            g._vertex_cache.refresh_name(v)
+
+        # The other ends of the disabled edges are not known here.
+        if g._interval_index is not None:
+            g._interval_index.clear()
 
     def added_to_db(self) -> bool:
         """Return whether this vertex is added to the database,
@@ -718,6 +1180,8 @@ class Vertex(Element):
                 else:
                     if getattr(self, a.name) is not None:
                         ret[a.name] = getattr(self, a.name).as_dict()
+            elif issubclass(a.type, Timestamp):
+                ret[a.name] = getattr(self, a.name).as_dict()
             else:
                 ret[a.name] = getattr(self, a.name)
         for x in ["time_added", "uid_added", "time_disabled", "uid_disabled",
@@ -776,17 +1240,23 @@ class Vertex(Element):
         :param allow_disabled: Whether to only select vertices with active=True.
         :type allow_disabled: bool
         """
+        return cls._count_traversal(filters, allow_disabled).next()
+
+    @classmethod
+    def _count_traversal(cls, filters, allow_disabled):
+        """Return the traversal counting the vertices for get_count()."""
         if not isinstance(filters, list):
             filters = [filters]
         
         q = cls._list_filter_traversal(filters)
         if not allow_disabled:
             q = q.has("active", True)
-        return q.count().next()
+        return q.count()
 
     @classmethod
     def get_list(cls, range: tuple = (0, -1), order_by: list = [], 
-                 filters: list = [], allow_disabled: bool = False):
+                 filters: list = [], allow_disabled: bool = False,
+                 depth: int = 0):
         """
         Return a list of Vertex instances based in the range :param range:,
         optionally filtered and ordered according to specified parameters.
@@ -820,7 +1290,18 @@ class Vertex(Element):
 
         :param allow_disabled: Whether to only select vertices with active=True.
         :type allow_disabled: bool
+
+        :param depth: How many levels of linked vertices to fetch in the same
+            query; see _attrs_query().
+        :type depth: int
         """
+        return cls._from_attrs_list(cls._list_traversal(
+            range, order_by, filters, allow_disabled, depth
+        ).toList(), allow_disabled)
+
+    @classmethod
+    def _list_traversal(cls, range, order_by, filters, allow_disabled, depth):
+        """Return the traversal fetching the vertices for get_list()."""
         # Validation of input.
         if not isinstance(order_by, list) or isinstance(order_by, str):
             order_by = [order_by]
@@ -851,8 +1332,7 @@ class Vertex(Element):
                 else:
                     t = t.by(ob[0], Order.asc if ob[1] == "asc" else Order.desc)
         t = t.range(range[0], range[1])
-        t = cls._attrs_query(t, allow_disabled)
-        return [cls._from_attrs(t_i) for t_i in t.toList()]
+        return cls._attrs_query(t, allow_disabled, depth)
 
 
 class Edge(Element):
@@ -936,13 +1416,10 @@ class Edge(Element):
 
             self.time_disabled = g._TIMESTAMP_NO_EDITTIME_VALUE
 
-            traversal = g.t.V(self.outVertex.id()).addE(self.category) \
-                           .to(__.V(self.inVertex.id())) \
-                           .property('category', self.category)\
-                           .property('time_added', self.time_added)\
-                           .property('time_disabled', self.time_disabled)\
-                           .property('active', self.active)\
-                           .property('replacement', self.replacement)
+            traversal = _edge_properties(
+                            g.t.V(self.outVertex.id()).addE(self.category) \
+                               .to(__.V(self.inVertex.id())),
+                            self.category, self.time_added)
 
             for key in attributes:
                 traversal = traversal.property(key, attributes[key])
@@ -951,14 +1428,20 @@ class Edge(Element):
 
             self._set_id(e.id['@value']['relationId'])
 
-    def disable(self, disable_time: int = int(time.time())):
+            _invalidate_intervals(self.inVertex.id(), self.outVertex.id())
+
+    def disable(self, disable_time: int = None):
         """Disable this connexion by setting active to false.
 
-        :param disable_time: When this edge was disabled in the database.
-        :type disable_time: int
+        :param disable_time: When this edge was disabled in the database; if
+            None, the current time is used.
+        :type disable_time: int or None
         """
+        if disable_time is None:
+            disable_time = int(time.time())
         g.t.E(self.id()).property('active', False)\
                         .property('time_disabled', disable_time).iterate()
+        _invalidate_intervals(self.inVertex.id(), self.outVertex.id())
 
 
     def added_to_db(self) -> bool:
@@ -976,7 +1459,7 @@ class Edge(Element):
             g.t.E(self.id()).count().next() > 0
         )
 
-    def replace(self, newEdge, disable_time: int = int(time.time())):
+    def replace(self, newEdge, disable_time: int = None):
         """Replaces the edge in the JanusGraph DB with a new edge by
         changing its property 'active' from true to false, and storing the id
         of the new edge as an attribute.
@@ -985,8 +1468,8 @@ class Edge(Element):
         :type newEdge: Edge
 
         :param disable_edge: When this edge was disabled in the database (UNIX
-            time).
-        :type disable_time: int
+            time); if None, the current time is used.
+        :type disable_time: int or None
 
         :return: newEdge
         :rtype: Edge
@@ -994,6 +1477,8 @@ class Edge(Element):
         if newEdge.category != self.category:
             raise TypeError("The new edge must be of the same category as "\
                             "the edge it is replacing.")
+        if disable_time is None:
+            disable_time = int(time.time())
 
         if not newEdge.added_to_db():     # make sure new edge in db
             newEdge.add()
@@ -1004,6 +1489,7 @@ class Edge(Element):
                         .property('active', False) \
                         .property('time_disabled', disable_time) \
                         .property('uid_disabled', _get_user()).iterate()
+        _invalidate_intervals(self.inVertex.id(), self.outVertex.id())
 
         return newEdge
 
@@ -1170,7 +1656,11 @@ class TimestampedEdge(Edge):
         """Add this timestamped edge to the database.
         """
 
-        attributes = {
+        Edge.add(self, attributes=self._attributes())
+
+    def _attributes(self):
+        """Return the edge properties that store the timestamps."""
+        return {
             "start_time": self.start.time,
             "start_uid": self.start.uid,
             "start_edit_time": self.start.edit_time,
@@ -1181,8 +1671,6 @@ class TimestampedEdge(Edge):
             "end_comments": self.end.comments
         }
 
-        Edge.add(self, attributes=attributes)
-
     def _end(self, end: Timestamp):
         """Set the end timestamp.
 
@@ -1203,6 +1691,7 @@ class TimestampedEdge(Edge):
               .property('end_uid', end.uid) \
               .property('end_edit_time', end.edit_time) \
               .property('end_comments', end.comments).iterate()
+        _invalidate_intervals(self.inVertex.id(), self.outVertex.id())
 
     def __str__(self, connector=" <-> ", sep=" :: ", trange=" .. ",
                 strfmt = "%Y-%m-%d %H:%m:%S"):
@@ -0,0 +1,497 @@
+"""
+_bulk.py
+
+Bulk loading of component types, component versions, property types,
+components, properties, connections and subcomponent relations from CSV or JSON
+files, such as the layout spreadsheets sent in for a deployment campaign.
+"""
+import csv
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from gremlin_python.process.traversal import P
+from gremlin_python.process.graph_traversal import __
+
+import _global as g
+from _base import Timestamp, _edge_properties
+from _component_nodes import ComponentType, ComponentVersion, Component
+from _edges import RelationComponentType, RelationConnection, \
+                   RelationProperty, RelationPropertyType, RelationSubcomponent
+from _property_nodes import PropertyType, Property
+
+# The kinds of rows that can be loaded, in the order in which they must be
+# loaded, since each can refer to the ones before it.
+BULK_KINDS = ["types", "versions", "property_types", "components",
+              "properties", "connections", "subcomponents"]
+
+def read_rows(source, format: str = None):
+    """Iterate over the rows of a CSV or JSON file, one dictionary per row,
+    without reading the whole file into memory.
+
+    JSON files can hold either an array of objects or one object per line.
+
+    :param source: The path of the file, or a file object opened in text mode.
+    :type source: str or file
+    :param format: Either "csv" or "json"; if None, it is guessed from the file
+        extension, defaulting to CSV.
+    :type format: str or None
+    """
+    if isinstance(source, str):
+        if format is None:
+            format = "json" if source.lower().endswith((".json", ".jsonl")) \
+                     else "csv"
+        with open(source, newline="") as f:
+            yield from read_rows(f, format)
+        return
+
+    if format == "json":
+        yield from _iter_json(source)
+    else:
+        for row in csv.DictReader(source):
+            # Spreadsheets often come with padded cells.
+            yield {k.strip(): v.strip() if isinstance(v, str) else v \
+                   for k, v in row.items() if k is not None}
+
+def _iter_json(f, read_size=65536):
+    """Iterate over the objects of a JSON array, or of a file of concatenated
+    JSON objects (such as JSON lines), reading :param read_size: characters at
+    a time.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    eof = False
+    while True:
+        # Skip the whitespace and punctuation between the objects.
+        i = 0
+        while i < len(buf) and (buf[i].isspace() or buf[i] in "[],"):
+            i += 1
+        buf = buf[i:]
+        if len(buf) == 0:
+            if eof:
+                return
+            buf = f.read(read_size)
+            eof = len(buf) == 0
+            continue
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = f.read(read_size)
+            eof = len(more) == 0
+            buf += more
+            continue
+        yield obj
+        buf = buf[end:]
+
+def _split(val):
+    """Return a list from a cell that is either already a list or a string of
+    semicolon-separated values.
+    """
+    if val is None or val == "":
+        return []
+    if isinstance(val, list):
+        return [str(v) for v in val]
+    return [v.strip() for v in str(val).split(";")]
+
+def _opt(row, key):
+    """Return the value of :param key: in :param row:, or None if it is absent
+    or blank.
+    """
+    val = row.get(key)
+    if val is None or (isinstance(val, str) and val.strip() == ""):
+        return None
+    return val
+
+class BulkReport(object):
+    """Counters kept while bulk loading, for reporting throughput.
+
+    :ivar rows: The number of rows read.
+    :ivar written: The number of rows sent to the DB. Rows that were already in
+        the DB are included, since checking for them happens in the same
+        traversal as writing them.
+    :ivar skipped: The number of rows not sent to the DB because they were
+        already in it or repeated an earlier row.
+    :ivar round_trips: The number of traversals sent to the DB.
+    :ivar failures: A list of (kind, row number, error message) for the rows
+        that could not be loaded.
+    :ivar elapsed: The number of seconds spent loading.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.written = 0
+        self.skipped = 0
+        self.round_trips = 0
+        self.failures = []
+        self.elapsed = 0.0
+
+    def rows_per_second(self):
+        """Return the number of rows processed per second."""
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        """Return a dictionary representation."""
+        return {
+            "rows": self.rows,
+            "written": self.written,
+            "skipped": self.skipped,
+            "failed": len(self.failures),
+            "round_trips": self.round_trips,
+            "elapsed": self.elapsed,
+            "rows_per_second": self.rows_per_second()
+        }
+
+    def __str__(self):
+        s = "%d rows in %.1f s (%.1f rows/s): %d written, %d skipped, "\
+            "%d failed, %d round trips." %\
+            (self.rows, self.elapsed, self.rows_per_second(), self.written,
+             self.skipped, len(self.failures), self.round_trips)
+        for kind, n, msg in self.failures:
+            s += "\n  %s row %d: %s" % (kind, n, msg)
+        return s
+
+class BulkLoader(object):
+    """Load rows into the DB in chunks, with one traversal per chunk, spread
+    over a pool of worker threads.
+
+    Names are resolved through a map from (category, name) to vertex ID that
+    is read from the DB once, when the loader is created, and kept up to date
+    as vertices are added. Loading is idempotent: rows naming vertices that
+    already exist are skipped, and edges are only added if there is no active
+    one between the same vertices (and, for properties and connections, from
+    the same time), so an interrupted load can simply be re-run.
+
+    The columns expected for each kind of row are:
+
+    - types: name, comments
+    - versions: name, type, comments
+    - property_types: name, units, allowed_regex, n_values, allowed_types
+      (semicolon-separated), comments
+    - components: name, type, version
+    - properties: component, type, values (semicolon-separated), time,
+      end_time, comments
+    - connections: component1, component2, time, end_time, comments
+    - subcomponents: component, subcomponent
+
+    Columns for optional attributes can be left blank or omitted. Unlike
+    `Component.set_property` and `Component.connect`, the loader does not end
+    properties or connections that are already set; it is meant for loading a
+    layout rather than editing one.
+
+    :ivar chunk_size: The number of rows written per traversal.
+    :ivar workers: The number of threads writing chunks concurrently.
+    :ivar report: The `BulkReport` for everything loaded so far.
+    """
+
+    chunk_size: int
+    workers: int
+    report: BulkReport
+
+    def __init__(self, chunk_size: int = 200, workers: int = 4):
+        """Build the name map.
+
+        :param chunk_size: The number of rows written per traversal.
+        :type chunk_size: int
+        :param workers: The number of threads writing chunks concurrently.
+        :type workers: int
+        """
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.report = BulkReport()
+        self._lock = threading.Lock()
+        self._ids = dict()
+        # The component type ID of each component, for checking that
+        # properties are allowed.
+        self._comp_types = dict()
+        self._load_name_map()
+
+    def load(self, kind: str, rows):
+        """Load rows of one kind.
+
+        :param kind: One of the kinds in `BULK_KINDS`.
+        :type kind: str
+        :param rows: The rows to load, for instance from `read_rows`; they are
+            consumed lazily.
+        :type rows: iterable of dict
+
+        :return: The report, which includes the rows loaded in earlier calls.
+        :rtype: BulkReport
+        """
+        if kind not in BULK_KINDS:
+            raise ValueError("Unknown kind %s; should be one of %s." %\
+                             (kind, ", ".join(BULK_KINDS)))
+
+        prepare = getattr(self, "_prepare_%s" % kind)
+        start = time.time()
+        # Keys of the rows already seen in this load, to skip repeats.
+        seen = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = set()
+            numbered = enumerate(rows, 1)
+            while True:
+                chunk = list(itertools.islice(numbered, self.chunk_size))
+                if len(chunk) == 0:
+                    break
+                items = []
+                for n, row in chunk:
+                    self.report.rows += 1
+                    try:
+                        item = prepare(row)
+                    except Exception as e:
+                        self._fail(kind, n, e)
+                        continue
+                    if item is None or item[0] in seen:
+                        self.report.skipped += 1
+                        continue
+                    seen.add(item[0])
+                    items.append((n,) + item)
+                if len(items) == 0:
+                    continue
+                pending.add(pool.submit(self._write, kind, items))
+                # Do not read further ahead than the workers can write.
+                if len(pending) >= 2 * self.workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        f.result()
+            for f in pending:
+                f.result()
+
+        self.report.elapsed += time.time() - start
+        return self.report
+
+    def load_files(self, files: dict, format: str = None):
+        """Load files of several kinds, in the right order.
+
+        :param files: A dictionary from the kinds in `BULK_KINDS` to the paths
+            of the files holding their rows.
+        :type files: dict
+        :param format: Either "csv" or "json"; if None, it is guessed from each
+            file's extension.
+        :type format: str or None
+
+        :return: The report.
+        :rtype: BulkReport
+        """
+        for kind in BULK_KINDS:
+            if files.get(kind) is not None:
+                self.load(kind, read_rows(files[kind], format))
+        return self.report
+
+    def _load_name_map(self):
+        """Read the IDs of all the active vertices that rows can refer to."""
+        cats = [ComponentType.category, ComponentVersion.category,
+                PropertyType.category, Component.category]
+        res = g.t.V().has("category", P.within(*cats)).has("active", True) \
+                 .project("category", "name", "id", "type") \
+                 .by("category").by("name").by(__.id_()) \
+                 .by(__.out(RelationComponentType.category).id_().fold()) \
+                 .toList()
+        self.report.round_trips += 1
+        for r in res:
+            self._ids[(r["category"], r["name"])] = r["id"]
+            if r["category"] == Component.category and len(r["type"]) > 0:
+                self._comp_types[r["id"]] = r["type"][0]
+
+    def _id(self, cls, name):
+        """Return the ID of the vertex of class :param cls: called
+        :param name:, or raise an error if there is none.
+        """
+        try:
+            return self._ids[(cls.category, name)]
+        except KeyError:
+            raise LookupError("There is no %s called %s." %\
+                              (cls.category.replace("_", " "), name))
+
+    def _vertex(self, cls, name):
+        """Return the instance of a type-like vertex called :param name:."""
+        return cls.from_id(self._id(cls, name))
+
+    def _new_vertex(self, v):
+        """Return the item for adding the vertex :param v:, or None if a vertex
+        with its name already exists.
+        """
+        if (v.category, v.name) in self._ids:
+            return None
+        v._set_added()
+        # Check again server-side, in case another client added it since.
+        t = __.V().has("category", v.category).has("name", v.name) \
+              .has("active", True).fold() \
+              .coalesce(__.unfold(), v._add_traversal(__)).id_()
+        return ((v.category, v.name), t, v)
+
+    def _prepare_types(self, row):
+        return self._new_vertex(ComponentType(
+            name=row["name"], comments=_opt(row, "comments") or ""))
+
+    def _prepare_versions(self, row):
+        return self._new_vertex(ComponentVersion(
+            name=row["name"], type=self._vertex(ComponentType, row["type"]),
+            comments=_opt(row, "comments") or ""))
+
+    def _prepare_property_types(self, row):
+        return self._new_vertex(PropertyType(
+            name=row["name"], units=_opt(row, "units") or "",
+            allowed_regex=_opt(row, "allowed_regex") or ".*",
+            n_values=int(row["n_values"]),
+            allowed_types=[self._vertex(ComponentType, t) \
+                           for t in _split(row["allowed_types"])],
+            comments=_opt(row, "comments") or ""))
+
+    def _prepare_components(self, row):
+        version = _opt(row, "version")
+        return self._new_vertex(Component(
+            name=row["name"], type=self._vertex(ComponentType, row["type"]),
+            version=self._vertex(ComponentVersion, version) \
+                    if version is not None else None))
+
+    def _prepare_properties(self, row):
+        c_id = self._id(Component, row["component"])
+        ptype = self._vertex(PropertyType, row["type"])
+        if self._comp_types.get(c_id) not in \
+           [t.id() for t in ptype.allowed_types]:
+            raise ValueError("Property type %s is not applicable to the "\
+                             "type of component %s." %\
+                             (ptype.name, row["component"]))
+        # The initialiser validates the values.
+        prop = Property(values=_split(row["values"]), type=ptype)
+        prop._set_added()
+        start, end = self._timestamps(row)
+        e = RelationProperty(inVertex=prop, outVertex=None, start=start,
+                             end=end)
+
+        # Unless a property of this type is already set from the same time,
+        # add the property vertex and the edge to it.
+        t = __.V(c_id).coalesce(
+            __.outE(e.category).has("active", True) \
+              .has("start_time", start.time) \
+              .where(__.inV().out(RelationPropertyType.category) \
+                             .hasId(ptype.id())),
+            self._edge_traversal(e, prop._add_traversal(__).addE(e.category)\
+                                                           .from_(__.V(c_id)))
+        )
+        return ((c_id, ptype.id(), start.time), t)
+
+    def _prepare_connections(self, row):
+        id1 = self._id(Component, row["component1"])
+        id2 = self._id(Component, row["component2"])
+        if id1 == id2:
+            raise ValueError("Trying to connect component %s to itself." %\
+                             row["component1"])
+        start, end = self._timestamps(row)
+        e = RelationConnection(inVertex=None, outVertex=None, start=start,
+                               end=end)
+        t = __.V(id2).coalesce(
+            __.bothE(e.category).has("active", True) \
+              .has("start_time", start.time).where(__.otherV().hasId(id1)),
+            self._edge_traversal(e, __.addE(e.category).to(__.V(id1)))
+        )
+        return ((min(id1, id2), max(id1, id2), start.time), t)
+
+    def _prepare_subcomponents(self, row):
+        sup = self._id(Component, row["component"])
+        sub = self._id(Component, row["subcomponent"])
+        if sup == sub:
+            raise ValueError("Trying to make %s a subcomponent of itself." %\
+                             row["component"])
+        e = RelationSubcomponent(inVertex=None, outVertex=None)
+        t = __.V(sub).coalesce(
+            __.bothE(e.category).has("active", True) \
+              .where(__.otherV().hasId(sup)),
+            self._edge_traversal(e, __.addE(e.category).to(__.V(sup)))
+        )
+        return ((sup, sub), t)
+
+    @staticmethod
+    def _timestamps(row):
+        """Return the start and end timestamps of a row."""
+        start = Timestamp(int(row["time"]), _opt(row, "comments") or "")
+        end = _opt(row, "end_time")
+        return start, Timestamp(int(end)) if end is not None else None
+
+    @staticmethod
+    def _edge_traversal(e, t):
+        """Append to the edge-creating traversal :param t: all the properties
+        of the edge :param e:.
+        """
+        t = _edge_properties(t, e.category, int(time.time()))
+        if hasattr(e, "_attributes"):
+            for key, val in e._attributes().items():
+                t = t.property(key, val)
+        return t
+
+    def _write(self, kind, items):
+        """Write one chunk of items with a single traversal. If it fails, write
+        them one at a time, to find out which rows are at fault.
+        """
+        try:
+            self._write_items(items)
+        except Exception:
+            for item in items:
+                try:
+                    self._write_items([item])
+                except Exception as e:
+                    self._fail(kind, item[0], e)
+
+    def _write_items(self, items):
+        """Send the traversals of :param items: to the DB in one traversal and,
+        for those adding vertices, record the new IDs.
+        """
+        t = g.t.inject(0)
+        vertices = []
+        for item in items:
+            if len(item) > 3:
+                # Steps are appended in place, so store from a copy; otherwise
+                # a retry would send the item with its store() twice.
+                t = t.sideEffect(item[2].clone().store("ids"))
+                vertices.append(item[3])
+            else:
+                t = t.sideEffect(item[2])
+
+        if len(vertices) > 0:
+            ids = t.cap("ids").next()
+        else:
+            t.iterate()
+
+        with self._lock:
+            self.report.round_trips += 1
+            self.report.written += len(items)
+            for v in vertices:
+                v._set_id(ids.pop(0))
+                self._ids[(v.category, v.name)] = v.id()
+                if isinstance(v, Component):
+                    self._comp_types[v.id()] = v.type.id()
+                elif v._cache_pinned:
+                    g._vertex_cache.setdefault(v.id(), v)
+
+    def _fail(self, kind, n, e):
+        """Record that row :param n: of kind :param kind: failed."""
+        with self._lock:
+            self.report.failures.append((kind, n, str(e)))
+
+def bulk_load(files: dict, chunk_size: int = 200, workers: int = 4,
+              format: str = None):
+    """Load files of component types, versions, property types, components,
+    properties, connections and subcomponent relations. See `BulkLoader` for
+    the columns expected.
+
+    :param files: A dictionary from the kinds in `BULK_KINDS` to the paths of
+        the files holding their rows.
+    :type files: dict
+    :param chunk_size: The number of rows written per traversal.
+    :type chunk_size: int
+    :param workers: The number of threads writing chunks concurrently.
+    :type workers: int
+    :param format: Either "csv" or "json"; if None, it is guessed from each
+        file's extension.
+    :type format: str or None
+
+    :return: The report of what was loaded.
+    :rtype: BulkReport
+    """
+    return BulkLoader(chunk_size=chunk_size, workers=workers)\
+           .load_files(files, format)
@@ -0,0 +1,494 @@
+"""
+_cache.py
+
+Contains the cache that holds the vertices that have been read from or written
+to the database, and the optional index of the time intervals of their edges,
+so that the DB does not need to be queried more than necessary.
+"""
+import bisect
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+class VertexCache(object):
+    """A bounded cache of Vertex instances, keyed on their serverside ID, which
+    evicts the least recently used vertices first.
+
+    Vertices whose class has `_cache_pinned` set (the small, rarely changing
+    sets of types, versions and severities) are never evicted and do not count
+    towards the limits.
+
+    Next to the vertices, the cache keeps an index from (category, primary
+    attribute) to ID for the active cached vertices, so that lookups by name
+    can be served without querying, and a record of names recently found not
+    to be in the DB. Entries of the index expire after `name_ttl` seconds, so
+    that a vertex disabled by another client is not served for long, and the
+    record of missing names after `negative_ttl` seconds.
+
+    The cache keeps hit/miss/eviction counters that can be read with
+    `stats()`. Only lookups made with `get()` and `find_name()` are counted.
+
+    :ivar max_entries: The maximum number of unpinned vertices to hold, or None
+        for no limit.
+    :ivar max_bytes: The approximate maximum memory, in bytes, taken up by the
+        unpinned vertices, or None for no limit.
+    :ivar name_ttl: How many seconds to serve a name from the name index
+        before querying the DB again, or None to never query again.
+    :ivar negative_ttl: How many seconds to remember that a name is not in the
+        DB.
+    :ivar hits: The number of lookups that found a vertex.
+    :ivar misses: The number of lookups that did not find a vertex.
+    :ivar evictions: The number of vertices evicted to stay within the limits.
+    """
+
+    max_entries: int
+    max_bytes: int
+    name_ttl: float
+    negative_ttl: float
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None,
+                 name_ttl: float = 60, negative_ttl: float = 5):
+        """Initialise an empty cache.
+
+        :param max_entries: The maximum number of unpinned vertices to hold;
+            if None, there is no limit.
+        :type max_entries: int or None
+        :param max_bytes: The approximate maximum memory taken up by the
+            unpinned vertices; if None, there is no limit.
+        :type max_bytes: int or None
+        :param name_ttl: How many seconds to serve a name from the name index
+            before querying the DB again; if None, names do not expire, and
+            0 disables the index.
+        :type name_ttl: float or None
+        :param negative_ttl: How many seconds to remember that a name is not in
+            the DB; 0 disables this.
+        :type negative_ttl: float
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.name_ttl = name_ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.RLock()
+        self.clear()
+
+    def _after_fork(self):
+        """In a forked child, replace the lock, which another thread of the
+        parent may have been holding when it forked. The entries are kept.
+        """
+        self._lock = threading.RLock()
+
+    def clear(self):
+        """Empty the cache and reset the counters."""
+        with self._lock:
+            # Unpinned entries, from least to most recently used.
+            self._entries = OrderedDict()
+            self._pinned = dict()
+            self._sizes = dict()
+            self._n_bytes = 0
+            # (category, primary attribute) -> (ID, expiry).
+            self._names = dict()
+            self._missing = dict()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __contains__(self, id):
+        return id in self._pinned or id in self._entries
+
+    def __len__(self):
+        return len(self._pinned) + len(self._entries)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._pinned) + list(self._entries))
+
+    def __getitem__(self, id):
+        with self._lock:
+            if id in self._pinned:
+                return self._pinned[id]
+            vertex = self._entries[id]
+            self._entries.move_to_end(id)
+            return vertex
+
+    def __setitem__(self, id, vertex):
+        with self._lock:
+            self._remove(id)
+            if getattr(vertex, "_cache_pinned", False):
+                self._pinned[id] = vertex
+            else:
+                self._entries[id] = vertex
+                self._sizes[id] = self._approx_size(vertex)
+                self._n_bytes += self._sizes[id]
+            self.refresh_name(vertex)
+            self._evict()
+
+    def __delitem__(self, id):
+        with self._lock:
+            if id not in self:
+                raise KeyError(id)
+            self._remove(id)
+
+    def get(self, id, default=None):
+        """Return the cached vertex with ID :param id:, or :param default: if
+        it is not cached. The lookup is counted as a hit or a miss.
+        """
+        with self._lock:
+            try:
+                vertex = self[id]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return vertex
+
+    def peek(self, id, default=None):
+        """Return the cached vertex with ID :param id:, or :param default: if
+        it is not cached, without counting the lookup.
+        """
+        with self._lock:
+            try:
+                return self[id]
+            except KeyError:
+                return default
+
+    def setdefault(self, id, vertex):
+        """If a vertex with ID :param id: is cached, return it; otherwise cache
+        :param vertex: and return it.
+        """
+        with self._lock:
+            if id in self:
+                return self[id]
+            self[id] = vertex
+            return vertex
+
+    def pop(self, id, default=None):
+        """Remove the vertex with ID :param id: from the cache and return it, or
+        return :param default: if it is not cached.
+        """
+        with self._lock:
+            vertex = self._pinned.get(id, self._entries.get(id, default))
+            self._remove(id)
+            return vertex
+
+    def find_name(self, category: str, value):
+        """Return the cached active vertex of category :param category: whose
+        primary attribute is :param value:, or None if there is none or it was
+        indexed more than name_ttl seconds ago. The lookup is counted as a hit
+        or a miss.
+        """
+        with self._lock:
+            id, expiry = self._names.get((category, value), (None, None))
+            if expiry is not None and expiry < time.monotonic():
+                del self._names[(category, value)]
+                id = None
+            if id is None or id not in self:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self[id]
+
+    def refresh_name(self, vertex):
+        """Bring the name index up to date for :param vertex:, which should be
+        called whenever a cached vertex is read, disabled or replaced.
+        """
+        key = self._name_key(vertex)
+        if key is None:
+            return
+        with self._lock:
+            if getattr(vertex, "active", True) and vertex.id() in self:
+                self._missing.pop(key, None)
+                if self.name_ttl is None:
+                    self._names[key] = (vertex.id(), None)
+                elif self.name_ttl > 0:
+                    self._names[key] = (vertex.id(),
+                                        time.monotonic() + self.name_ttl)
+            else:
+                self._unindex_name(vertex)
+
+    def is_known_missing(self, category: str, value) -> bool:
+        """Return whether a vertex of category :param category: with primary
+        attribute :param value: was recently found not to be in the DB.
+        """
+        with self._lock:
+            expiry = self._missing.get((category, value))
+            if expiry is None:
+                return False
+            if expiry < time.monotonic():
+                del self._missing[(category, value)]
+                return False
+            return True
+
+    def mark_missing(self, category: str, value):
+        """Remember, for negative_ttl seconds, that there is no active vertex
+        of category :param category: with primary attribute :param value: in
+        the DB.
+        """
+        if self.negative_ttl <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # Do not let names that are never looked up again pile up.
+            if len(self._missing) >= 1024:
+                self._missing = {k: v for k, v in self._missing.items() \
+                                 if v >= now}
+            self._missing[(category, value)] = now + self.negative_ttl
+
+    def values(self):
+        """Return a list of all the cached vertices."""
+        with self._lock:
+            return list(self._pinned.values()) + list(self._entries.values())
+
+    def stats(self):
+        """Return the cache counters and sizes.
+
+        :return: A dictionary with the keys "hits", "misses", "evictions",
+            "size" (the number of cached vertices), "pinned" (how many of
+            those are pinned), "names" (the size of the name index),
+            "known_missing" (the size of the record of names not in the DB),
+            "bytes" (the approximate memory taken by the unpinned ones),
+            "max_entries" and "max_bytes".
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self),
+                "pinned": len(self._pinned),
+                "names": len(self._names),
+                "known_missing": len(self._missing),
+                "bytes": self._n_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes
+            }
+
+    def _remove(self, id):
+        """Remove an entry, if present, without counting an eviction."""
+        vertex = self._pinned.pop(id, None)
+        if vertex is None:
+            vertex = self._entries.pop(id, None)
+            if vertex is not None:
+                self._n_bytes -= self._sizes.pop(id)
+        if vertex is not None:
+            self._unindex_name(vertex)
+
+    def _unindex_name(self, vertex):
+        """Remove the name index entry of a vertex that is no longer cached."""
+        key = self._name_key(vertex)
+        if key is not None and \
+           self._names.get(key, (None,))[0] == vertex.id():
+            del self._names[key]
+
+    @staticmethod
+    def _name_key(vertex):
+        """Return the (category, primary attribute) key of a vertex, or None if
+        its class has no primary attribute.
+        """
+        primary_attr = getattr(vertex, "primary_attr", None)
+        if primary_attr is None or not hasattr(vertex, primary_attr):
+            return None
+        return (vertex.category, getattr(vertex, primary_attr))
+
+    def _evict(self):
+        """Evict the least recently used unpinned vertices until the cache is
+        within its limits.
+        """
+        while len(self._entries) > 0 and (
+            (self.max_entries is not None and \
+             len(self._entries) > self.max_entries) or \
+            (self.max_bytes is not None and self._n_bytes > self.max_bytes)
+        ):
+            id, vertex = self._entries.popitem(last=False)
+            self._n_bytes -= self._sizes.pop(id)
+            self._unindex_name(vertex)
+            self.evictions += 1
+
+    @staticmethod
+    def _approx_size(vertex):
+        """Return a rough estimate of the memory used by a vertex: the object
+        itself and its attribute values, but not other vertices it refers to.
+        """
+        n = sys.getsizeof(vertex)
+        for val in getattr(vertex, "__dict__", {}).values():
+            n += sys.getsizeof(val)
+            if isinstance(val, (list, tuple)):
+                n += sum(sys.getsizeof(v) for v in val)
+        return n
+
+class ComponentIntervals(object):
+    """The active connections, properties and subcomponent relations of one
+    component, sorted by start time, for answering time queries locally.
+
+    Each connection record is a tuple (start time, end time, edge ID, ID of
+    the other component, edge properties); each property record is a tuple
+    (start time, end time, edge ID, property vertex ID, edge properties), kept
+    per property type; each subcomponent record is a tuple (edge ID, ID of the
+    vertex the edge goes into, ID of the vertex it goes out of).
+    """
+
+    def __init__(self, connections, properties, subcomponents):
+        """
+        :param connections: The connection records.
+        :type connections: list[tuple]
+        :param properties: A dictionary from property type ID to the records of
+            the properties of that type.
+        :type properties: dict
+        :param subcomponents: The subcomponent records.
+        :type subcomponents: list[tuple]
+        """
+        self.subcomponents = subcomponents
+        self._conns = self._sorted(connections)
+        self._conns_with = {}
+        for r in self._conns[1]:
+            self._conns_with.setdefault(r[3], []).append(r)
+        self._conns_with = {k: self._sorted(v) \
+                            for k, v in self._conns_with.items()}
+        self._props = {k: self._sorted(v) for k, v in properties.items()}
+
+    @staticmethod
+    def _sorted(records):
+        records = sorted(records, key=lambda r: r[0])
+        return ([r[0] for r in records], records)
+
+    @staticmethod
+    def _at(starts_records, at_time, disjoint):
+        """Return the records whose interval contains :param at_time:. If the
+        intervals are :param disjoint:, then only the last ones that start
+        before the time need to be looked at, which takes O(log n).
+        """
+        starts, records = starts_records
+        k = bisect.bisect_right(starts, at_time)
+        if not disjoint:
+            return [r for r in records[:k] if r[1] > at_time]
+        ret = []
+        for r in reversed(records[:k]):
+            if r[1] <= at_time:
+                break
+            ret.append(r)
+        return ret[::-1]
+
+    def connections_at(self, at_time: int, others: list = None) -> list:
+        """Return the records of the connections in effect at
+        :param at_time:, optionally only those with the components whose IDs
+        are in :param others:.
+        """
+        if others is None:
+            return self._at(self._conns, at_time, False)
+        ret = []
+        for o in others:
+            if o in self._conns_with:
+                ret.extend(self._at(self._conns_with[o], at_time, True))
+        return ret
+
+    def properties_at(self, type_id, at_time: int) -> list:
+        """Return the records of the properties of the property type with ID
+        :param type_id: in effect at :param at_time:.
+        """
+        if type_id not in self._props:
+            return []
+        return self._at(self._props[type_id], at_time, True)
+
+class IntervalIndex(object):
+    """An optional cache of the time intervals of the connections and
+    properties of components, so that repeated time queries on the same
+    components, e.g., when scanning over many times, are answered without
+    querying the DB.
+
+    Entries are per component, hold all its active intervals, and are
+    dropped whenever padloper changes an edge of the component, as well as
+    after `ttl` seconds, to pick up changes made by other clients. The least
+    recently used entries are dropped beyond `max_components`.
+
+    :ivar max_components: The maximum number of components to hold, or None
+        for no limit.
+    :ivar ttl: How many seconds an entry is valid for, or None for no limit.
+    :ivar hits: The number of lookups that found an entry.
+    :ivar misses: The number of lookups that did not.
+    """
+
+    max_components: int
+    ttl: float
+    hits: int
+    misses: int
+
+    def __init__(self, max_components: int = 10000, ttl: float = 60):
+        """
+        :param max_components: The maximum number of components to hold; if
+            None, there is no limit.
+        :type max_components: int or None
+        :param ttl: How many seconds an entry is valid for; if None, entries
+            are only dropped when padloper changes the component's edges.
+        :type ttl: float or None
+        """
+        self.max_components = max_components
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self.clear()
+
+    def _after_fork(self):
+        """In a forked child, replace the lock, which another thread of the
+        parent may have been holding when it forked. The entries are kept.
+        """
+        self._lock = threading.RLock()
+
+    def clear(self):
+        """Empty the index and reset the counters."""
+        with self._lock:
+            self._entries = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, id):
+        """Return the ComponentIntervals of the component with ID :param id:,
+        or None if it is not held or has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is None or \
+               (entry[1] is not None and entry[1] < time.monotonic()):
+                self._entries.pop(id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, id, intervals: ComponentIntervals):
+        """Hold :param intervals: for the component with ID :param id:."""
+        with self._lock:
+            expiry = None if self.ttl is None else time.monotonic() + self.ttl
+            self._entries[id] = (intervals, expiry)
+            self._entries.move_to_end(id)
+            while self.max_components is not None and \
+                  len(self._entries) > self.max_components:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *ids):
+        """Drop the entries of the vertices with IDs :param ids:, if held."""
+        with self._lock:
+            for id in ids:
+                self._entries.pop(id, None)
+
+    def stats(self):
+        """Return the counters and size.
+
+        :return: A dictionary with the keys "hits", "misses", "size",
+            "max_components" and "ttl".
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_components": self.max_components,
+                "ttl": self.ttl
+            }
@@ -0,0 +1,209 @@
+"""
+_changes.py
+
+Finding what changed in the layout between two times, and what was edited
+since a watermark.
+"""
+import time
+
+from gremlin_python.process.traversal import P
+from gremlin_python.process.graph_traversal import __
+
+import _global as g
+from _base import _parse_time
+from _edges import RelationConnection, RelationFlagComponent, \
+                   RelationFlagSeverity, RelationFlagType, RelationProperty, \
+                   RelationPropertyType
+from _flag_nodes import Flag
+
+def diff(t1, t2):
+    """Return what changed in the layout after time :param t1: and up to and
+    including time :param t2:: the connections made and ended, the properties
+    set and ended, and the flags started and ended.
+
+    Only the connections, properties and flags whose start or end times fall
+    in (t1, t2] are queried, using the indices on these times, so the cost
+    scales with the number of changes rather than with the size of the layout.
+    Connections, properties and flags that were disabled are left out.
+
+    :param t1: The start of the time range, exclusive.
+    :type t1: int or datetime or Timestamp
+    :param t2: The end of the time range, inclusive.
+    :type t2: int or datetime or Timestamp
+
+    :return: A dictionary with the keys "from" and "to" (the times), and
+        "connections_added", "connections_removed", "properties_set",
+        "properties_ended", "flags_started" and "flags_ended", which are lists
+        of records sorted by time. Connection records have the keys "id",
+        "components" (the names of the two components), "time", "uid" and
+        "comments"; property records have "id", "component", "type", "values",
+        "time", "uid" and "comments"; flag records have "id", "type",
+        "severity", "components", "notes", "time", "uid" and "comments".
+    :rtype: dict
+    """
+    t1, t2 = _parse_time(t1), _parse_time(t2)
+    if t2 < t1:
+        raise ValueError("The end of the time range is before its start.")
+
+    ret = {"from": t1, "to": t2}
+    for when, key in (("start", "added"), ("end", "removed")):
+        ret["connections_%s" % key] = _connection_changes(t1, t2, when)
+    for when, key in (("start", "set"), ("end", "ended")):
+        ret["properties_%s" % key] = _property_changes(t1, t2, when)
+    for when, key in (("start", "started"), ("end", "ended")):
+        ret["flags_%s" % key] = _flag_changes(t1, t2, when)
+    return ret
+
+def _in_range(t, when, t1, t2):
+    """Filter :param t: on the "start" or "end" time, :param when:, being in
+    (t1, t2], and on being active.
+    """
+    return t.has("%s_time" % when, P.gt(t1).and_(P.lte(t2))) \
+            .has("active", True)
+
+def _timestamp_by(t, when):
+    """Add to the projection :param t: the time, uid and comments of the
+    "start" or "end" timestamp, :param when:.
+    """
+    return t.by(__.values("%s_time" % when)) \
+            .by(__.values("%s_uid" % when)) \
+            .by(__.values("%s_comments" % when))
+
+def _sorted(records):
+    return sorted(records, key=lambda r: r["time"])
+
+def _connection_changes(t1, t2, when):
+    """Return the records of the connections starting or ending, according to
+    :param when:, in (t1, t2].
+    """
+    q = _in_range(g.t.E(), when, t1, t2).hasLabel(RelationConnection.category)
+    q = q.project("id", "components", "time", "uid", "comments") \
+         .by(__.id_()).by(__.bothV().values("name").fold())
+    return _sorted([{**r, "id": r["id"]["@value"]["relationId"]} \
+                    for r in _timestamp_by(q, when).toList()])
+
+def _property_changes(t1, t2, when):
+    """Return the records of the properties set or ended, according to
+    :param when:, in (t1, t2].
+    """
+    q = _in_range(g.t.E(), when, t1, t2).hasLabel(RelationProperty.category)
+    q = q.project("id", "component", "type", "values", "time", "uid",
+                  "comments") \
+         .by(__.id_()).by(__.outV().values("name")) \
+         .by(__.inV().out(RelationPropertyType.category).values("name")) \
+         .by(__.inV().values("values").fold())
+    return _sorted([{**r, "id": r["id"]["@value"]["relationId"]} \
+                    for r in _timestamp_by(q, when).toList()])
+
+def _flag_changes(t1, t2, when):
+    """Return the records of the flags started or ended, according to
+    :param when:, in (t1, t2].
+    """
+    q = _in_range(g.t.V(), when, t1, t2).has("category", Flag.category)
+    q = q.project("id", "type", "severity", "components", "notes", "time",
+                  "uid", "comments") \
+         .by(__.id_()) \
+         .by(__.out(RelationFlagType.category).values("name")) \
+         .by(__.out(RelationFlagSeverity.category).values("name")) \
+         .by(__.out(RelationFlagComponent.category).values("name").fold()) \
+         .by(__.coalesce(__.values("notes"), __.constant("")))
+    return _sorted(_timestamp_by(q, when).toList())
+
+# The properties stamped with the time of each change made to a vertex or edge.
+_EDIT_TIME_KEYS = ("time_added", "time_disabled", "start_edit_time",
+                   "end_edit_time")
+
+def changes_since(watermark: int = g._TIMESTAMP_NO_EDITTIME_VALUE,
+                  batch_size: int = 1000, overlap: int = 60):
+    """Return all the vertices and edges that were added, disabled, started or
+    ended after :param watermark:, and the watermark to pass next time.
+
+    This is meant for keeping a mirror or cache in sync incrementally: call it
+    with the watermark it returned last time to get only what was changed
+    since. Each edit time property is searched with its own range query,
+    using the indices on them, so the cost scales with the number of changes.
+
+    Edit times are set by the clocks of the clients making the changes, and
+    a change can be committed some time after its edit time, so changes
+    stamped just before the watermark may only become visible after it was
+    returned. To not lose them, the changes made up to :param overlap:
+    seconds before :param watermark: are returned again, as well as those
+    made after it. A vertex or edge can therefore be returned by two
+    consecutive calls; since records hold the current state, callers should
+    deduplicate them by "element" and "id", keeping the latest.
+
+    :param watermark: Return the changes made after this (UNIX) time. By
+        default, everything is returned.
+    :type watermark: int
+    :param batch_size: The number of records in each batch.
+    :type batch_size: int
+    :param overlap: How many seconds before :param watermark: to read again;
+        this should exceed the clock skew between the clients plus the
+        longest time a change takes to commit.
+    :type overlap: int
+
+    :return: A generator of batches, which are lists of records, and the new
+        watermark. Vertex records have the keys "element" (equal to
+        "vertex"), "id", "category" and "properties"; edge records have the
+        keys "element" (equal to "edge"), "id", "category", "out", "in" (the
+        IDs of the vertices at either end) and "properties". "properties" is a
+        dictionary of all the properties of the vertex or edge, including its
+        edit times. Within one call, each vertex or edge is returned only
+        once, in its current state. The new watermark is the time of the
+        call, on the clock of this client.
+    :rtype: tuple[generator[list[dict]], int]
+    """
+    new_watermark = int(time.time())
+    since = watermark
+    if watermark != g._TIMESTAMP_NO_EDITTIME_VALUE:
+        since = max(watermark - overlap, g._TIMESTAMP_NO_EDITTIME_VALUE)
+    return _change_batches(since, batch_size), new_watermark
+
+def _change_batches(t1, batch_size):
+    """Yield, in lists of :param batch_size:, the records of the vertices and
+    edges with an edit time after :param t1:.
+    """
+    seen = set()
+    batch = []
+    for element in ("vertex", "edge"):
+        for key in _EDIT_TIME_KEYS:
+            for r in g._stream_traversal(_changed(element, key, t1),
+                                         batch_size):
+                r = _change_record(element, r)
+                if r["id"] in seen:
+                    continue
+                seen.add(r["id"])
+                batch.append(r)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+def _changed(element, key, t1):
+    """Return the traversal for the vertices or edges, according to
+    :param element:, whose edit time property :param key: is after
+    :param t1:.
+    """
+    if element == "vertex":
+        return g.t.V().has(key, P.gt(t1)) \
+                  .project("id", "properties") \
+                  .by(__.id_()).by(__.valueMap())
+    return g.t.E().has(key, P.gt(t1)) \
+              .project("id", "category", "out", "in", "properties") \
+              .by(__.id_()).by(__.label()) \
+              .by(__.outV().id_()).by(__.inV().id_()) \
+              .by(__.valueMap())
+
+def _change_record(element, r):
+    """Turn a result of :func:`_changed` into a change record."""
+    if element == "vertex":
+        # The values of a vertex property come as lists; only "values" has
+        # more than one.
+        props = {k: v if k == "values" else v[0] \
+                 for k, v in r["properties"].items()}
+        return {"element": element, "id": r["id"],
+                "category": props.get("category"), "properties": props}
+    return {"element": element, "id": r["id"]["@value"]["relationId"],
+            "category": r["category"], "out": r["out"], "in": r["in"],
+            "properties": r["properties"]}
@@ -10,12 +10,22 @@ from gremlin_python.process.graph_traversal import __, constant
 
 from _exceptions import *
 from _base import strictraise, Edge, Timestamp, Vertex, VertexAttr,\
-                  _parse_time
+                  _parse_time, _invalidate_intervals
+from _cache import ComponentIntervals
 from _edges import RelationVersionAllowedType, RelationVersion,\
                    RelationComponentType, RelationSubcomponent,\
                    RelationProperty, RelationPropertyType,\
                    RelationFlagComponent, RelationConnection
 
+def _timestamp_dicts(edge_props):
+    """Return the dictionary representations of the start and end timestamps
+    in the value map :param edge_props: of a timestamped edge.
+    """
+    return {
+        "start": Timestamp._from_dict(edge_props, "start_").as_dict(),
+        "end": Timestamp._from_dict(edge_props, "end_").as_dict()
+    }
+
 class ComponentType(Vertex):
     """
     The representation of a component type.
@@ -30,6 +40,7 @@ class ComponentType(Vertex):
         VertexAttr("comments", str, optional=True, default="")
     ]
     primary_attr: str = "name"
+    _cache_pinned: bool = True
     name: str = "default"
     # comments: str 
 
@@ -42,12 +53,25 @@ class ComponentType(Vertex):
         the corresponding value of the 'versions' key is a list of the names
         of all of the versions.
 
-        Used for updating the filter panels.
+        Used for updating the filter panels. If padloper.preload_types() has
+        been called, this is served from the vertex cache without querying.
 
         :return: a list of dictionaries, of the format
         {'type': <ctypename>, 'versions': [<revname>, ..., <revname>]}
         :rtype: list[dict]
         """
+        if g._types_preloaded:
+            types, versions = [], {}
+            for v in g._vertex_cache.values():
+                if not v.active:
+                    continue
+                if v.category == ComponentType.category:
+                    types.append(v)
+                elif v.category == ComponentVersion.category:
+                    versions.setdefault(v.type.id(), []).append(v.name)
+            return [{'name': t.name,
+                     'versions': sorted(versions.get(t.id(), []))} \
+                    for t in sorted(types, key=lambda t: t.name)]
 
         ts = g.t.V().has('active', True)\
                 .has('category', ComponentType.category) \
@@ -83,6 +107,7 @@ class ComponentVersion(Vertex):
         VertexAttr("type", ComponentType, edge_class=RelationVersionAllowedType)
     ]
     primary_attr: str = "name"
+    _cache_pinned: bool = True
 
     def __repr__(self):
         return f"{self.category}: {self.name}"
@@ -123,6 +148,49 @@ class Component(Vertex):
             type "{self.type.name}", \
             {version_text}, id {self.id()}'
 
+    def _intervals(self):
+        """Return the ComponentIntervals of this component from the interval
+        index, loading them with one query if they are not held, or None if
+        the interval index is not in use.
+
+        :rtype: ComponentIntervals or None
+        """
+        if g._interval_index is None:
+            return None
+        intervals = g._interval_index.get(self.id())
+        if intervals is not None:
+            return intervals
+
+        edges = g.t.V(self.id()).bothE(RelationConnection.category,
+                                       RelationProperty.category,
+                                       RelationSubcomponent.category) \
+                   .has('active', True) \
+                   .project('id', 'label', 'in', 'out', 'props', 'ptype') \
+                   .by(__.id_()).by(__.label()) \
+                   .by(__.inV().id_()).by(__.outV().id_()) \
+                   .by(__.valueMap()) \
+                   .by(__.inV().out(RelationPropertyType.category).id_() \
+                         .fold()) \
+                   .toList()
+
+        conns, props, subs = [], {}, []
+        for e in edges:
+            e_id = e['id']['@value']['relationId']
+            if e['label'] == RelationSubcomponent.category:
+                subs.append((e_id, e['in'], e['out']))
+                continue
+            other = e['out'] if e['in'] == self.id() else e['in']
+            r = (e['props']['start_time'], e['props']['end_time'], e_id,
+                 other, e['props'])
+            if e['label'] == RelationConnection.category:
+                conns.append(r)
+            elif len(e['ptype']) > 0:
+                props.setdefault(e['ptype'][0], []).append(r)
+
+        intervals = ComponentIntervals(conns, props, subs)
+        g._interval_index.put(self.id(), intervals)
+        return intervals
+
     def get_property(self, type, at_time: int):
         """
         Given a property type, get a property of this component active at time
@@ -149,15 +217,20 @@ class Component(Vertex):
                 "has not yet been added to the database."
             )
 
-        # list of property vertices of this property type
-        # and active at this time
-        vs = g.t.V(self.id()).bothE(RelationProperty.category) \
-                .has('active', True) \
-                .has('start_time', P.lte(at_time)) \
-                .has('end_time', P.gt(at_time)).otherV().as_('v') \
-                .both(RelationPropertyType.category) \
-                .has('name', type.name) \
-                .select('v').toList()
+        intervals = self._intervals()
+        if intervals is not None:
+            vs = [r[3] for r in intervals.properties_at(type.id(), at_time)]
+        else:
+            # list of property vertices of this property type
+            # and active at this time
+            vs = [v.id for v in g.t.V(self.id()) \
+                    .bothE(RelationProperty.category) \
+                    .has('active', True) \
+                    .has('start_time', P.lte(at_time)) \
+                    .has('end_time', P.gt(at_time)).otherV().as_('v') \
+                    .both(RelationPropertyType.category) \
+                    .has('name', type.name) \
+                    .select('v').toList()]
 
         # If no such vertices found
         if len(vs) == 0:
@@ -167,7 +240,7 @@ class Component(Vertex):
 
         assert len(vs) == 1
 
-        return Property.from_id(vs[0].id)
+        return Property.from_id(vs[0])
 
     def get_all_properties(self):
         """Return all properties, along with their edges of this component as
@@ -225,6 +298,7 @@ class Component(Vertex):
 
         :rtype: list[RelationProperty]
         """
+        from _property_nodes import Property
 
         if not self.in_db(strict_check=False):
             raise ComponentNotAddedError(
@@ -245,20 +319,19 @@ class Component(Vertex):
             edges = edges.has('start_time', P.lt(to_time))
 
         edges = edges.has('end_time', P.gt(from_time)) \
-            .as_('e').otherV().as_('v') \
-            .both(RelationPropertyType.category) \
-            .has('name', type.name) \
-            .select('e').order().by(__.values('start_time'), Order.asc) \
-            .project('properties', 'id').by(__.valueMap()).by(__.id_()).toList()
+            .where(__.otherV().both(RelationPropertyType.category) \
+                     .has('name', type.name)) \
+            .order().by(__.values('start_time'), Order.asc) \
+            .project('properties', 'id', 'property') \
+            .by(__.valueMap()).by(__.id_()).by(__.otherV().id_()).toList()
 
-        print("Warning: RelationProperty not initialised properly! "\
-              "outVertex should not = type but the property vertex …")
+        props = Property.from_ids([e['property'] for e in edges])
         return [RelationProperty(
-            inVertex=self, outVertex=type,
-            start=Timestamp._from_dict(q["properties"], "start_"),
-            end=Timestamp._from_dict(q["properties"], "end_"),
+            inVertex=prop, outVertex=self,
+            start=Timestamp._from_dict(e["properties"], "start_"),
+            end=Timestamp._from_dict(e["properties"], "end_"),
             id=e['id']['@value']['relationId']  # weird but you have to
-        ) for e in edges]
+        ) for e, prop in zip(edges, props)]
 
     def get_all_flags(self):
         """Return all flags connected to this component of the form (Flag)
@@ -271,6 +344,8 @@ class Component(Vertex):
                 f"Component {self.name} has not yet been added to the database."
             )
 
+        from _flag_nodes import Flag
+
         # list of flag vertices of this flag type and flag severity and active at this time.
 
         query = g.t.V(self.id()).bothE(RelationFlagComponent.category)\
@@ -299,7 +374,7 @@ class Component(Vertex):
         query = g.t.V(self.id()).inE(RelationSubcomponent.category) \
                    .has('active', True).otherV().id_()
 
-        return [Component.from_id(q) for q in query.toList()]
+        return Component.from_ids(query.toList())
 
     def get_supercomponents(self):
         """Return all supercomponents connected to this component of the form
@@ -318,7 +393,7 @@ class Component(Vertex):
         query = g.t.V(self.id()).outE(RelationSubcomponent.category) \
                    .has('active', True).otherV().id_()
 
-        return [Component.from_id(q) for q in query.toList()]
+        return Component.from_ids(query.toList())
 
     def set_property(
         self, property, start: Timestamp, end: Timestamp = None, 
@@ -389,7 +464,7 @@ class Component(Vertex):
                         )
 
                     else:
-                        end = Timestamp(existing_properties[0].start_time,
+                        end = Timestamp(existing_properties[0].start.time,
                                         start.comments)
                 else:
                     raise ComponentSetPropertyBeforeExistingPropertyError(
@@ -453,14 +528,19 @@ class Component(Vertex):
             )
 
         # Check to see if the property already has an end time.
-        vs = g.t.V(self.id()).bothE(RelationProperty.category) \
-                .has('active', True) \
-                .has('start_time', P.lte(end.time)) \
-                .has('end_time', P.gt(end.time)) \
-                .as_('e').valueMap().as_('edge_props').select('e') \
-                .otherV().as_('v').both(RelationPropertyType.category) \
-                .has('name', property.type.name) \
-                .select('edge_props').toList()
+        intervals = self._intervals()
+        if intervals is not None:
+            vs = [r[4] for r in intervals.properties_at(property.type.id(),
+                                                        end.time)]
+        else:
+            vs = g.t.V(self.id()).bothE(RelationProperty.category) \
+                    .has('active', True) \
+                    .has('start_time', P.lte(end.time)) \
+                    .has('end_time', P.gt(end.time)) \
+                    .as_('e').valueMap().as_('edge_props').select('e') \
+                    .otherV().as_('v').both(RelationPropertyType.category) \
+                    .has('name', property.type.name) \
+                    .select('edge_props').toList()
         if len(vs) == 0:
             raise PropertyNotAddedError(
                 f"Property of type {property.type.name} cannot be unset for "\
@@ -482,6 +562,7 @@ class Component(Vertex):
            .property('end_time', end.time).property('end_uid', end.uid) \
            .property('end_edit_time', end.edit_time) \
            .property('end_comments', end.comments).iterate()
+        _invalidate_intervals(self.id())
 
     def replace_property(self, propertyTypeName: str, property, at_time: int,
                          uid: str, start: Timestamp, comments="",):
@@ -528,18 +609,19 @@ class Component(Vertex):
             start=start
         )
 
-    def disable_property(self, propertyTypeName,
-                         disable_time: int = int(time.time())):
+    def disable_property(self, propertyTypeName, disable_time: int = None):
         """Disables the property in the serverside
 
         :param propertyTypeName: The name of the property type being replaced.
         :type propertyTypeName: str
 
         :param disable_time: When this vertex was disabled in the database
-            (UNIX time).
-        :type disable_time: int
+            (UNIX time); if None, the current time is used.
+        :type disable_time: int or None
 
         """
+        if disable_time is None:
+            disable_time = int(time.time())
 
         g.t.V(self.id()).bothE(RelationProperty.category)\
            .has('active', True)\
@@ -548,6 +630,7 @@ class Component(Vertex):
            .properties('name').value().is_(propertyTypeName))\
            .property('active', False).property('time_disabled', disable_time)\
            .next()
+        _invalidate_intervals(self.id())
 
     def connect(
         self, comp, start: Timestamp, end: Timestamp = None,
@@ -714,8 +797,7 @@ class Component(Vertex):
             curr_conn[0]._end(end)
 
 
-    def disable_connection(self, comp,
-                           disable_time: int = int(time.time())):
+    def disable_connection(self, comp, disable_time: int = None):
         """Disables the connection in the serverside
 
         :param comp: Component that this component has connection with.
@@ -772,6 +854,33 @@ class Component(Vertex):
         # Build up the result of format (property vertex, relation)
         result = []
 
+        intervals = self._intervals() if at_time else None
+        if intervals is not None:
+            if not exclude_subcomps:
+                subs = [r for r in intervals.subcomponents \
+                        if not comp or r[1] in comp_id or r[2] in comp_id]
+                comps = dict(zip(
+                    [r[1] for r in subs] + [r[2] for r in subs],
+                    Component.from_ids([r[1] for r in subs] + \
+                                       [r[2] for r in subs])
+                ))
+                for r in subs:
+                    result.append(RelationSubcomponent(
+                        inVertex=comps[r[1]], outVertex=comps[r[2]], id=r[0]
+                    ))
+            conns = intervals.connections_at(at_time,
+                                             comp_id if comp else None)
+            comps = Component.from_ids([r[3] for r in conns])
+            for r, c in zip(conns, comps):
+                result.append(RelationConnection(
+                    inVertex=c,
+                    outVertex=self,
+                    start=Timestamp._from_dict(r[4], "start_"),
+                    end=Timestamp._from_dict(r[4], "end_"),
+                    id=r[2]
+                ))
+            return result
+
         if not exclude_subcomps:
             for inout in ("in", "out"):
                 query = g.t.V(self.id())
@@ -785,8 +894,9 @@ class Component(Vertex):
                 query = query.id_().as_('vertex_id') \
                              .select('e').id_().as_('edge_id') \
                              .select('vertex_id', 'edge_id')
-                for q in query.toList():
-                    c = Component.from_id(q['vertex_id'])
+                query = query.toList()
+                comps = Component.from_ids([q['vertex_id'] for q in query])
+                for q, c in zip(query, comps):
                     if inout == "in":
                         inV, outV = self, c
                     else:
@@ -818,8 +928,9 @@ class Component(Vertex):
                      .select('e').id_().as_('edge_id') \
                      .select('edge_props', 'vertex_id', 'edge_id')
 
-        for q in query.toList():
-            c = Component.from_id(q['vertex_id'])
+        query = query.toList()
+        comps = Component.from_ids([q['vertex_id'] for q in query])
+        for q, c in zip(query, comps):
             edge = RelationConnection(
                 inVertex=c,
                 outVertex=self,
@@ -1044,6 +1155,166 @@ class Component(Vertex):
 
         return result
 
+    def trace_chain(self, at_time: int, max_depth: int = 20,
+                    stop_types: list = None):
+        """Follow the connections from this component, at time
+        :param at_time:, out to the ends of the chain(s) it is part of, e.g.,
+        from a dish through the feed, amplifiers and cables to the correlator
+        input.
+
+        This is done server-side in a single traversal that repeats hops along
+        the connections, never revisiting a component on the same path, until
+        it reaches a component with no further connections, a component of one
+        of :param stop_types:, or :param max_depth: hops.
+
+        :param at_time: The time at which to follow the connections.
+        :type at_time: int
+        :param max_depth: The maximum number of hops.
+        :type max_depth: int
+        :param stop_types: The component types at which to stop.
+        :type stop_types: list[ComponentType or str] or None
+
+        :return: One (components, connections) tuple per path, where the
+            components are in order from this one, and connections[i] is the
+            connection between components[i] and components[i + 1].
+        :rtype: list[tuple(list[Component], list[RelationConnection])]
+        """
+        if not self.in_db(strict_check=False):
+            raise ComponentNotAddedError(
+                f"Component {self.name} has not yet been added to the database."
+            )
+
+        at_time = _parse_time(at_time)
+
+        def hop():
+            return __.bothE(RelationConnection.category) \
+                     .has('active', True) \
+                     .has('start_time', P.lte(at_time)) \
+                     .has('end_time', P.gt(at_time)) \
+                     .otherV().simplePath()
+
+        stops = [__.loops().is_(P.gte(max_depth)), __.not_(hop())]
+        if stop_types:
+            names = [t.name if isinstance(t, ComponentType) else t \
+                     for t in stop_types]
+            stops.append(__.out(RelationComponentType.category) \
+                           .has('name', P.within(*names)))
+
+        paths = g.t.V(self.id()).repeat(hop()).until(__.or_(*stops)) \
+                   .path().by(__.id_()) \
+                   .by(__.project('id', 'in', 'out', 'props') \
+                         .by(__.id_()).by(__.inV().id_()) \
+                         .by(__.outV().id_()).by(__.valueMap())) \
+                   .toList()
+
+        comps = {}
+        for path in paths:
+            for i in range(0, len(path), 2):
+                comps[path[i]] = None
+        comps = dict(zip(comps, Component.from_ids(list(comps))))
+
+        result = []
+        for path in paths:
+            conns = []
+            for e in path[1::2]:
+                conns.append(RelationConnection(
+                    inVertex=comps[e['in']],
+                    outVertex=comps[e['out']],
+                    start=Timestamp._from_dict(e['props'], "start_"),
+                    end=Timestamp._from_dict(e['props'], "end_"),
+                    id=e['id']['@value']['relationId']
+                ))
+            result.append(([comps[i] for i in path[0::2]], conns))
+
+        return result
+
+    def connection_graph(self, at_time: int, depth: int = 1):
+        """Return the neighbourhood of this component at time :param at_time:,
+        that is, all the components within :param depth: hops of it along
+        connections and subcomponent relations, and the edges between them.
+
+        This is done server-side in a single traversal, which visits each
+        component at most once, and each component is serialized once.
+
+        :param at_time: The time at which to follow the connections.
+        :type at_time: int
+        :param depth: The maximum number of hops; must be at least one.
+        :type depth: int
+
+        :return: A dictionary with the keys "nodes", a list of dictionaries
+            with the "id", "name", "type" (name) and "version" (name or None)
+            of the components, and "edges", a list of dictionaries with the
+            "id" of each edge, the "inVertex" and "outVertex" names, whether it
+            is a "subcomponent" relation and, for connections, the "start" and
+            "end" timestamps as dictionaries.
+        :rtype: dict
+        """
+        if not self.in_db(strict_check=False):
+            raise ComponentNotAddedError(
+                f"Component {self.name} has not yet been added to the database."
+            )
+        if depth < 1:
+            raise ValueError("The depth must be at least one.")
+
+        at_time = _parse_time(at_time)
+
+        hop = __.union(__.bothE(RelationConnection.category) \
+                         .has('active', True) \
+                         .has('start_time', P.lte(at_time)) \
+                         .has('end_time', P.gt(at_time)),
+                       __.bothE(RelationSubcomponent.category) \
+                         .has('active', True))
+
+        # Breadth-first search, keeping the visited components in "v" and the
+        # edges followed in "e". aggregate() is a barrier, so the components
+        # of a hop are all in "v" before the next hop filters on it; within a
+        # hop, a component reached along several edges (as in a diamond) is
+        # deduplicated.
+        res = g.t.V(self.id()).aggregate('v') \
+                 .repeat(hop.store('e').otherV().where(P.without('v')) \
+                            .dedup().aggregate('v')) \
+                 .times(depth).cap('v', 'e') \
+                 .project('nodes', 'edges') \
+                 .by(__.select('v').unfold().dedup() \
+                       .project('id', 'name', 'type', 'version') \
+                       .by(__.id_()).by(__.values('name')) \
+                       .by(__.out(RelationComponentType.category) \
+                             .values('name').fold()) \
+                       .by(__.out(RelationVersion.category) \
+                             .values('name').fold()) \
+                       .fold()) \
+                 .by(__.select('e').unfold().dedup() \
+                       .project('id', 'label', 'in', 'out', 'props') \
+                       .by(__.id_()).by(__.label()) \
+                       .by(__.inV().values('name')) \
+                       .by(__.outV().values('name')) \
+                       .by(__.valueMap()) \
+                       .fold()) \
+                 .next()
+
+        nodes = [{
+            'id': n['id'],
+            'name': n['name'],
+            'type': n['type'][0] if len(n['type']) > 0 else None,
+            'version': n['version'][0] if len(n['version']) > 0 else None
+        } for n in res['nodes']]
+
+        edges = []
+        for e in res['edges']:
+            d = {
+                'id': e['id']['@value']['relationId'],
+                'inVertex': e['in'],
+                'outVertex': e['out'],
+                'subcomponent': e['label'] == RelationSubcomponent.category
+            }
+            if not d['subcomponent']:
+                d['start'] = Timestamp._from_dict(e['props'], "start_")\
+                                      .as_dict()
+                d['end'] = Timestamp._from_dict(e['props'], "end_").as_dict()
+            edges.append(d)
+
+        return {'nodes': nodes, 'edges': edges}
+
     def subcomponent_connect(
             self, comp, strict_add=False):
         """
@@ -1134,8 +1405,7 @@ class Component(Vertex):
             id=e[0]['id']['@value']['relationId']
         )
 
-    def disable_subcomponent(self, otherComponent,
-                             disable_time: int = int(time.time())):
+    def disable_subcomponent(self, otherComponent, disable_time: int = None):
         """Disabling an edge for a subcomponent
 
         :param otherComponent: Another Component that this component has 
@@ -1143,17 +1413,25 @@ class Component(Vertex):
         :type othercomponent: Component
 
         :param disable_time: When this edge was disabled in the database (UNIX
-          time).
-        :type disable_time: int
+          time); if None, the current time is used.
+        :type disable_time: int or None
         """
+        if disable_time is None:
+            disable_time = int(time.time())
 
         g.t.V(self.id()).bothE(RelationSubcomponent.category)\
            .where(__.otherV().hasId(otherComponent.id()))\
            .property('active', False)\
            .property('time_disabled', disable_time).next()
+        _invalidate_intervals(self.id(), otherComponent.id())
 
     def as_dict(self, at_time: int = None, bare = False):
         """Return a dictionary representation of this Component at time
+        :param at_time:.
+
+        The properties, connexions, flags and sub/supercomponents are all
+        fetched with a single traversal.
+
         :param at_time: The time to check the component at. Pass `None` to get
           properties/flags/connexions at all times.
         :type at_time: int or None
@@ -1166,41 +1444,68 @@ class Component(Vertex):
         :return: A dictionary representation of this Components's attributes.
         :rtype: dict
         """
-        # TODO: at_time has not yet been implemented!
-        assert(at_time == None)
-        
+        from _flag_nodes import Flag
+        from _property_nodes import Property
+
         base = super().as_dict()
+        if bare:
+            return base
 
-        if not bare:
-            prop_dicts = [{**prop.as_dict(), **rel.as_dict()} \
-                for (prop, rel) in self.get_all_properties()
-            ]
-
-            conn_dicts = [{**{"name": conn.other_vertex(self).name},
-                           **conn.as_dict()} \
-                for conn in self.get_connections(exclude_subcomps=True)
-            ]
-
-            flag_dicts = [flag.as_dict() for flag in self.get_all_flags()]
-
-            subcomp_dicts = [{"name": subcomps.name} \
-                for subcomps in self.get_subcomponents()
-            ]
-        
-            supercomp_dicts = [{"name": supercomps.name} \
-                for supercomps in self.get_supercomponents()
-            ]
-            extra = {
-                'properties': prop_dicts,
-                'connections': conn_dicts,
-                'flags': flag_dicts,
-                'subcomps': subcomp_dicts,
-                'supercomps': supercomp_dicts
-            }
-        else:
-            extra = {}
+        if not self.in_db(strict_check=False):
+            raise ComponentNotAddedError(
+                f"Component {self.name} has not yet been added to the database."
+            )
 
-        return {**base, **extra}
+        def timed(t):
+            if at_time is None:
+                return t
+            at = _parse_time(at_time)
+            return t.has("start_time", P.lte(at)).has("end_time", P.gt(at))
+
+        r = g.t.V(self.id()) \
+               .project("properties", "connections", "flags", "subcomps",
+                        "supercomps") \
+               .by(timed(__.outE(RelationProperty.category) \
+                           .has("active", True)) \
+                   .project("edge", "property") \
+                   .by(__.valueMap()) \
+                   .by(Property._attrs_query(__.inV(), False, 1)) \
+                   .fold()) \
+               .by(timed(__.bothE(RelationConnection.category) \
+                           .has("active", True)) \
+                   .project("edge", "name") \
+                   .by(__.valueMap()) \
+                   .by(__.otherV().values("name")) \
+                   .fold()) \
+               .by(Flag._attrs_query(
+                       timed(__.inE(RelationFlagComponent.category) \
+                               .has("active", True).outV()), False, 2
+                   ).fold()) \
+               .by(__.inE(RelationSubcomponent.category).has("active", True) \
+                     .outV().values("name").fold()) \
+               .by(__.outE(RelationSubcomponent.category).has("active", True) \
+                     .inV().values("name").fold()) \
+               .next()
+
+        props = Property._from_attrs_list([q["property"] \
+                                           for q in r["properties"]])
+        prop_dicts = [{**prop.as_dict(), **_timestamp_dicts(q["edge"])} \
+                      for prop, q in zip(props, r["properties"])]
+
+        conn_dicts = [{"name": q["name"], **_timestamp_dicts(q["edge"])} \
+                      for q in r["connections"]]
+
+        flag_dicts = [flag.as_dict() \
+                      for flag in Flag._from_attrs_list(r["flags"])]
+
+        return {
+            **base,
+            'properties': prop_dicts,
+            'connections': conn_dicts,
+            'flags': flag_dicts,
+            'subcomps': [{"name": name} for name in r["subcomps"]],
+            'supercomps': [{"name": name} for name in r["supercomps"]]
+        }
 
     def __repr__(self):
         return f"{self.category} {self.type.name}: {self.name} ({self._id})"
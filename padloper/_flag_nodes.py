@@ -3,26 +3,12 @@ flag.py
 
 Classes for manipulating flags, flag types and flag severities.
 """
-import time
-import re
-from unicodedata import name
-
-import warnings
-from xmlrpc.client import boolean
-from attr import attr, attributes
-
-from gremlin_python.process.traversal import Order, P, TextP
-from sympy import true
-from gremlin_python.process.graph_traversal import __, constant
-
 import _global as g
-from _base import Vertex, VertexAttr, Timestamp, strictraise
+from _base import Vertex, VertexAttr, Timestamp
 from _component_nodes import Component
 from _exceptions import *
 from _edges import RelationFlagType, RelationFlagComponent, RelationFlagSeverity
 
-from typing import Optional, List
-
 class FlagType(Vertex):
     """The representation of a flag type. 
 
@@ -36,6 +22,7 @@ class FlagType(Vertex):
         VertexAttr("comments", str, optional=True, default="")
     ]
     primary_attr = "name"
+    _cache_pinned = True
 
     @classmethod
     def _attrs_to_type(cls, name: str, comments: str, id: int):
@@ -73,6 +60,7 @@ class FlagSeverity(Vertex):
         VertexAttr("comments", str, optional=True, default="")
     ]
     primary_attr = "name"
+    _cache_pinned = True
 
 
 class Flag(Vertex):
@@ -102,6 +90,24 @@ class Flag(Vertex):
     ]
     _primary_attr = None
 
+    def as_dict(self):
+        """Return a dictionary representation of this flag. The components
+        are represented by their names only, since the dictionary
+        representation of a component includes its flags.
+        """
+        ret = {
+            "type": self.type.as_dict(),
+            "severity": self.severity.as_dict(),
+            "notes": self.notes,
+            "start": self.start.as_dict(),
+            "end": self.end.as_dict(),
+            "components": [{"name": c.name} for c in self.components]
+        }
+        for x in ["time_added", "uid_added", "time_disabled", "uid_disabled",
+                  "active", "replacement"]:
+            ret[x] = getattr(self, x)
+        return ret
+
     def end_flag(self, dummy):
         raise RuntimeError("Method deprecated. Use set_end().")
 
@@ -5,16 +5,16 @@ Contains declarations and methods for graph connections. Also holds our global
 variables.
 """
 import os
-from gremlin_python.process.graph_traversal import GraphTraversalSource
-import gremlin_python.structure.graph as gremlin_graph
-from gremlin_python.driver.driver_remote_connection \
-        import DriverRemoteConnection
+from _cache import VertexCache
+from _pool import ConnectionPool, PooledTraversalSource
 
-_conn: DriverRemoteConnection
+# The pool of connections to the server, set up by start_connection(), or with
+# the defaults on first use.
+_pool: ConnectionPool = None
 
-_graph = gremlin_graph.Graph()
-
-t: GraphTraversalSource
+# The traversal source to build all traversals from. Each use is forwarded to
+# the traversal source of the current thread in the pool.
+t = PooledTraversalSource(lambda: connection_pool())
 
 # A placeholder value for the end_time attribute for a
 # relation that is still ongoing.
@@ -27,46 +27,105 @@ _TIMESTAMP_NO_EDITTIME_VALUE = -1
 # Placeholder for the ID of an element that does not exist serverside.
 _VIRTUAL_ID_PLACEHOLDER = -1
 
-# A cache to prevent querying the DB more than necessary.
-_vertex_cache = dict()
+# A cache to prevent querying the DB more than necessary. Its size can be set
+# with the PADLOPER_CACHE_MAX_ENTRIES environment variable, or the whole cache
+# swapped out with padloper.set_vertex_cache().
+_vertex_cache = VertexCache(
+    max_entries=int(os.environ.get('PADLOPER_CACHE_MAX_ENTRIES', 100000))
+)
+
+# The optional index of the connection and property intervals of components,
+# set with padloper.set_interval_index(); None if it is not used.
+_interval_index = None
+
+# Whether preload_types() has filled the vertex cache with all the type-like
+# vertices, and the (thread, stop event, interval) of its background refresh.
+_types_preloaded = False
+_type_refresh = None
 
 # For storing the user for when that needs to get tracked.
 _user = None
 
 
 
-def start_connection(host: str = "ws://localhost", port: int=8182, traversal_source: str='g') -> None:
-    """Start a connection with janusgraph with port :param port: 
-    with traversal source :traversal_source:.
+def start_connection(host: str = "ws://localhost", port: int=8182,
+                     traversal_source: str='g', pool_size: int = None) -> None:
+    """Set up a pool of connections with janusgraph with port :param port: 
+    with traversal source :traversal_source:. Any previous pool is closed.
+
+    The connections are only opened when they are first used. Calling this is
+    optional: if it has not been called by the first traversal, the pool is
+    set up with the host in the DB_HOST environment variable and the
+    defaults.
 
     :param port: The port to connect to on localhost, defaults to 8182
     :type port: int, optional
     :param traversal_source: The serverside traversal source to query, 
     defaults to 'g' (don't change this unless you also change it serverside)
     :type traversal_source: str, optional
+    :param pool_size: The number of connections in the pool; by default, the
+        value of the PADLOPER_POOL_SIZE environment variable, or 4.
+    :type pool_size: int, optional
     """
 
-    global _conn
-    global t
+    global _pool
 
-    _conn = DriverRemoteConnection(
-        f'{host}:{port}/gremlin', 
-        traversal_source
-    )
+    if pool_size is None:
+        pool_size = int(os.environ.get('PADLOPER_POOL_SIZE', 4))
+    if _pool is not None:
+        _pool.close()
 
-    t = _graph.traversal().withRemote(_conn)
+    _pool = ConnectionPool(f'{host}:{port}/gremlin', traversal_source,
+                           size=pool_size)
+
+
+def connection_pool() -> ConnectionPool:
+    """Return the pool of connections, e.g., to borrow a connection for a
+    block of code or to start health checks. If start_connection() has not
+    been called yet, it is called with the defaults.
+
+    :rtype: ConnectionPool
+    """
+    if _pool is None:
+        start_connection(host=os.environ.get('DB_HOST', 'ws://localhost'))
+    return _pool
+
+
+def _stream_traversal(traversal, batch_size: int = 1000):
+    """Iterate over the results of :param traversal: as the server sends them,
+    in batches of :param batch_size:, rather than waiting for all of them as
+    toList() does. This keeps the memory used by large results down and lets
+    the caller start processing the first results early.
+
+    :param traversal: A traversal built from `t`.
+    :param batch_size: The number of results the server sends per message.
+    :type batch_size: int
+    """
+    yield from connection_pool().stream(traversal.bytecode, batch_size)
 
 
 def end_connection() -> None:
-    """Close the _conn connection.
+    """Close all the connections in the pool.
 
     Calling this will get rid of the RuntimeError that at the end of
     the Python sessions.
     """
 
-    global _conn
+    if _pool is not None:
+        _pool.close()
 
-    _conn.close()
 
-# Start the default connection when this module is loaded.
-start_connection(host=os.environ.get('DB_HOST', 'ws://localhost'))
+def _after_fork_in_child() -> None:
+    """Make the state inherited from the parent process safe to use in a
+    forked child, such as a gunicorn worker started with --preload: the
+    connections are re-created on first use, while the vertex cache and the
+    interval index, warmed in the parent, are kept.
+    """
+    if _pool is not None:
+        _pool._after_fork()
+    for cache in (_vertex_cache, _interval_index):
+        if hasattr(cache, "_after_fork"):
+            cache._after_fork()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
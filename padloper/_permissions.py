@@ -48,11 +48,11 @@ class Permission(Vertex):
         :type id: int, optional
         """
 
-        if id is not g._VIRTUAL_ID_PLACEHOLDER and id in g._vertex_cache:
-            return g._vertex_cache[id]
-
-        else:
-            return object.__new__(cls)
+        if id is not g._VIRTUAL_ID_PLACEHOLDER:
+            vertex = g._vertex_cache.peek(id)
+            if vertex is not None:
+                return vertex
+        return object.__new__(cls)
 
     def __init__(self, name: str, comments: str = " ",
                  id: int = g._VIRTUAL_ID_PLACEHOLDER):
@@ -133,7 +133,7 @@ class Permission(Vertex):
 
         props, id = d['props'], d['id']
 
-        Vertex._cache_vertex(
+        vertex = Vertex._cache_vertex(
             Permission(
                 name=name,
                 comments=props['comments'][0],
@@ -141,7 +141,7 @@ class Permission(Vertex):
             )
         )
 
-        return g._vertex_cache[id]
+        return vertex
 
     @classmethod
     def from_id(cls, id: int):
@@ -154,10 +154,11 @@ class Permission(Vertex):
         :rtype: Permission
         """
 
-        if id not in g._vertex_cache:
+        vertex = g._vertex_cache.peek(id)
+        if vertex is None:
             d = g.t.V(id).valueMap().next()
 
-            Vertex._cache_vertex(
+            vertex = Vertex._cache_vertex(
                 Permission(
                     name=d['name'][0],
                     comments=d['comments'][0],
@@ -165,7 +166,7 @@ class Permission(Vertex):
                 )
             )
 
-        return g._vertex_cache[id]
+        return vertex
 
 
 class UserGroup(Vertex):
@@ -263,14 +264,15 @@ class UserGroup(Vertex):
 
         id, attrs, perimssion_ids = d['id'], d['attrs'], d['permission_ids']
 
-        if id not in g._vertex_cache:
+        vertex = g._vertex_cache.peek(id)
+        if vertex is None:
 
             permissions = []
 
             for p_id in perimssion_ids:
                 permissions.append(Permission.from_id(p_id))
 
-            Vertex._cache_vertex(
+            vertex = Vertex._cache_vertex(
                 UserGroup(
                     name=name,
                     comments=attrs['comments'][0],
@@ -279,7 +281,7 @@ class UserGroup(Vertex):
                 )
             )
 
-        return g._vertex_cache[id]
+        return vertex
 
 
 class User(Vertex):
@@ -322,11 +324,11 @@ class User(Vertex):
           _VIRTUAL_ID_PLACEHOLDER
         :type id: int,optional 
         """
-        if id is not g._VIRTUAL_ID_PLACEHOLDER and id in g._vertex_cache:
-            return g._vertex_cache[id]
-
-        else:
-            return object.__new__(cls)
+        if id is not g._VIRTUAL_ID_PLACEHOLDER:
+            vertex = g._vertex_cache.peek(id)
+            if vertex is not None:
+                return vertex
+        return object.__new__(cls)
 
     def __init__(self, uname: str, pwd_hash: str, institution: str,
                  allowed_group: List[UserGroup] = None,
@@ -434,8 +436,9 @@ class User(Vertex):
         :type id: int,optional 
         """
 
-        if id not in g._vertex_cache:
-            Vertex._cache_vertex(
+        vertex = g._vertex_cache.peek(id)
+        if vertex is None:
+            vertex = Vertex._cache_vertex(
                 User(
                     uname=uname,
                     pwd_hash=pwd_hash,
@@ -445,7 +448,7 @@ class User(Vertex):
                 )
             )
 
-        return g._vertex_cache[id]
+        return vertex
 
     @classmethod
     def from_db(cls, uname: str):
@@ -467,14 +470,15 @@ class User(Vertex):
         # to access attributes from attrs, do attrs[...][0]
         id, attrs, gtype_ids = d['id'], d['attrs'], d['group_ids']
 
-        if id not in g._vertex_cache:
+        vertex = g._vertex_cache.peek(id)
+        if vertex is None:
 
             gtypes = []
 
             for gtype_id in gtype_ids:
                 gtypes.append(UserGroup.from_id(gtype_id))
 
-            Vertex._cache_vertex(
+            vertex = Vertex._cache_vertex(
                 User(
                     uname=uname,
                     pwd_hash=attrs['pwd_hash'][0],
@@ -484,7 +488,7 @@ class User(Vertex):
                 )
             )
 
-        return g._vertex_cache[id]
+        return vertex
 
     @classmethod
     def from_id(cls, id: int):
@@ -496,7 +500,8 @@ class User(Vertex):
         rtype: User
         """
 
-        if id not in g._vertex_cache:
+        vertex = g._vertex_cache.peek(id)
+        if vertex is None:
 
             d = g.t.V(id).project('attrs', 'group_ids').by(__.valueMap())\
                    .by(__.both(RelationUserAllowedGroup.category).id_().fold())\
@@ -511,7 +516,7 @@ class User(Vertex):
             for gtype_id in gtype_ids:
                 gtypes.append(UserGroup.from_id(gtype_id))
 
-            Vertex._cache_vertex(
+            vertex = Vertex._cache_vertex(
                 User(
                     uname=attrs['uname'][0],
                     pwd_hash=attrs['pwd_hash'][0],
@@ -521,4 +526,4 @@ class User(Vertex):
                 )
             )
 
-        return g._vertex_cache[id]
+        return vertex
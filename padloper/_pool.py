@@ -0,0 +1,337 @@
+"""
+_pool.py
+
+A pool of connections to the graph server, so that concurrent threads (such
+as the request threads of a web server) do not all queue up on a single
+websocket.
+"""
+import contextlib
+import contextvars
+import itertools
+import threading
+import time
+
+import gremlin_python.structure.graph as gremlin_graph
+from gremlin_python.driver.driver_remote_connection \
+        import DriverRemoteConnection
+
+# The slot pinned with ConnectionPool.borrow() in the current thread or task.
+_pinned = contextvars.ContextVar("padloper_pinned_slot", default=None)
+
+class ConnectionPool(object):
+    """A fixed number of connections to the graph server, each with its own
+    traversal source.
+
+    Each thread is assigned one of the connections, in turn, the first time
+    it uses the pool, and keeps using it; threads share connections when
+    there are more threads than connections. A thread or an asyncio task can
+    also borrow the least busy connection for a block of code with
+    `borrow()`. Connections are only opened when they are first used.
+
+    Connections that have been closed are reopened when they are next used,
+    and `check()` pings all the open connections and reopens the ones that do
+    not answer; `start_health_checks()` does this periodically in the
+    background.
+
+    Traversals are normally run through the traversal sources. `submit()` and
+    `stream()` send one directly instead, to get its results as they arrive,
+    with a timeout on waiting for the connection.
+
+    :ivar url: The URL of the server.
+    :ivar traversal_source: The name of the traversal source on the server.
+    :ivar size: The number of connections.
+    """
+
+    def __init__(self, url: str, traversal_source: str = "g",
+                 size: int = 4, connection_factory=DriverRemoteConnection):
+        """Set up the pool; no connection is opened yet.
+
+        :param url: The URL of the server, e.g., "ws://localhost:8182/gremlin".
+        :type url: str
+        :param traversal_source: The name of the traversal source on the
+            server.
+        :type traversal_source: str
+        :param size: The number of connections.
+        :type size: int
+        :param connection_factory: Called with the URL and the traversal
+            source name to open a connection.
+        :type connection_factory: callable
+        """
+        if size < 1:
+            raise ValueError("A pool needs at least one connection.")
+        self.url = url
+        self.traversal_source = traversal_source
+        self.size = size
+        self._factory = connection_factory
+        self._graph = gremlin_graph.Graph()
+        self._lock = threading.Lock()
+        self._conns = [None] * size
+        self._sources = [None] * size
+        self._borrowed = [0] * size
+        self._next_slot = itertools.count()
+        self._local = threading.local()
+        self._health = None
+
+    def _slot(self) -> int:
+        """Return the slot of the connection for the current thread or task.
+        """
+        slot = _pinned.get()
+        if slot is None:
+            slot = getattr(self._local, "slot", None)
+            if slot is None:
+                slot = next(self._next_slot) % self.size
+                self._local.slot = slot
+        return slot
+
+    def _open(self, slot: int):
+        """Open the connection in :param slot:, closing any previous one."""
+        old = self._conns[slot]
+        conn = self._factory(self.url, self.traversal_source)
+        self._conns[slot] = conn
+        self._sources[slot] = self._graph.traversal().withRemote(conn)
+        if old is not None:
+            try:
+                old.close()
+            except Exception:
+                pass
+
+    def _get(self, slot: int) -> int:
+        """Make sure the connection in :param slot: is open."""
+        conn = self._conns[slot]
+        if conn is None or conn.is_closed():
+            with self._lock:
+                conn = self._conns[slot]
+                if conn is None or conn.is_closed():
+                    self._open(slot)
+        return slot
+
+    def source(self, slot: int = None):
+        """Return the traversal source of the current thread or task, or of
+        the connection in :param slot:.
+
+        :rtype: GraphTraversalSource
+        """
+        return self._sources[self._get(self._slot() if slot is None \
+                                       else slot)]
+
+    def connection(self, slot: int = None) -> DriverRemoteConnection:
+        """Return the connection of the current thread or task, or the one in
+        :param slot:.
+
+        :rtype: DriverRemoteConnection
+        """
+        return self._conns[self._get(self._slot() if slot is None else slot)]
+
+    def is_open(self, slot: int) -> bool:
+        """Return whether the connection in :param slot: is open."""
+        conn = self._conns[slot]
+        return conn is not None and not conn.is_closed()
+
+    def acquire(self) -> int:
+        """Mark the least busy connection as borrowed and return its slot; it
+        must be given back with `release()`. See also `borrow()`.
+
+        :rtype: int
+        """
+        with self._lock:
+            slot = min(range(self.size), key=lambda s: self._borrowed[s])
+            self._borrowed[slot] += 1
+        return slot
+
+    def release(self, slot: int):
+        """Give back the connection in :param slot:, from `acquire()`."""
+        with self._lock:
+            self._borrowed[slot] -= 1
+
+    def pin(self, slot: int):
+        """Use the connection in :param slot: for the current thread or task
+        until `unpin()` is called with the returned token.
+        """
+        return _pinned.set(slot)
+
+    def unpin(self, token):
+        """Undo `pin()`."""
+        _pinned.reset(token)
+
+    @contextlib.contextmanager
+    def borrow(self):
+        """Use the least busy connection for the current thread or task
+        within a `with` block, e.g., for one web request or one asyncio task.
+        """
+        slot = self.acquire()
+        token = self.pin(slot)
+        try:
+            yield self.source()
+        finally:
+            self.unpin(token)
+            self.release(slot)
+
+    def submit(self, bytecode, request_options: dict = None,
+               timeout: float = None, slot: int = None):
+        """Send a traversal over the connection of the current thread or task,
+        or the one in :param slot:, and return its results as they arrive.
+
+        :param bytecode: The bytecode of the traversal.
+        :param request_options: Options for the server, e.g., "batchSize".
+        :type request_options: dict or None
+        :param timeout: How many seconds to wait for the connection to be free
+            to send the traversal; if None, wait for as long as it takes.
+        :type timeout: float or None
+        :param slot: The slot of the connection to use.
+        :type slot: int or None
+
+        :raises TimeoutError: If the connection is not free in time.
+        :return: The result set, whose `all()` returns a future of all the
+            results; see also `stream()`.
+        :rtype: gremlin_python.driver.resultset.ResultSet
+        """
+        return self._submit(self.connection(slot), bytecode, request_options,
+                            timeout)
+
+    def stream(self, bytecode, batch_size: int = 1000, timeout: float = None):
+        """Iterate over the results of a traversal as the server sends them,
+        in batches of :param batch_size:, rather than waiting for all of them
+        as toList() does.
+
+        :param bytecode: The bytecode of the traversal.
+        :param batch_size: The number of results the server sends per message.
+        :type batch_size: int
+        :param timeout: How many seconds to wait for the connection to be free
+            to send the traversal; see `submit()`.
+        :type timeout: float or None
+        """
+        rs = self.submit(bytecode, {"batchSize": batch_size}, timeout)
+        # The batches are all queued by the time the receiving task is done,
+        # so a marker queued when it is done comes after them, and the loop
+        # can wait on the queue alone.
+        end = object()
+        rs.done.add_done_callback(lambda f: rs.stream.put(end))
+        while True:
+            batch = rs.stream.get()
+            if batch is end:
+                # Raises if the traversal failed.
+                rs.done.result()
+                return
+            for r in batch:
+                # Bytecode results come back as traversers, with a bulk.
+                for i in range(getattr(r, "bulk", 1)):
+                    yield getattr(r, "object", r)
+
+    def _submit(self, conn, bytecode, request_options=None, timeout=None):
+        """Do the work of submit() on the connection :param conn:."""
+        # DriverRemoteConnection only hands out whole results, so this is the
+        # one place that uses its client. The client has a few websockets and
+        # waits, without a timeout, for one to be free; wait here instead.
+        client = conn._client
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is not None and client.available_pool_size == 0:
+            if time.monotonic() >= deadline:
+                raise TimeoutError("No free connection to %s within %g s." %\
+                                   (self.url, timeout))
+            time.sleep(0.01)
+        future = client.submit_async(bytecode,
+                                     request_options=request_options)
+        return future.result(timeout=None if deadline is None \
+                             else max(deadline - time.monotonic(), 0))
+
+    def check(self, timeout: float = 5.0) -> int:
+        """Ping each open connection, and reopen the ones that fail or do not
+        answer within :param timeout: seconds.
+
+        :return: The number of connections reopened.
+        :rtype: int
+        """
+        reopened = 0
+        for slot in range(self.size):
+            conn = self._conns[slot]
+            if conn is None:
+                continue
+            try:
+                self._submit(conn, self._sources[slot].inject(1).bytecode,
+                             timeout=timeout).all().result(timeout=timeout)
+            except Exception:
+                with self._lock:
+                    if self._conns[slot] is conn:
+                        self._open(slot)
+                        reopened += 1
+        return reopened
+
+    def start_health_checks(self, interval: float = 30.0):
+        """Run `check()` every :param interval: seconds in a background
+        thread. Any previous health check thread is stopped.
+        """
+        self.stop_health_checks()
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.check()
+
+        thread = threading.Thread(target=run, name="padloper-pool-health",
+                                  daemon=True)
+        self._health = (thread, stop, interval)
+        thread.start()
+
+    def stop_health_checks(self):
+        """Stop the background health checks, if any."""
+        if self._health is not None:
+            self._health[1].set()
+            self._health = None
+
+    def close(self):
+        """Close all the connections. They are reopened if used again."""
+        self.stop_health_checks()
+        with self._lock:
+            for slot, conn in enumerate(self._conns):
+                if conn is not None:
+                    conn.close()
+                self._conns[slot] = None
+                self._sources[slot] = None
+
+    def _after_fork(self):
+        """In a forked child, forget the connections of the parent without
+        closing them, since the parent still uses them; the child opens its
+        own when they are first used. The health checks, if any, are
+        restarted, since threads do not survive a fork.
+        """
+        # Closing, or garbage collecting, the parent's connections here would
+        # shut down the websockets that the child shares with the parent.
+        self._forked_conns = getattr(self, "_forked_conns", []) + \
+                             [c for c in self._conns if c is not None]
+        health = self._health
+        self._lock = threading.Lock()
+        self._conns = [None] * self.size
+        self._sources = [None] * self.size
+        self._borrowed = [0] * self.size
+        self._local = threading.local()
+        self._health = None
+        if health is not None:
+            self.start_health_checks(health[2])
+
+    def stats(self) -> dict:
+        """Return the number of connections, how many are open and how many
+        are currently borrowed.
+
+        :rtype: dict
+        """
+        return {
+            "size": self.size,
+            "open": sum(1 for s in range(self.size) if self.is_open(s)),
+            "borrowed": sum(self._borrowed)
+        }
+
+class PooledTraversalSource(object):
+    """Stands in for a GraphTraversalSource, forwarding each use to the
+    traversal source of the current thread or task in a pool.
+    """
+
+    def __init__(self, pool_getter):
+        """
+        :param pool_getter: Called to get the pool each time, so that the pool
+            can be replaced without replacing this object.
+        :type pool_getter: callable
+        """
+        self._pool_getter = pool_getter
+
+    def __getattr__(self, name):
+        return getattr(self._pool_getter().source(), name)
@@ -3,26 +3,23 @@ property_nodes.py
 
 Classes for manipulating properties and property types.
 """
-import time
 import re
-from unicodedata import name
 
-import warnings
-from xmlrpc.client import boolean
-from attr import attr, attributes
-
-from gremlin_python.process.traversal import Order, P, TextP
-from sympy import true
+from gremlin_python.process.traversal import P
 import _global as g
-from gremlin_python.process.graph_traversal import __, constant
+from gremlin_python.process.graph_traversal import __
 
-from _base import Vertex, VertexAttr, strictraise
+from _base import Vertex, VertexAttr, _parse_time
 from _component_nodes import ComponentType
 from _edges import RelationPropertyType, RelationPropertyAllowedType, \
-                   RelationComponentType
+                   RelationComponentType, RelationProperty
 from _exceptions import *
 
-from typing import Optional, List
+# The pieces of a regular expression that only match (parts of) numbers. A
+# caret is only an anchor outside of a character class; "[^" negates the class,
+# so that, e.g., "[^0-9]+" is not numeric.
+_NUMERIC_REGEX_PIECES = re.compile(r"\\d|\\\.|\\\+|\\-|(?<!\[)\^|"
+                                   r"[0-9eE+\-?*{},()\[\]|$]")
 
 class PropertyType(Vertex):
     """
@@ -52,10 +49,216 @@ class PropertyType(Vertex):
         VertexAttr("comments", str, optional=True, default="")
     ]
     primary_attr = "name"
+    _cache_pinned = True
+
+    def is_numeric(self) -> bool:
+        """Return whether the allowed_regex of this type only admits numbers,
+        i.e., it is made of digits, signs, exponents, escaped decimal points
+        and the regular expression syntax combining them.
+
+        :rtype: bool
+        """
+        return len(_NUMERIC_REGEX_PIECES.sub("", self.allowed_regex)) == 0 \
+               and re.search(r"[0-9]|\\d", self.allowed_regex) is not None
+
+    def history(self, component_type=None, from_time: int = -1,
+                to_time: int = g._TIMESTAMP_NO_ENDTIME_VALUE,
+                batch_size: int = 10000, numeric: bool = None):
+        """Return the values of all the properties of this type set between
+        :param from_time: and :param to_time:, on all components or those of
+        one type, as columns of arrays.
+
+        All the properties are fetched with a single traversal, whose results
+        are streamed into the columns as they arrive; each column is then
+        converted to an array in one go.
+
+        :param component_type: If given, only include the properties of
+            components of this type.
+        :type component_type: ComponentType or str or None
+        :param from_time: Only include properties that end after this time.
+        :type from_time: int
+        :param to_time: Only include properties that start before this time.
+        :type to_time: int
+        :param batch_size: The number of properties the server sends per
+            message.
+        :type batch_size: int
+        :param numeric: Whether to return the values as floats rather than
+            strings; by default, this is decided by `is_numeric()`.
+        :type numeric: bool or None
+
+        :rtype: PropertyHistory
+        """
+        import numpy as np
+
+        q = g.t.V(self.id()).in_(RelationPropertyType.category) \
+               .inE(RelationProperty.category).has('active', True) \
+               .has('end_time', P.gt(from_time))
+        if to_time < g._TIMESTAMP_NO_ENDTIME_VALUE:
+            q = q.has('start_time', P.lt(to_time))
+        if component_type is not None:
+            if isinstance(component_type, ComponentType):
+                component_type = component_type.name
+            q = q.where(__.outV().out(RelationComponentType.category) \
+                          .has('name', component_type))
+        q = q.project('c', 'n', 's', 'e', 'u', 'v') \
+             .by(__.outV().id_()).by(__.outV().values('name')) \
+             .by(__.values('start_time')).by(__.values('end_time')) \
+             .by(__.values('start_uid')) \
+             .by(__.inV().values('values').fold())
+
+        cols = {k: [] for k in 'cnseuv'}
+        for r in g._stream_traversal(q, batch_size):
+            for k in cols:
+                cols[k].append(r[k])
+
+        return PropertyHistory(self, np.array(cols['c'], dtype=np.int64),
+                               np.array(cols['n'], dtype=object),
+                               np.array(cols['s'], dtype=np.int64),
+                               np.array(cols['e'], dtype=np.int64),
+                               cols['v'], np.array(cols['u'], dtype=object),
+                               self.is_numeric() if numeric is None \
+                               else numeric)
+
+    def values_at(self, components, at_time: int, batch_size: int = 10000):
+        """Return the values of the properties of this type in effect at time
+        :param at_time: on many components at once.
+
+        All the properties are fetched with a single traversal over the
+        properties of this type, rather than one query per component.
+
+        :param components: The components, or the component type of the
+            components, to get the values of. By default, all components with
+            a property of this type are included.
+        :type components: list[Component] or ComponentType or str or None
+        :param at_time: The time to get the values at.
+        :type at_time: int or datetime or Timestamp
+        :param batch_size: The number of properties the server sends per
+            message.
+        :type batch_size: int
+
+        :return: The values of the property of each component that has one
+            at :param at_time:, keyed by component name.
+        :rtype: dict[str, list[str]]
+        """
+        at_time = _parse_time(at_time)
+
+        q = g.t.V(self.id()).in_(RelationPropertyType.category) \
+               .inE(RelationProperty.category).has('active', True) \
+               .has('start_time', P.lte(at_time)) \
+               .has('end_time', P.gt(at_time))
+        if isinstance(components, (ComponentType, str)):
+            if isinstance(components, ComponentType):
+                components = components.name
+            q = q.where(__.outV().out(RelationComponentType.category) \
+                          .has('name', components))
+        elif components is not None:
+            if len(components) == 0:
+                return {}
+            q = q.where(__.outV().hasId(P.within(*[c.id() \
+                                                    for c in components])))
+        q = q.project('n', 'v') \
+             .by(__.outV().values('name')) \
+             .by(__.inV().values('values').fold())
+
+        return {r['n']: r['v'] for r in g._stream_traversal(q, batch_size)}
 
     def __repr__(self):
         return f"{self.category}: {self.name}"
 
+class PropertyHistory(object):
+    """The properties of one type set over a time range, as columns of
+    arrays, sorted by component and start time.
+
+    :ivar type: The property type.
+    :ivar component_id: The DB IDs of the components.
+    :ivar component_name: The names of the components.
+    :ivar start: The start times.
+    :ivar end: The end times; properties that have not ended have
+        _TIMESTAMP_NO_ENDTIME_VALUE.
+    :ivar values: An (n, n_values) array of the values, of floats if the
+        values are numeric and of strings otherwise.
+    :ivar uid: The users who set the properties.
+    :ivar skipped: The properties left out because they do not have n_values
+        values or, for numeric values, because a value is not a number, as
+        (component name, start time, values) tuples.
+    """
+
+    type: PropertyType
+    component_id: "np.ndarray"
+    component_name: "np.ndarray"
+    start: "np.ndarray"
+    end: "np.ndarray"
+    values: "np.ndarray"
+    uid: "np.ndarray"
+    skipped: list
+
+    def __init__(self, type, component_id, component_name, start, end, values,
+                 uid, numeric=False):
+        """Check the values, sort the columns, and parse the values to floats
+        if they are numeric.
+
+        :param values: The values of each property, as lists of strings.
+        :type values: list[list[str]]
+        :param numeric: Whether to parse the values to floats.
+        :type numeric: bool
+        """
+        import numpy as np
+
+        self.type = type
+        self.skipped = []
+        keep = []
+        for i, v in enumerate(values):
+            if len(v) == type.n_values:
+                try:
+                    values[i] = [float(x) for x in v] if numeric else v
+                    keep.append(i)
+                    continue
+                except ValueError:
+                    pass
+            self.skipped.append((component_name[i], int(start[i]), v))
+        keep = np.array(keep, dtype=np.int64)
+        values = np.array([values[i] for i in keep],
+                          dtype=np.float64 if numeric else str)\
+                   .reshape(-1, type.n_values)
+        component_id, component_name = component_id[keep], \
+                                       component_name[keep]
+        start, end, uid = start[keep], end[keep], uid[keep]
+
+        order = np.lexsort((start, component_id))
+        self.component_id = component_id[order]
+        self.component_name = component_name[order]
+        self.start = start[order]
+        self.end = end[order]
+        self.values = values[order]
+        self.uid = uid[order]
+
+    def __len__(self):
+        return len(self.start)
+
+    def as_dict(self):
+        """Return the columns as a dictionary of one-dimensional arrays, e.g.,
+        for pandas.DataFrame(). The values are in "value" if the property type
+        has a single value, and in "value_0", "value_1", … otherwise.
+
+        :rtype: dict
+        """
+        ret = {
+            "component_id": self.component_id,
+            "component_name": self.component_name,
+            "start": self.start,
+            "end": self.end,
+            "uid": self.uid
+        }
+        if self.values.shape[1] == 1:
+            ret["value"] = self.values[:, 0]
+        else:
+            for i in range(self.values.shape[1]):
+                ret["value_%d" % i] = self.values[:, i]
+        return ret
+
+    def __repr__(self):
+        return f"PropertyHistory({self.type.name}: {len(self)} properties)"
+
 class Property(Vertex):
     """The representation of a property.
 
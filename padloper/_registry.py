@@ -0,0 +1,110 @@
+"""
+_registry.py
+
+Loading of the type-like vertices (component types and versions, property
+types, flag types and flag severities) into the vertex cache all at once. These
+are small sets that rarely change, so it is cheaper to hold all of them than to
+fetch them one by one as they are needed.
+"""
+import os
+import threading
+from gremlin_python.process.graph_traversal import __
+
+import _global as g
+from _component_nodes import ComponentType, ComponentVersion
+from _property_nodes import PropertyType
+from _flag_nodes import FlagType, FlagSeverity
+
+# In the order in which they need to be built, so that the vertices that each
+# class links to are already cached by the time it is built.
+_REGISTRY_CLASSES = [ComponentType, FlagType, FlagSeverity, ComponentVersion,
+                     PropertyType]
+
+def preload_types(refresh_interval: float = None):
+    """Load all the active component types, component versions, property
+    types, flag types and flag severities, together with the edges to their
+    allowed types, into the vertex cache with a single query.
+
+    Afterwards, methods such as `ComponentType.get_names_of_types_and_versions`
+    are served from the cache without querying the DB.
+
+    :param refresh_interval: If set, then reload the types in a background
+        thread every this many seconds, to pick up changes made by other
+        processes. Any previous refresh thread is stopped.
+    :type refresh_interval: float or None
+    """
+    _load_types()
+
+    if refresh_interval is not None:
+        start_type_refresh(refresh_interval)
+    else:
+        stop_type_refresh()
+
+def start_type_refresh(refresh_interval: float):
+    """Reload the types loaded by `preload_types` in a background thread every
+    :param refresh_interval: seconds, without loading them now. Any previous
+    refresh thread is stopped.
+
+    This is for starting the refresh separately from the preloading, e.g., in
+    each worker of a server that preloads the types before forking them.
+
+    :param refresh_interval: The number of seconds between reloads.
+    :type refresh_interval: float
+    """
+    stop_type_refresh()
+    _start_type_refresh(refresh_interval)
+
+def _start_type_refresh(refresh_interval):
+    """Start the background thread reloading the types every
+    :param refresh_interval: seconds.
+    """
+    stop = threading.Event()
+    thread = threading.Thread(target=_refresh_types,
+                              args=(refresh_interval, stop),
+                              name="padloper-type-refresh", daemon=True)
+    g._type_refresh = (thread, stop, refresh_interval)
+    thread.start()
+
+def stop_type_refresh():
+    """Stop the background refresh started by `preload_types`, if any."""
+    if g._type_refresh is not None:
+        g._type_refresh[1].set()
+        g._type_refresh = None
+
+def _load_types():
+    """Query all the type-like vertices and (re)fill the vertex cache with
+    them. Cached ones that are no longer active in the DB are dropped from the
+    cache.
+    """
+    q = g.t.inject(0).project(*[c.category for c in _REGISTRY_CLASSES])
+    for c in _REGISTRY_CLASSES:
+        q = q.by(c._attrs_query(__.V().has("category", c.category), False)\
+                  .fold())
+    res = q.next()
+
+    for c in _REGISTRY_CLASSES:
+        ids = set(v.id() for v in c._from_attrs_list(res[c.category]))
+        for v in g._vertex_cache.values():
+            if v.category == c.category and v.id() not in ids:
+                g._vertex_cache.pop(v.id())
+
+    g._types_preloaded = True
+
+def _refresh_types(interval, stop):
+    """Body of the background refresh thread."""
+    while not stop.wait(interval):
+        try:
+            _load_types()
+        except Exception as e:
+            # Keep serving the types already loaded; try again next time.
+            print("Could not refresh the types: %s" % e)
+
+def _after_fork_in_child():
+    """In a forked child, restart the background refresh of the types, since
+    threads do not survive a fork. The types loaded by the parent are kept.
+    """
+    if g._type_refresh is not None:
+        _start_type_refresh(g._type_refresh[2])
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,322 @@
+"""
+_snapshot.py
+
+Snapshots of how all the components are connected at a given time, as compact
+arrays or igraph graphs, for analysing the whole layout at once.
+"""
+from gremlin_python.process.traversal import P
+from gremlin_python.process.graph_traversal import __
+
+import _global as g
+from _base import _parse_time
+from _component_nodes import Component, ComponentType
+from _edges import RelationComponentType, RelationConnection, \
+                   RelationSubcomponent
+from _property_nodes import PropertyType
+
+# The kinds of adjacency in a ConnectionSnapshot, as seen from the component
+# on the row: connected to the neighbour, the neighbour is one of its
+# subcomponents, or the neighbour is its supercomponent.
+SNAPSHOT_CONNECTION = 0
+SNAPSHOT_SUBCOMPONENT = 1
+SNAPSHOT_SUPERCOMPONENT = 2
+
+class ConnectionSnapshot(object):
+    """The connections and subcomponent relations between components at one
+    time, as NumPy arrays.
+
+    Components are numbered 0, …, n - 1 in order of their DB ID. Only
+    components with at least one connection or subcomponent relation are
+    included. The adjacency is stored in compressed sparse row (CSR) form, in
+    both directions: the neighbours of component i are
+    `indices[indptr[i]:indptr[i + 1]]`, and `kinds` holds, for each of them,
+    one of SNAPSHOT_CONNECTION, SNAPSHOT_SUBCOMPONENT or
+    SNAPSHOT_SUPERCOMPONENT.
+
+    :ivar at_time: The time of the snapshot.
+    :ivar ids: The DB IDs of the components.
+    :ivar names: The names of the components.
+    :ivar edges: An (m, 2) array of the component numbers at the ends of each
+        of the m edges; for subcomponent relations, the first is the
+        subcomponent and the second the supercomponent.
+    :ivar edge_kinds: For each edge, SNAPSHOT_CONNECTION or
+        SNAPSHOT_SUBCOMPONENT.
+    :ivar indptr: The CSR row pointers, of length n + 1.
+    :ivar indices: The CSR column indices, of length 2m.
+    :ivar kinds: The kind of each adjacency in `indices`.
+    """
+
+    at_time: int
+    ids: "np.ndarray"
+    names: "np.ndarray"
+    edges: "np.ndarray"
+    edge_kinds: "np.ndarray"
+    indptr: "np.ndarray"
+    indices: "np.ndarray"
+    kinds: "np.ndarray"
+
+    def __init__(self, at_time: int, ids, names, edges, edge_kinds):
+        """Build the CSR adjacency from the edges.
+
+        :param at_time: The time of the snapshot.
+        :type at_time: int
+        :param ids: The DB IDs of the components, in increasing order.
+        :type ids: np.ndarray
+        :param names: The names of the components.
+        :type names: np.ndarray
+        :param edges: An (m, 2) array of the component numbers at the ends of
+            each edge.
+        :type edges: np.ndarray
+        :param edge_kinds: The kind of each edge.
+        :type edge_kinds: np.ndarray
+        """
+        import numpy as np
+
+        self.at_time = at_time
+        self.ids = ids
+        self.names = names
+        self.edges = edges
+        self.edge_kinds = edge_kinds
+
+        n = len(ids)
+        rows = np.concatenate([edges[:, 0], edges[:, 1]])
+        cols = np.concatenate([edges[:, 1], edges[:, 0]])
+        # From the subcomponent, the supercomponent is seen and vice versa.
+        back = np.where(edge_kinds == SNAPSHOT_SUBCOMPONENT,
+                        SNAPSHOT_SUBCOMPONENT, SNAPSHOT_CONNECTION)
+        fwd = np.where(edge_kinds == SNAPSHOT_SUBCOMPONENT,
+                       SNAPSHOT_SUPERCOMPONENT, SNAPSHOT_CONNECTION)
+        kinds = np.concatenate([fwd, back]).astype(np.int8)
+
+        order = np.argsort(rows, kind="stable")
+        self.indices = cols[order]
+        self.kinds = kinds[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=self.indptr[1:])
+        self._index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index(self, name: str) -> int:
+        """Return the number of the component called :param name:.
+
+        :raises KeyError: If it is not in the snapshot.
+        """
+        if self._index is None:
+            self._index = {nm: i for i, nm in enumerate(self.names)}
+        return self._index[name]
+
+    def neighbours(self, name: str, kind: int = None) -> list:
+        """Return the names of the components adjacent to the one called
+        :param name:.
+
+        :param kind: If not None, only return the neighbours of this kind.
+        :type kind: int or None
+        :rtype: list[str]
+        """
+        i = self.index(name)
+        sl = slice(self.indptr[i], self.indptr[i + 1])
+        nb = self.indices[sl]
+        if kind is not None:
+            nb = nb[self.kinds[sl] == kind]
+        return list(self.names[nb])
+
+    def to_igraph(self):
+        """Return the snapshot as an undirected igraph Graph, with the
+        component names and IDs as the vertex attributes "name" and "id", and
+        the kind of each edge as the edge attribute "kind".
+
+        :rtype: igraph.Graph
+        """
+        import igraph
+
+        gr = igraph.Graph(n=len(self), edges=self.edges.tolist(),
+                          directed=False)
+        gr.vs["name"] = self.names.tolist()
+        gr.vs["id"] = self.ids.tolist()
+        gr.es["kind"] = self.edge_kinds.tolist()
+        return gr
+
+    def __repr__(self):
+        return "ConnectionSnapshot(at_time=%d, %d components, %d edges)" %\
+               (self.at_time, len(self), len(self.edges))
+
+def connection_snapshot(at_time: int, types: list = None,
+                        batch_size: int = 10000):
+    """Return all the connections and subcomponent relations between
+    components that are in effect at time :param at_time:.
+
+    All the edges are fetched with a single traversal, whose results are
+    streamed into arrays as they arrive, rather than querying each component
+    for its connections.
+
+    :param at_time: The time of the snapshot.
+    :type at_time: int or datetime or Timestamp
+    :param types: If given, only include edges between components of these
+        component types.
+    :type types: list[ComponentType or str] or None
+    :param batch_size: The number of edges the server sends per message.
+    :type batch_size: int
+
+    :rtype: ConnectionSnapshot
+    """
+    import numpy as np
+
+    at_time = _parse_time(at_time)
+
+    q = g.t.E().hasLabel(P.within(RelationConnection.category,
+                                  RelationSubcomponent.category)) \
+           .has("active", True) \
+           .or_(__.hasLabel(RelationSubcomponent.category),
+                __.has("start_time", P.lte(at_time)) \
+                  .has("end_time", P.gt(at_time)))
+    if types is not None:
+        names = [t.name if isinstance(t, ComponentType) else t for t in types]
+        for end in (__.outV(), __.inV()):
+            q = q.where(end.out(RelationComponentType.category) \
+                           .has("name", P.within(*names)))
+    q = q.project("o", "i", "on", "in", "label") \
+         .by(__.outV().id_()).by(__.inV().id_()) \
+         .by(__.outV().values("name")).by(__.inV().values("name")) \
+         .by(__.label())
+
+    names = {}
+    ends = []
+    kinds = []
+    for r in g._stream_traversal(q, batch_size):
+        names[r["o"]] = r["on"]
+        names[r["i"]] = r["in"]
+        ends.append((r["o"], r["i"]))
+        kinds.append(SNAPSHOT_SUBCOMPONENT \
+                     if r["label"] == RelationSubcomponent.category \
+                     else SNAPSHOT_CONNECTION)
+
+    ids = np.array(sorted(names), dtype=np.int64)
+    edges = np.searchsorted(ids, np.array(ends, dtype=np.int64)\
+                                  .reshape(-1, 2))
+    return ConnectionSnapshot(
+        at_time, ids, np.array([names[i] for i in ids.tolist()], dtype=object),
+        edges, np.array(kinds, dtype=np.int8)
+    )
+
+def to_igraph(at_time: int, include_properties: list = None,
+              batch_size: int = 10000):
+    """Return the components and their connections at time :param at_time:
+    as an undirected igraph Graph.
+
+    Every active component is a vertex, including those without any
+    connection, with the attributes "name", "id" and "type" (the name of its
+    component type), plus one attribute per property type in
+    :param include_properties:, holding the values of the property at
+    :param at_time: (a single value if the property type has one value, a
+    list otherwise, and None if the component does not have the property).
+    Every connection in effect at :param at_time: is an edge, with the
+    attributes "start_time", "end_time", "start_uid" and "end_uid".
+
+    The components and the connections are each fetched with one traversal,
+    whose results are streamed in, and the values of each property type with
+    :meth:`PropertyType.values_at`.
+
+    :param at_time: The time of the slice.
+    :type at_time: int or datetime or Timestamp
+    :param include_properties: The property types whose values to add as
+        vertex attributes.
+    :type include_properties: list[PropertyType or str] or None
+    :param batch_size: The number of results the server sends per message.
+    :type batch_size: int
+
+    :rtype: igraph.Graph
+    """
+    import igraph
+
+    at_time = _parse_time(at_time)
+
+    q = g.t.V().has("category", Component.category).has("active", True) \
+           .project("id", "name", "type") \
+           .by(__.id_()).by(__.values("name")) \
+           .by(__.out(RelationComponentType.category).values("name"))
+    ids, names, types = [], [], []
+    for r in g._stream_traversal(q, batch_size):
+        ids.append(r["id"])
+        names.append(r["name"])
+        types.append(r["type"])
+    index = {i: n for n, i in enumerate(ids)}
+    by_name = {name: n for n, name in enumerate(names)}
+
+    q = g.t.E().hasLabel(RelationConnection.category).has("active", True) \
+           .has("start_time", P.lte(at_time)).has("end_time", P.gt(at_time)) \
+           .project("o", "i", "start_time", "end_time", "start_uid",
+                    "end_uid") \
+           .by(__.outV().id_()).by(__.inV().id_()) \
+           .by(__.values("start_time")).by(__.values("end_time")) \
+           .by(__.values("start_uid")).by(__.values("end_uid"))
+    edges = []
+    edge_attrs = {"start_time": [], "end_time": [], "start_uid": [],
+                  "end_uid": []}
+    for r in g._stream_traversal(q, batch_size):
+        # Connections to disabled components are left out.
+        if r["o"] not in index or r["i"] not in index:
+            continue
+        edges.append((index[r["o"]], index[r["i"]]))
+        for k, v in edge_attrs.items():
+            v.append(r[k])
+
+    gr = igraph.Graph(n=len(ids), edges=edges, directed=False)
+    gr.vs["name"] = names
+    gr.vs["id"] = ids
+    gr.vs["type"] = types
+    for k, v in edge_attrs.items():
+        gr.es[k] = v
+
+    for pt in include_properties or []:
+        if isinstance(pt, str):
+            pt = PropertyType.from_db(pt)
+        values = [None] * len(ids)
+        for name, v in pt.values_at(None, at_time, batch_size).items():
+            if name in by_name:
+                values[by_name[name]] = v[0] if pt.n_values == 1 else v
+        gr.vs[pt.name] = values
+
+    return gr
+
+def connected_groups(graph) -> list:
+    """Return the groups of components of :param graph: that are connected to
+    each other, largest first.
+
+    :param graph: A graph returned by :func:`to_igraph`.
+    :type graph: igraph.Graph
+
+    :rtype: list[list[str]]
+    """
+    groups = [graph.vs[c]["name"] for c in graph.connected_components()]
+    return sorted(groups, key=len, reverse=True)
+
+def connection_path(graph, name_from: str, name_to: str) -> list:
+    """Return the names of the components along a shortest chain of
+    connections in :param graph: from the component called
+    :param name_from: to the one called :param name_to:, both included, or
+    an empty list if they are not connected.
+
+    :param graph: A graph returned by :func:`to_igraph`.
+    :type graph: igraph.Graph
+    :param name_from: The name of the component to start from.
+    :type name_from: str
+    :param name_to: The name of the component to end at.
+    :type name_to: str
+
+    :rtype: list[str]
+    """
+    path = graph.get_shortest_path(name_from, to=name_to, output="vpath")
+    return graph.vs[path]["name"]
+
+def orphaned_components(graph) -> list:
+    """Return the names of the components of :param graph: that have no
+    connections.
+
+    :param graph: A graph returned by :func:`to_igraph`.
+    :type graph: igraph.Graph
+
+    :rtype: list[str]
+    """
+    return graph.vs.select(_degree=0)["name"]
@@ -0,0 +1,351 @@
+"""
+aio.py
+
+Asynchronous versions of the padloper methods that query the DB, for use in
+asyncio services, e.g.:
+
+    import padloper as p
+    import padloper.aio as pa
+
+    async def dish_states(names, at_time):
+        dishes = await asyncio.gather(*[pa.from_db(p.Component, n) \
+                                        for n in names])
+        return await asyncio.gather(*[pa.get_connections(d, at_time) \
+                                      for d in dishes])
+
+Queries are submitted with gremlin-python's asynchronous submission
+(`Traversal.promise()`), so many of them can be in flight at once without a
+thread each. Each query borrows the least busy connection of the connection
+pool, and at most `max_in_flight()` queries are submitted at the same time
+from each event loop, so that submitting never blocks the event loop waiting
+for a free websocket; to keep more queries in flight, make the pool bigger.
+
+The methods that write to the DB (`add`, `connect`, `set_property`, …) check
+their arguments with several dependent queries, so they are run in a worker
+thread instead, on a borrowed connection.
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import os
+import weakref
+
+from gremlin_python.process.traversal import P
+from gremlin_python.process.graph_traversal import __
+
+import _global as g
+from _base import Timestamp, _parse_time
+from _component_nodes import Component
+from _edges import RelationConnection, RelationProperty, \
+                   RelationPropertyType, RelationSubcomponent
+from _exceptions import NotInDatabase
+from _property_nodes import Property
+
+# The number of websockets that each connection of the pool has; this is the
+# default of gremlin-python.
+_WEBSOCKETS_PER_CONNECTION = 4
+
+# The semaphore limiting the queries in flight, for each event loop, since a
+# semaphore can only be used in one loop. A semaphore refers to its loop, so
+# the entries of closed loops are dropped by hand.
+_semaphores = weakref.WeakKeyDictionary()
+
+def max_in_flight() -> int:
+    """Return the maximum number of queries submitted at the same time from
+    one event loop.
+
+    :rtype: int
+    """
+    return g.connection_pool().size * _WEBSOCKETS_PER_CONNECTION
+
+def _semaphore() -> asyncio.Semaphore:
+    """Return the semaphore of the running event loop."""
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        for closed in [l for l in list(_semaphores) if l.is_closed()]:
+            _semaphores.pop(closed, None)
+        sem = _semaphores.setdefault(loop, asyncio.Semaphore(max_in_flight()))
+    return sem
+
+async def _to_thread(fn, *args, **kwargs):
+    """Run :param fn: in a worker thread, in the current context, so that it
+    uses the connection borrowed by the current task.
+    """
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(ctx.run, fn, *args, **kwargs)
+    )
+
+@contextlib.asynccontextmanager
+async def _borrow():
+    """Within an `async with` block, use the least busy connection of the
+    pool for the current task.
+    """
+    async with _semaphore():
+        pool = g.connection_pool()
+        slot = pool.acquire()
+        try:
+            if not pool.is_open(slot):
+                # Opening a connection runs an event loop of its own, which
+                # cannot be done in the thread of a running event loop.
+                await _to_thread(pool.source, slot)
+            token = pool.pin(slot)
+            try:
+                yield
+            finally:
+                pool.unpin(token)
+        finally:
+            pool.release(slot)
+
+async def _to_list(traversal) -> list:
+    """Submit :param traversal: asynchronously and return its results."""
+    return await asyncio.wrap_future(traversal.promise(lambda t: t.toList()))
+
+async def _query(build):
+    """Borrow a connection, build a traversal with :param build: and return
+    its results.
+    """
+    async with _borrow():
+        return await _to_list(build())
+
+async def _from_attrs_list(cls, attrs_list, allow_disabled=False):
+    """Like Vertex._from_attrs_list(), which can query for linked vertices
+    that are not in the vertex cache, so it is run in a worker thread.
+    """
+    async with _borrow():
+        return await _to_thread(cls._from_attrs_list, attrs_list,
+                                allow_disabled)
+
+async def from_db(cls, primary_attr: str, allow_disabled: bool = False,
+                  depth: int = 2):
+    """Asynchronous `Vertex.from_db()`. The linked vertices are fetched in the
+    same query, up to :param depth: levels.
+
+    :param cls: The class of the vertex, e.g., Component.
+    :type cls: type
+    :rtype: Vertex subclass
+    """
+    # Served from the name index and the record of missing names, as by the
+    # synchronous version.
+    if not allow_disabled:
+        vertex = g._vertex_cache.find_name(cls.category, primary_attr)
+        if vertex is not None:
+            return vertex
+        if g._vertex_cache.is_known_missing(cls.category, primary_attr):
+            raise NotInDatabase("Could not find %s in the DB." % primary_attr)
+
+    res = await _query(lambda: cls._attrs_query(
+        g.t.V().has("category", cls.category)\
+               .has(cls.primary_attr, primary_attr),
+        allow_disabled, depth
+    ))
+    if len(res) == 0:
+        if not allow_disabled:
+            g._vertex_cache.mark_missing(cls.category, primary_attr)
+        raise NotInDatabase("Could not find %s in the DB." % primary_attr)
+    return (await _from_attrs_list(cls, res[:1], allow_disabled))[0]
+
+async def from_id(cls, id: int, allow_disabled: bool = False,
+                  depth: int = 2):
+    """Asynchronous `Vertex.from_id()`.
+
+    :param cls: The class of the vertex, e.g., Component.
+    :type cls: type
+    :rtype: Vertex subclass
+    """
+    return (await from_ids(cls, [id], allow_disabled, depth))[0]
+
+async def from_ids(cls, ids: list, allow_disabled: bool = False,
+                   depth: int = 2):
+    """Asynchronous `Vertex.from_ids()`. Only the vertices not in the vertex
+    cache are queried.
+
+    :param cls: The class of the vertex, e.g., Component.
+    :type cls: type
+    :rtype: list[Vertex subclass]
+    """
+    found = {}
+    missing = []
+    for i in ids:
+        vertex = g._vertex_cache.get(i)
+        if vertex is None:
+            missing.append(i)
+        else:
+            found[i] = vertex
+
+    if len(missing) > 0:
+        res = await _query(lambda: cls._attrs_query(g.t.V(*missing),
+                                                    allow_disabled, depth))
+        for vertex in await _from_attrs_list(cls, res, allow_disabled):
+            found[vertex.id()] = vertex
+
+    try:
+        return [found[i] for i in ids]
+    except KeyError as e:
+        raise NotInDatabase("Could not find %s with ID %s in the DB." %\
+                            (cls.__name__, e.args[0]))
+
+async def get_list(cls, range: tuple = (0, -1), order_by: list = [],
+                   filters: list = [], allow_disabled: bool = False,
+                   depth: int = 2):
+    """Asynchronous `Vertex.get_list()`.
+
+    :param cls: The class of the vertices, e.g., Component.
+    :type cls: type
+    :rtype: list[Vertex subclass]
+    """
+    res = await _query(lambda: cls._list_traversal(
+        range, order_by, filters, allow_disabled, depth
+    ))
+    return await _from_attrs_list(cls, res, allow_disabled)
+
+async def get_count(cls, filters: list = [], allow_disabled: bool = False):
+    """Asynchronous `Vertex.get_count()`.
+
+    :param cls: The class of the vertices, e.g., Component.
+    :type cls: type
+    :rtype: int
+    """
+    return (await _query(
+        lambda: cls._count_traversal(filters, allow_disabled)
+    ))[0]
+
+async def get_connections(component, at_time=None,
+                          exclude_subcomps: bool = False):
+    """Asynchronous `Component.get_connections()`, for all the other
+    components, at time :param at_time: or, if it is None, at all times. The
+    connections, subcomponent relations and the other components are fetched
+    with a single query.
+
+    :param component: The component.
+    :type component: Component
+    :rtype: list[RelationConnection or RelationSubcomponent]
+    """
+    # Like the synchronous version, leave out the disabled components; they
+    # are filtered before project(), in which a by() must yield a result.
+    conns = __.bothE(RelationConnection.category).has("active", True) \
+              .where(__.otherV().has("active", True))
+    if at_time is not None:
+        at_time = _parse_time(at_time)
+        conns = conns.has("start_time", P.lte(at_time)) \
+                     .has("end_time", P.gt(at_time))
+
+    def build():
+        t = g.t.V(component.id()).project("conns", "subs", "supers") \
+               .by(conns.project("id", "props", "other") \
+                        .by(__.id_()).by(__.valueMap()) \
+                        .by(Component._attrs_query(__.otherV(), False, 1)) \
+                        .fold())
+        for inout in ("in", "out"):
+            if exclude_subcomps:
+                t = t.by(__.constant([]))
+                continue
+            e = __.inE(RelationSubcomponent.category) if inout == "in" \
+                else __.outE(RelationSubcomponent.category)
+            other = __.outV if inout == "in" else __.inV
+            t = t.by(e.has("active", True) \
+                      .where(other().has("active", True)) \
+                      .project("id", "other") \
+                      .by(__.id_()) \
+                      .by(Component._attrs_query(other(), False, 1)) \
+                      .fold())
+        return t
+
+    res = await _query(build)
+    if len(res) == 0:
+        raise NotInDatabase("Could not find %s in the DB." % component.name)
+    res = res[0]
+    others = await _from_attrs_list(
+        Component,
+        [r["other"] for k in ("conns", "subs", "supers") for r in res[k]]
+    )
+    others = iter(others)
+
+    result = []
+    for r in res["conns"]:
+        result.append(RelationConnection(
+            inVertex=next(others), outVertex=component,
+            start=Timestamp._from_dict(r["props"], "start_"),
+            end=Timestamp._from_dict(r["props"], "end_"),
+            id=r["id"]["@value"]["relationId"]
+        ))
+    for k in ("subs", "supers"):
+        for r in res[k]:
+            other = next(others)
+            result.append(RelationSubcomponent(
+                inVertex=component if k == "subs" else other,
+                outVertex=other if k == "subs" else component,
+                id=r["id"]["@value"]["relationId"]
+            ))
+    return result
+
+async def get_property(component, type, at_time):
+    """Asynchronous `Component.get_property()`, with the property fetched in
+    a single query.
+
+    :param component: The component.
+    :type component: Component
+    :param type: The type of the property.
+    :type type: PropertyType
+    :param at_time: The time to check the active property at.
+    :type at_time: int
+    :rtype: Property or None
+    """
+    at_time = _parse_time(at_time)
+    res = await _query(lambda: Property._attrs_query(
+        g.t.V(component.id()).outE(RelationProperty.category) \
+           .has("active", True) \
+           .has("start_time", P.lte(at_time)) \
+           .has("end_time", P.gt(at_time)).inV() \
+           .where(__.out(RelationPropertyType.category) \
+                    .has("name", type.name)),
+        False, 1
+    ))
+    if len(res) == 0:
+        return None
+    return (await _from_attrs_list(Property, res[:1]))[0]
+
+async def _write(fn, *args, **kwargs):
+    """Run :param fn: in a worker thread on a borrowed connection."""
+    async with _borrow():
+        return await _to_thread(fn, *args, **kwargs)
+
+async def add(vertex, *args, **kwargs):
+    """Asynchronous `Vertex.add()`."""
+    return await _write(vertex.add, *args, **kwargs)
+
+async def replace(vertex, newVertex, *args, **kwargs):
+    """Asynchronous `Vertex.replace()`."""
+    return await _write(vertex.replace, newVertex, *args, **kwargs)
+
+async def disable(vertex, *args, **kwargs):
+    """Asynchronous `Vertex.disable()`."""
+    return await _write(vertex.disable, *args, **kwargs)
+
+async def connect(component, other, *args, **kwargs):
+    """Asynchronous `Component.connect()`."""
+    return await _write(component.connect, other, *args, **kwargs)
+
+async def disconnect(component, other, *args, **kwargs):
+    """Asynchronous `Component.disconnect()`."""
+    return await _write(component.disconnect, other, *args, **kwargs)
+
+async def set_property(component, property, *args, **kwargs):
+    """Asynchronous `Component.set_property()`."""
+    return await _write(component.set_property, property, *args, **kwargs)
+
+async def unset_property(component, property, *args, **kwargs):
+    """Asynchronous `Component.unset_property()`."""
+    return await _write(component.unset_property, property, *args, **kwargs)
+
+def _after_fork_in_child():
+    """In a forked child, drop the semaphores, which belong to the parent's
+    event loops.
+    """
+    global _semaphores
+    _semaphores = weakref.WeakKeyDictionary()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
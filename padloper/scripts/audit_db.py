@@ -0,0 +1,36 @@
+"""
+Check the whole DB for broken invariants: duplicate names, overlapping
+connections or properties, and connections or properties to disabled vertices.
+For example:
+
+    python audit_db.py --workers 16 --output audit.json
+
+The exit status is 1 if any problem was found, so that it can be run from cron
+or CI.
+"""
+import argparse
+import sys
+import padloper as p
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the whole DB for broken invariants."
+    )
+    parser.add_argument("--workers", type=int, default=8,
+                        help="number of partitions scanned concurrently "\
+                             "(default: %(default)s)")
+    parser.add_argument("--partition-size", type=int, default=1000,
+                        help="number of components per partition "\
+                             "(default: %(default)s)")
+    parser.add_argument("--output", metavar="FILE",
+                        help="write the full report to this file as JSON")
+    args = parser.parse_args()
+
+    report = p.audit(workers=args.workers,
+                     partition_size=args.partition_size)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report.to_json(indent=2))
+
+    sys.exit(0 if report.ok() else 1)
@@ -0,0 +1,89 @@
+"""
+Check that importing padloper stays fast, e.g., for CLI tools and for forked
+web server workers. The import is timed in fresh interpreters, and the exit
+status is 1 if the median time is over the budget:
+
+    python import_time.py --budget 0.25
+
+tests.py runs the same check with check_import_time().
+
+Importing padloper must not connect to the DB, nor import the heavy libraries
+that only some functions need; those are imported when first used. Run with
+--show to see the slowest modules, from python -X importtime.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# The libraries that must not be imported by "import padloper".
+DEFERRED = ["numpy", "igraph", "sympy"]
+
+# The maximum median import time, in seconds.
+BUDGET = 0.25
+
+# The directory that contains the padloper package.
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+           os.path.realpath(__file__))))
+
+CHECK = "import sys, time; t = time.perf_counter(); import padloper; " \
+        "t = time.perf_counter() - t; " \
+        "print(t, ','.join(m for m in %r if m in sys.modules))" % DEFERRED
+
+def check_import_time(runs: int = 5):
+    """Time "import padloper" in :param runs: fresh interpreters.
+
+    :return: The median import time, in seconds, and the names of the
+        libraries in DEFERRED that were imported.
+    :rtype: tuple[float, set[str]]
+    """
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    times = []
+    loaded = set()
+    for i in range(runs):
+        out = subprocess.run([sys.executable, "-c", CHECK], env=env,
+                             check=True, capture_output=True, text=True)
+        t, *mods = out.stdout.split()
+        times.append(float(t))
+        if mods:
+            loaded.update(mods[0].split(","))
+    return statistics.median(times), loaded
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that importing padloper stays fast."
+    )
+    parser.add_argument("--budget", type=float, default=BUDGET,
+                        help="the maximum median import time, in seconds "\
+                             "(default: %(default)s)")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="number of fresh interpreters to time "\
+                             "(default: %(default)s)")
+    parser.add_argument("--show", type=int, default=0, metavar="N",
+                        help="print the N slowest modules to import")
+    args = parser.parse_args()
+
+    median, loaded = check_import_time(args.runs)
+    print("import padloper: median %.3f s over %d runs (budget %.3f s)" %\
+          (median, args.runs, args.budget))
+
+    if args.show > 0:
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                              "import padloper"],
+                             env={**os.environ, "PYTHONPATH": ROOT}, check=True,
+                             capture_output=True, text=True)
+        rows = []
+        for line in out.stderr.splitlines():
+            self_us, cumul_us, name = [x.strip() for x in \
+                                       line.split(":", 1)[1].split("|")]
+            if cumul_us.isdigit():
+                rows.append((int(cumul_us), name))
+        for cumul_us, name in sorted(rows, reverse=True)[:args.show]:
+            print("  %8.1f ms  %s" % (cumul_us / 1000, name))
+
+    failed = median > args.budget
+    if loaded:
+        print("Imported eagerly: %s" % ", ".join(sorted(loaded)))
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -1,64 +1,42 @@
-from structure import *
+"""
+Bulk load a layout into the DB from CSV or JSON files.
 
-from random import randrange, sample, randint
+Each kind of vertex or relation comes in its own file; see padloper.BulkLoader
+for the columns expected in each. For example:
 
-from time import time
+    python load_db.py --user anatoly --types types.csv \
+        --components components.csv --connections cables.csv
 
-if __name__ == "__main__":
-
-    types_count = 10
-
-    property_types_count = 3
-
-    versions_per_type_count = 5
-
-    components_per_version_count = 10
-
-    for i in range(types_count):
-        t = ComponentType(name=f"TYPE-{i}", comments=f"{i}th type")
-
-        ptypes = []
+Re-running with the same files does not add anything twice, so a load that was
+interrupted can simply be run again.
+"""
+import argparse
+import padloper as p
 
-        for k in range(property_types_count):
-            pt = PropertyType(
-                name=f"PTYPE-{i}-{k}", 
-                units="u", 
-                allowed_regex=".*", 
-                n_values=1, 
-                allowed_types=[t]
-            )
-
-            pt.add()
-            
-            ptypes.append(pt)
-
-        rev_numbers = sample(
-            range(1, 100), 
-            versions_per_type_count
-        )
-
-        for j in range(versions_per_type_count):
-            r = None
-
-            if j < versions_per_type_count - 1: 
-                r = ComponentVersion(
-                    name=f"REV-{rev_numbers[j]}",
-                    comments=f"{j}th version of {i}th type",
-                    allowed_type=t
-                )
-
-            for k in range(components_per_version_count):
-                c = Component(
-                    name=f"CMP-{i}-{j}-{k}",
-                    component_type=t,
-                    version=r
-                )
-                c.add()
-
-                for l in range(property_types_count):
-                    p = Property(
-                        values=[str(randint(0, 10))],
-                        property_type=ptypes[l]
-                    )
-                    c.add_property(p, time=int(time()), uid="Anatoly")
-                    
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk load a layout into the DB from CSV or JSON files."
+    )
+    parser.add_argument("--user", required=True,
+                        help="the user ID to record the changes under")
+    for kind in p.BULK_KINDS:
+        parser.add_argument("--%s" % kind.replace("_", "-"), dest=kind,
+                            metavar="FILE",
+                            help="file of %s" % kind.replace("_", " "))
+    parser.add_argument("--format", choices=["csv", "json"],
+                        help="the format of the files; by default, it is "\
+                             "guessed from their extensions")
+    parser.add_argument("--chunk-size", type=int, default=200,
+                        help="number of rows written per traversal "\
+                             "(default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of chunks written concurrently "\
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+
+    p.set_user(args.user)
+
+    report = p.bulk_load({kind: getattr(args, kind) for kind in p.BULK_KINDS},
+                         chunk_size=args.chunk_size, workers=args.workers,
+                         format=args.format)
+    print(report)
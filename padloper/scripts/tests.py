@@ -1,5 +1,11 @@
+import io
+import json
+import os
+import tempfile
+import time
+import numpy as np
 import padloper as p
-from gremlin_python.process.traversal import TextP
+from gremlin_python.process.traversal import P, TextP
 
 test_prefix = "padloper-scripts-tests_"
 
@@ -14,6 +20,229 @@ def nmt(name):
 
 p.set_user("test")
 
+# Test that importing padloper stays fast and does not load heavy libraries.
+print("Testing the import time.")
+from import_time import BUDGET, check_import_time
+t_import, eager = check_import_time()
+assert(len(eager) == 0), "Imported eagerly: %s" % ", ".join(sorted(eager))
+assert(t_import <= BUDGET), "Importing padloper took %.3f s." % t_import
+
+# Test the vertex cache, with stand-ins for vertices.
+print("Testing the vertex cache.")
+class CacheItem:
+    category = "test_item"
+    primary_attr = "name"
+    def __init__(self, id, name, pinned=False, active=True):
+        self._id, self.name, self.active = id, name, active
+        self._cache_pinned = pinned
+    def id(self):
+        return self._id
+
+cache = p.VertexCache(max_entries=2)
+item_1, item_2, item_3 = [CacheItem(i, "item_%d" % i) for i in (1, 2, 3)]
+pinned = CacheItem(4, "pinned", pinned=True)
+cache[1], cache[2], cache[4] = item_1, item_2, pinned
+assert(cache.get(1) is item_1) # Now item_2 is the least recently used.
+cache[3] = item_3
+assert(2 not in cache and cache.get(2) is None)
+assert(1 in cache and 3 in cache and 4 in cache)
+assert(cache.stats()["evictions"] == 1 and cache.stats()["pinned"] == 1)
+assert(cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1)
+assert(cache.peek(3) is item_3 and cache.peek(2, "none") == "none")
+assert(cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1)
+cache[5] = CacheItem(5, "item_5") # Evicts item_1, but not the pinned one.
+assert(1 not in cache and 4 in cache and len(cache) == 3)
+
+# The name index follows the cached vertices and whether they are active.
+assert(cache.find_name("test_item", "item_3") is item_3)
+assert(cache.find_name("test_item", "item_1") is None) # Evicted.
+item_3.active = False
+cache.refresh_name(item_3)
+assert(cache.find_name("test_item", "item_3") is None)
+cache[6] = CacheItem(6, "disabled", active=False)
+assert(cache.find_name("test_item", "disabled") is None)
+del cache[4]
+assert(cache.find_name("test_item", "pinned") is None)
+
+# Names are served from the index for name_ttl seconds only.
+cache = p.VertexCache(name_ttl=0.05)
+cache[1] = item_1
+assert(cache.find_name("test_item", "item_1") is item_1)
+time.sleep(0.1)
+assert(cache.find_name("test_item", "item_1") is None and 1 in cache)
+cache.refresh_name(item_1) # Reading it from the DB again indexes it again.
+assert(cache.find_name("test_item", "item_1") is item_1)
+cache = p.VertexCache(name_ttl=0)
+cache[1] = item_1
+assert(cache.find_name("test_item", "item_1") is None)
+
+# Names not in the DB are remembered for negative_ttl seconds.
+cache = p.VertexCache(negative_ttl=0.05)
+cache.mark_missing("test_item", "nothing")
+assert(cache.is_known_missing("test_item", "nothing"))
+assert(not cache.is_known_missing("test_item", "something"))
+cache["x"] = CacheItem("x", "nothing") # Adding it forgets that it was missing.
+assert(not cache.is_known_missing("test_item", "nothing"))
+cache.mark_missing("test_item", "later")
+time.sleep(0.1)
+assert(not cache.is_known_missing("test_item", "later"))
+assert(not p.VertexCache(negative_ttl=0).is_known_missing("test_item", "x"))
+
+# Test reading the rows of bulk loading files.
+print("Testing read_rows().")
+from _bulk import _iter_json
+csv_file = io.StringIO("name , type,comments\n comp_1 , type_1 ,\n"\
+                       "comp_2,type_2,\"a, b\"\n")
+assert(list(p.read_rows(csv_file, "csv")) == \
+       [{"name": "comp_1", "type": "type_1", "comments": ""},
+        {"name": "comp_2", "type": "type_2", "comments": "a, b"}])
+rows = [{"name": "comp_%d" % i, "values": ["1", "2,3"], "note": "[]"} \
+        for i in range(20)]
+assert(list(p.read_rows(io.StringIO(json.dumps(rows, indent=1)), "json")) == \
+       rows)
+json_lines = "\n".join(json.dumps(r) for r in rows) + "\n"
+assert(list(p.read_rows(io.StringIO(json_lines), "json")) == rows)
+# Objects split across reads.
+assert(list(_iter_json(io.StringIO(json_lines), read_size=7)) == rows)
+assert(list(_iter_json(io.StringIO(" [ ] "))) == [])
+try:
+    list(_iter_json(io.StringIO('[{"name": "comp_1"}, {"name": '),
+                    read_size=4))
+    raise RuntimeError("Should not be able to read a truncated JSON file!")
+except json.JSONDecodeError:
+    pass
+
+# Test answering time queries from the intervals of a component. Records are
+# (start, end, edge ID, ID of the other vertex, edge properties).
+print("Testing ComponentIntervals.")
+ivals = p.ComponentIntervals(
+    [(10, 20, "e1", 1, {}), (20, 30, "e2", 1, {}), (5, 50, "e3", 2, {}),
+     (25, 40, "e4", 3, {})],
+    {"ptype": [(10, 99, "p2", 8, {}), (0, 10, "p1", 7, {})]},
+    []
+)
+def edge_ids(records):
+    return [r[2] for r in records]
+assert(edge_ids(ivals.connections_at(4)) == [])
+assert(edge_ids(ivals.connections_at(15)) == ["e3", "e1"])
+assert(edge_ids(ivals.connections_at(20)) == ["e3", "e2"])
+assert(edge_ids(ivals.connections_at(20, others=[1])) == ["e2"])
+assert(edge_ids(ivals.connections_at(45, others=[1, 2, 3])) == ["e3"])
+assert(edge_ids(ivals.connections_at(30, others=[3, 4])) == ["e4"])
+assert(edge_ids(ivals.properties_at("ptype", 9)) == ["p1"])
+assert(edge_ids(ivals.properties_at("ptype", 10)) == ["p2"])
+assert(ivals.properties_at("ptype", 99) == [])
+assert(ivals.properties_at("other", 10) == [])
+
+# Test building the adjacency of a connection snapshot: a and b are connected,
+# and c is a subcomponent of b.
+print("Testing ConnectionSnapshot.")
+snap = p.ConnectionSnapshot(100, np.array([10, 20, 30]),
+                            np.array(["a", "b", "c"], dtype=object),
+                            np.array([[0, 1], [2, 1]]),
+                            np.array([p.SNAPSHOT_CONNECTION,
+                                      p.SNAPSHOT_SUBCOMPONENT], dtype=np.int8))
+assert(len(snap) == 3 and snap.index("c") == 2)
+assert(snap.indptr.tolist() == [0, 1, 3, 4])
+assert(snap.indices.tolist() == [1, 0, 2, 1])
+assert(snap.kinds.tolist() == [p.SNAPSHOT_CONNECTION, p.SNAPSHOT_CONNECTION,
+                               p.SNAPSHOT_SUBCOMPONENT,
+                               p.SNAPSHOT_SUPERCOMPONENT])
+assert(snap.neighbours("b") == ["a", "c"])
+assert(snap.neighbours("b", p.SNAPSHOT_SUBCOMPONENT) == ["c"])
+assert(snap.neighbours("c", p.SNAPSHOT_SUPERCOMPONENT) == ["b"])
+assert(snap.neighbours("a", p.SNAPSHOT_SUBCOMPONENT) == [])
+empty = p.ConnectionSnapshot(100, np.array([], dtype=np.int64),
+                             np.array([], dtype=object),
+                             np.zeros((0, 2), dtype=np.int64),
+                             np.array([], dtype=np.int8))
+assert(len(empty) == 0 and empty.indptr.tolist() == [0])
+
+# Test the columns of a property history, with a stand-in property type with
+# two values.
+print("Testing PropertyHistory.")
+class TwoValues:
+    name = "two_values"
+    n_values = 2
+def history(values, numeric):
+    n = len(values)
+    return p.PropertyHistory(TwoValues(), np.array([2, 1, 1, 3][:n]),
+                             np.array(["b", "a", "a", "c"][:n], dtype=object),
+                             np.array([5, 20, 10, 0][:n]),
+                             np.array([30, 99, 20, 99][:n]), values,
+                             np.array(["u"] * n, dtype=object), numeric)
+hist = history([["1", "2"], ["3", "4"], ["5", "6"], ["7"]], True)
+assert(len(hist) == 3 and hist.values.dtype == np.float64)
+assert(hist.component_name.tolist() == ["a", "a", "b"])
+assert(hist.start.tolist() == [10, 20, 5] and hist.end.tolist() == [20, 99, 30])
+assert(hist.values.tolist() == [[5, 6], [3, 4], [1, 2]])
+assert(hist.skipped == [("c", 0, ["7"])])
+assert(sorted(hist.as_dict()) == ["component_id", "component_name", "end",
+                                  "start", "uid", "value_0", "value_1"])
+hist = history([["1", "2"], ["x", "4"], ["5", "6"]], True)
+assert(hist.values.tolist() == [[5, 6], [1, 2]])
+assert(hist.skipped == [("a", 20, ["x", "4"])])
+hist = history([["1", "2"], ["x", "4"]], False)
+assert(hist.values.tolist() == [["x", "4"], ["1", "2"]] and hist.skipped == [])
+hist = history([["7"]], True)
+assert(len(hist) == 0 and hist.values.shape == (0, 2))
+for regex, numeric in [(".*", False), ("^\\d+\\.[1-9]$", True),
+                       ("-?\\d+(\\.\\d*)?([eE][-+]?\\d+)?", True),
+                       ("[A-Z]+", False), ("\\d.\\d", False),
+                       ("^[0-9]+$", True), ("[^0-9]+", False),
+                       ("\\D+", False), ("[^\\d]", False)]:
+    assert(p.PropertyType(name="t", n_values=1, allowed_regex=regex,
+                          allowed_types=[p.ComponentType(name="t")])\
+            .is_numeric() == numeric)
+
+# Test finding overlapping (start, end, ID) intervals for the audit.
+print("Testing the overlap check of the audit.")
+from _audit import _overlaps
+assert(_overlaps([]) == [])
+assert(_overlaps([(10, 20, "b"), (0, 10, "a")]) == []) # Touching is fine.
+assert(_overlaps([(15, 30, "c"), (0, 10, "a"), (40, 50, "d"),
+                  (5, 20, "b")]) == [["a", "b"], ["b", "c"]])
+assert(_overlaps([(0, 100, "a"), (10, 20, "b"), (30, 40, "c")]) == \
+       [["a", "b"], ["a", "c"]])
+
+# Test that submitting to a connection whose websockets are all busy times out,
+# with stand-ins for the connection and its client.
+print("Testing ConnectionPool.submit().")
+class BusyClient:
+    available_pool_size = 0
+class BusyConnection:
+    def __init__(self, url, traversal_source):
+        self._client = BusyClient()
+    def is_closed(self):
+        return False
+    def close(self):
+        pass
+pool = p.ConnectionPool("ws://nowhere", size=1,
+                        connection_factory=BusyConnection)
+t_submit = time.time()
+try:
+    pool.submit(None, timeout=0.05)
+    raise RuntimeError("Should not wait for a busy connection forever!")
+except TimeoutError:
+    pass
+assert(time.time() - t_submit < 1)
+assert(pool.check(timeout=0.05) == 1) # Reopened, since it did not answer.
+
+# Test that each event loop gets its own semaphore for the asynchronous API.
+print("Testing the semaphores of padloper.aio.")
+import asyncio
+import padloper.aio as pa
+async def loop_semaphore():
+    sem = pa._semaphore()
+    assert(sem is pa._semaphore())
+    async with sem:
+        pass
+    return sem
+sem_1 = asyncio.run(loop_semaphore())
+sem_2 = asyncio.run(loop_semaphore())
+assert(sem_1 is not sem_2)
+assert(len(pa._semaphores) <= 1) # That of the first, closed loop is dropped.
+
 # Start fresh by deleting any elements from the last test that may still be in
 # the database.
 print("Dropping old test vertices.")
@@ -66,6 +295,33 @@ assert(type_a == type_a_copy)
 comp_b_copy = p.Component.from_db(tnm("comp_b"))
 assert(comp_b == comp_b_copy)
 
+# A disabled vertex read from the DB must not be served by name afterwards.
+p.g._vertex_cache.pop(orig_type_a.id())
+orig_type_a_copy = p.ComponentType.from_id(orig_type_a.id(),
+                                           allow_disabled=True)
+assert(not orig_type_a_copy.active)
+try:
+    p.ComponentType.from_db(tnm("type_A"))
+    raise RuntimeError("Should not be able to get a disabled type by name!")
+except p.NotInDatabase:
+    pass
+assert(p.ComponentType.from_db(tnm("type_A"), allow_disabled=True) == \
+       orig_type_a_copy)
+
+# Nor for longer than name_ttl seconds if another client disables it.
+name_ttl = p.g._vertex_cache.name_ttl
+p.g._vertex_cache.name_ttl = 0.05
+comp_ext = p.Component(name=tnm("comp_ext"), type=type_b).add()
+assert(p.Component.from_db(tnm("comp_ext")) is comp_ext) # From the index.
+p.g.t.V(comp_ext.id()).property("active", False).iterate()
+time.sleep(0.1)
+try:
+    p.Component.from_db(tnm("comp_ext"))
+    raise RuntimeError("Should not serve a vertex disabled elsewhere!")
+except p.NotInDatabase:
+    pass
+p.g._vertex_cache.name_ttl = name_ttl
+
 # Test making connections, and ensure that errors are properly thrown if
 # components are already connected, but not thrown if connections are permitted.
 print("Making connections.")
@@ -284,3 +540,449 @@ print("    Components sorted by type ascending and then by name descending.")
 for c in p.Component.get_list(order_by=["type", ("name", "desc")]):
     print("        %s -- %s" % (c.name.replace(test_prefix, ""),
                                 c.type.name.replace(test_prefix, "")))
+
+# Test that replace() moves the properties, connections and subcomponents of a
+# component to its replacement and leaves the old vertex disabled.
+print("Testing replace().")
+rep_old = p.Component(name=tnm("comp_rep"), type=type_a,
+                      version=ver_a_a).add()
+rep_sub = p.Component(name=tnm("comp_rep_sub"), type=type_c).add()
+rep_old.subcomponent_connect(rep_sub)
+rep_old.connect(comp_b2, t1)
+rep_old.set_property(prop_2, t1)
+rep_new = rep_old.replace(p.Component(name=tnm("comp_rep_new"), type=type_a,
+                                      version=ver_a_a))
+assert(not rep_old.active and rep_old.replacement == rep_new.id())
+assert(p.g.t.V(rep_old.id()).values("active").next() == False)
+assert(p.g.t.V(rep_old.id()).values("replacement").next() == rep_new.id())
+moved = [p.RelationConnection.category, p.RelationSubcomponent.category,
+         p.RelationProperty.category]
+assert(p.g.t.V(rep_old.id()).bothE(*moved).count().next() == 0)
+# The type and version edges stay on the old vertex as well.
+assert(p.g.t.V(rep_old.id()).out(p.RelationComponentType.category).id_()\
+       .next() == type_a.id())
+assert(p.g.t.V(rep_new.id()).bothE(*moved).count().next() == 3)
+assert([c.id() for c in rep_new.get_subcomponents()] == [rep_sub.id()])
+conns = rep_new.get_connections(comp=comp_b2, exclude_subcomps=True)
+assert(len(conns) == 1 and conns[0].start.time == t1.time)
+assert(rep_new.get_property(ptype_2, t2.time).values == prop_2.values)
+assert(p.Component.from_db(tnm("comp_rep_new")) is rep_new)
+try:
+    p.Component.from_db(tnm("comp_rep"))
+    raise RuntimeError("Should not get a replaced component by name!")
+except p.NotInDatabase:
+    pass
+
+# The default disable time is when disable() is called, not when padloper was
+# imported.
+print("Testing disable().")
+time.sleep(1)
+t_disable = int(time.time())
+comp_dis = p.Component(name=tnm("comp_dis"), type=type_b).add()
+comp_dis.disable()
+assert(comp_dis.time_disabled >= t_disable)
+assert(p.g.t.V(comp_dis.id()).values("time_disabled").next() >= t_disable)
+
+# Test adding many vertices at once, with a linked vertex that is not in the DB
+# yet, a name repeated in the list and a name already in the DB.
+print("Testing add_many().")
+type_many = p.ComponentType(name=tnm("type_many"))
+many = [p.Component(name=tnm("comp_many_%d" % i), type=type_many) \
+        for i in range(5)]
+added = p.Component.add_many(
+    many + [p.Component(name=tnm("comp_many_0"), type=type_many),
+            p.Component(name=tnm("comp_b"), type=type_b)],
+    chunk_size=2
+)
+assert(added[:5] == many and added[5] is many[0])
+assert(added[6].id() == comp_b.id())
+assert(type_many.id() != p.g._VIRTUAL_ID_PLACEHOLDER)
+assert(p.g.t.V().has("name", TextP.startingWith(tnm("comp_many_")))\
+       .count().next() == 5)
+for c in many:
+    assert(p.Component.from_db(c.name) is c)
+    assert(p.g.t.V(c.id()).out(p.RelationComponentType.category).id_()\
+           .next() == type_many.id())
+try:
+    p.Component.add_many([p.Component(name=tnm("comp_many_1"),
+                                      type=type_many)], strict_add=True)
+    raise RuntimeError("Should not be able to add_many() existing vertices!")
+except p.VertexAlreadyAddedError:
+    pass
+
+# Test bulk loading, and that loading the same files again adds nothing.
+print("Testing bulk_load().")
+bulk_dir = tempfile.mkdtemp()
+def bulk_file(name, text):
+    path = os.path.join(bulk_dir, name)
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+bulk_comps = [tnm("comp_bulk_%d" % i) for i in range(4)]
+bulk_files = {
+    "types": bulk_file("types.csv", "name,comments\n%s,Bulk\n" %\
+                                    tnm("type_bulk")),
+    "versions": bulk_file("versions.csv", "name,type\n%s,%s\n" %\
+                                          (tnm("ver_bulk"), tnm("type_bulk"))),
+    "property_types": bulk_file(
+        "property_types.csv",
+        "name,units,allowed_regex,n_values,allowed_types\n%s,V,,1,%s\n" %\
+        (tnm("ptype_bulk"), tnm("type_bulk"))
+    ),
+    "components": bulk_file("components.json", json.dumps(
+        [{"name": c, "type": tnm("type_bulk"), "version": tnm("ver_bulk")} \
+         for c in bulk_comps]
+    )),
+    "properties": bulk_file(
+        "properties.csv", "component,type,values,time\n" + \
+        "".join("%s,%s,%d,%d\n" % (c, tnm("ptype_bulk"), i, t1.time) \
+                for i, c in enumerate(bulk_comps))
+    ),
+    "connections": bulk_file(
+        "connections.csv", "component1,component2,time,end_time\n" + \
+        "".join("%s,%s,%d,%d\n" % (bulk_comps[i], bulk_comps[i + 1],
+                                    t1.time, t5.time) for i in range(2))
+    ),
+    "subcomponents": bulk_file("subcomponents.csv",
+                               "component,subcomponent\n%s,%s\n" %\
+                               (bulk_comps[0], bulk_comps[3]))
+}
+def bulk_edges():
+    return p.g.t.V().has("name", P.within(*bulk_comps)) \
+                .bothE(p.RelationProperty.category,
+                       p.RelationConnection.category,
+                       p.RelationSubcomponent.category).count().next()
+report = p.bulk_load(bulk_files, chunk_size=2, workers=2)
+assert(report.rows == 14 and report.written == 14 and report.skipped == 0)
+assert(len(report.failures) == 0), str(report)
+n_edges = bulk_edges()
+assert(n_edges == 4 + 2 * 2 + 2)
+assert(p.Component.from_db(bulk_comps[2]).type.name == tnm("type_bulk"))
+# The second time, the vertex rows are skipped and the edge rows find their
+# edges already there.
+report = p.bulk_load(bulk_files, chunk_size=2, workers=2)
+assert(report.rows == 14 and report.skipped == 7 and report.written == 7)
+assert(len(report.failures) == 0), str(report)
+assert(bulk_edges() == n_edges)
+assert(p.g.t.V().has("name", TextP.startingWith(tnm("comp_bulk_"))).count()\
+       .next() == 4)
+
+# Test upserting: the same name twice gives the same vertex, and linked vertices
+# not yet in the DB are added with it.
+print("Testing upsert().")
+type_ups = p.ComponentType(name=tnm("type_ups"))
+ver_ups = p.ComponentVersion(name=tnm("ver_ups"), type=type_ups)
+comp_ups = p.Component(name=tnm("comp_ups"), type=type_ups, version=ver_ups)
+assert(comp_ups.upsert() is comp_ups)
+assert(type_ups.id() != p.g._VIRTUAL_ID_PLACEHOLDER)
+assert(ver_ups.id() != p.g._VIRTUAL_ID_PLACEHOLDER)
+assert(p.g.t.V(comp_ups.id()).out(p.RelationVersion.category).id_().next() \
+       == ver_ups.id())
+again = p.Component(name=tnm("comp_ups"), type=type_ups, version=ver_ups)
+assert(again.upsert() is comp_ups)
+assert(again.id() == p.g._VIRTUAL_ID_PLACEHOLDER)
+# Also when the name index cannot answer, and with linked vertices that are not
+# in the DB: these must not be added, since nothing is.
+p.g._vertex_cache.pop(comp_ups.id())
+again = p.Component(name=tnm("comp_ups"),
+                    type=p.ComponentType(name=tnm("type_ups_2")))
+assert(again.upsert().id() == comp_ups.id())
+assert(p.g.t.V().has("name", tnm("type_ups_2")).count().next() == 0)
+# add() takes the same path unless strict_check is False.
+assert(p.Component(name=tnm("comp_ups"), type=type_ups).add().id() == \
+       comp_ups.id())
+try:
+    p.Component(name=tnm("comp_ups"), type=type_ups).add(strict_add=True)
+    raise RuntimeError("Should not be able to add the same component again!")
+except p.VertexAlreadyAddedError:
+    pass
+comp_ups_2 = p.Component(name=tnm("comp_ups_2"),
+                         type=p.ComponentType(name=tnm("type_ups_3"))).add()
+assert(p.ComponentType.from_db(tnm("type_ups_3")).id() == \
+       comp_ups_2.type.id())
+assert(p.g.t.V().has("name", P.within(tnm("comp_ups"), tnm("comp_ups_2")))\
+       .count().next() == 2)
+
+# Test connection snapshots, on the components loaded in bulk.
+print("Testing connection_snapshot().")
+snap = p.connection_snapshot(t2, types=[tnm("type_bulk")])
+assert(len(snap) == 4 and len(snap.edges) == 3)
+assert(sorted(snap.names) == bulk_comps)
+assert(sorted(snap.neighbours(bulk_comps[1])) == bulk_comps[:1] + \
+       bulk_comps[2:3])
+assert(snap.neighbours(bulk_comps[0], p.SNAPSHOT_SUBCOMPONENT) == \
+       [bulk_comps[3]])
+assert(snap.neighbours(bulk_comps[3], p.SNAPSHOT_SUPERCOMPONENT) == \
+       [bulk_comps[0]])
+assert(snap.neighbours(bulk_comps[0], p.SNAPSHOT_CONNECTION) == \
+       [bulk_comps[1]])
+# After the connections end, only the subcomponent relation is left.
+snap = p.connection_snapshot(t6.time, types=[tnm("type_bulk")])
+assert(sorted(snap.names) == [bulk_comps[0], bulk_comps[3]])
+assert(list(snap.edge_kinds) == [p.SNAPSHOT_SUBCOMPONENT])
+
+# Test tracing chains, along 0 - 1 - 2 - 3 with a cycle closed by 3 - 1.
+print("Testing trace_chain().")
+chain = [p.Component(name=tnm("comp_chain_%d" % i),
+                     type=type_c if i == 2 else type_b).add() for i in range(4)]
+for i, j in ((0, 1), (1, 2), (2, 3), (3, 1)):
+    chain[i].connect(chain[j], t1)
+def chain_paths(paths):
+    for comps, conns in paths:
+        assert(len(conns) == len(comps) - 1)
+        for c, a, b in zip(conns, comps, comps[1:]):
+            assert(set((c.inVertex.id(), c.outVertex.id())) == \
+                   set((a.id(), b.id())))
+    return sorted(tuple(int(nmt(c.name)[-1]) for c in comps) \
+                  for comps, conns in paths)
+# The cycle is not followed round: each path ends where every neighbour is
+# already on it.
+assert(chain_paths(chain[0].trace_chain(t2)) == [(0, 1, 2, 3), (0, 1, 3, 2)])
+assert(chain_paths(chain[0].trace_chain(t2, stop_types=[type_c])) == \
+       [(0, 1, 2), (0, 1, 3, 2)])
+assert(chain_paths(chain[0].trace_chain(t2, max_depth=2)) == \
+       [(0, 1, 2), (0, 1, 3)])
+assert(chain[0].trace_chain(t1.time - 1) == []) # Not connected yet.
+
+# Test the neighbourhood of a component, with a diamond 1 - 2 - 4 - 3 - 1 so
+# that component 4 is reached twice in the same hop.
+print("Testing connection_graph().")
+chain.append(p.Component(name=tnm("comp_chain_4"), type=type_b).add())
+chain[2].connect(chain[4], t1)
+chain[3].connect(chain[4], t1)
+cg = chain[1].connection_graph(t2, depth=2)
+assert(sorted(n["name"] for n in cg["nodes"]) == [c.name for c in chain])
+assert(len(set(e["id"] for e in cg["edges"])) == len(cg["edges"]) == 6)
+cg = chain[1].connection_graph(t2.time)
+assert(sorted(n["name"] for n in cg["nodes"]) == \
+       [chain[i].name for i in (0, 1, 2, 3)])
+assert(len(cg["edges"]) == 3 and not any(e["subcomponent"] \
+                                         for e in cg["edges"]))
+
+# Test the history of a property type, with a property changed on one
+# component of type_a and set on one of type_b.
+print("Testing history().")
+ptype_hist = p.PropertyType(name=tnm("ptype_hist"), units="V", n_values=1,
+                            allowed_regex="^-?\\d+$",
+                            allowed_types=[type_a, type_b]).add()
+comp_hist_1 = p.Component(name=tnm("comp_hist_1"), type=type_a).add()
+comp_hist_2 = p.Component(name=tnm("comp_hist_2"), type=type_b).add()
+comp_hist_1.set_property(p.Property(type=ptype_hist, values="1").add(), t1,
+                         end=t3)
+comp_hist_1.set_property(p.Property(type=ptype_hist, values="2").add(), t3)
+comp_hist_2.set_property(p.Property(type=ptype_hist, values="5").add(), t2)
+def hist_rows(hist):
+    assert(hist.values.dtype == np.float64)
+    return sorted(zip([nmt(n) for n in hist.component_name],
+                      hist.start.tolist(), hist.end.tolist(),
+                      hist.values[:, 0].tolist()))
+no_end = p.g._TIMESTAMP_NO_ENDTIME_VALUE
+assert(hist_rows(ptype_hist.history()) == \
+       [("comp_hist_1", t1.time, t3.time, 1.0),
+        ("comp_hist_1", t3.time, no_end, 2.0),
+        ("comp_hist_2", t2.time, no_end, 5.0)])
+assert(hist_rows(ptype_hist.history(from_time=t3.time)) == \
+       [("comp_hist_1", t3.time, no_end, 2.0),
+        ("comp_hist_2", t2.time, no_end, 5.0)])
+assert(hist_rows(ptype_hist.history(to_time=t2.time)) == \
+       [("comp_hist_1", t1.time, t3.time, 1.0)])
+assert(hist_rows(ptype_hist.history(component_type=type_b)) == \
+       [("comp_hist_2", t2.time, no_end, 5.0)])
+assert(len(ptype_hist.history(component_type=tnm("type_a"),
+                              batch_size=1)) == 2)
+
+# Test the differences between two times, on a connection, a property and a
+# flag made in August.
+print("Testing diff().")
+u1 = p.Timestamp.from_cal(2023, 8, 1, 12, 0, 0)
+u2 = p.Timestamp.from_cal(2023, 8, 2, 12, 0, 0)
+u3 = p.Timestamp.from_cal(2023, 8, 3, 12, 0, 0)
+u4 = p.Timestamp.from_cal(2023, 8, 4, 12, 0, 0)
+comp_diff_1 = p.Component(name=tnm("comp_diff_1"), type=type_b).add()
+comp_diff_2 = p.Component(name=tnm("comp_diff_2"), type=type_b).add()
+comp_diff_1.connect(comp_diff_2, u2, end=u3)
+comp_diff_1.set_property(p.Property(type=ptype_hist, values="7").add(), u2)
+flag_diff = p.Flag(type=ftype_weather, severity=fsev_info, notes="Diff",
+                   start=u2, end=u4, components=[comp_diff_1]).add()
+diff_names = [comp_diff_1.name, comp_diff_2.name]
+def diff_changes(d):
+    # Only look at the changes made here, in case the DB holds others.
+    return {
+        "connections_added": [(sorted(r["components"]), r["time"]) \
+                              for r in d["connections_added"] \
+                              if sorted(r["components"]) == diff_names],
+        "connections_removed": [(sorted(r["components"]), r["time"]) \
+                                for r in d["connections_removed"] \
+                                if sorted(r["components"]) == diff_names],
+        "properties_set": [(r["component"], r["values"], r["time"]) \
+                           for r in d["properties_set"] \
+                           if r["component"] in diff_names],
+        "properties_ended": [r for r in d["properties_ended"] \
+                             if r["component"] in diff_names],
+        "flags_started": [(r["id"], r["time"]) for r in d["flags_started"] \
+                          if r["id"] == flag_diff.id()],
+        "flags_ended": [(r["id"], r["time"]) for r in d["flags_ended"] \
+                        if r["id"] == flag_diff.id()]
+    }
+d = p.diff(u1, u3)
+assert(d["from"] == u1.time and d["to"] == u3.time)
+assert(diff_changes(d) == {
+    "connections_added": [(diff_names, u2.time)],
+    "connections_removed": [(diff_names, u3.time)], # t2 is inclusive.
+    "properties_set": [(comp_diff_1.name, ["7"], u2.time)],
+    "properties_ended": [],
+    "flags_started": [(flag_diff.id(), u2.time)],
+    "flags_ended": []
+})
+# t1 is exclusive.
+assert(diff_changes(p.diff(u3.time, u4.time)) == {
+    "connections_added": [], "connections_removed": [], "properties_set": [],
+    "properties_ended": [], "flags_started": [],
+    "flags_ended": [(flag_diff.id(), u4.time)]
+})
+try:
+    p.diff(u2, u1)
+    raise RuntimeError("Should not be able to diff a backwards time range!")
+except ValueError:
+    pass
+
+# Test the change feed: what is written after a watermark is returned by the
+# next call, once, in batches, and an overlap reads the changes before the
+# watermark again.
+print("Testing changes_since().")
+def feed(watermark, **kwargs):
+    batches, new_watermark = p.changes_since(watermark, batch_size=3, **kwargs)
+    records = []
+    for batch in batches:
+        assert(0 < len(batch) <= 3)
+        records.extend(batch)
+    keys = [(r["element"], r["id"]) for r in records]
+    assert(len(keys) == len(set(keys))) # Nothing twice within a call.
+    return {r["id"]: r for r in records}, new_watermark
+# Edit times are in seconds, so wait for the next second before each write.
+_, w1 = p.changes_since()
+time.sleep(1.1)
+comp_feed_1 = p.Component(name=tnm("comp_feed_1"), type=type_b).add()
+comp_feed_2 = p.Component(name=tnm("comp_feed_2"), type=type_b).add()
+comp_feed_1.connect(comp_feed_2, t1)
+conn_feed = comp_feed_1.get_connections(comp=comp_feed_2)[0]
+changes, w2 = feed(w1, overlap=0)
+assert(comp_feed_1.id() in changes and comp_feed_2.id() in changes)
+assert(changes[conn_feed.id()]["category"] == p.RelationConnection.category)
+assert(changes[comp_feed_1.id()]["properties"]["name"] == comp_feed_1.name)
+assert(comp_b.id() not in changes)
+time.sleep(1.1)
+comp_feed_3 = p.Component(name=tnm("comp_feed_3"), type=type_b).add()
+comp_feed_2.disable()
+changes, w3 = feed(w2, overlap=0)
+assert(comp_feed_3.id() in changes and comp_feed_1.id() not in changes)
+assert(changes[comp_feed_2.id()]["properties"]["active"] == False)
+assert(changes[conn_feed.id()]["properties"]["active"] == False)
+assert(w3 >= w2 >= w1)
+# With the default overlap, the earlier changes are read again.
+changes, _ = feed(w2)
+assert(comp_feed_1.id() in changes and comp_feed_3.id() in changes)
+
+# Test that as_dict(), built with one traversal, gives what the per-edge
+# queries and TimestampedEdge.as_dict() give, on a component with a property,
+# a connection, a flag, a subcomponent and a supercomponent.
+print("Testing Component.as_dict().")
+p.Flag(type=ftype_history, severity=fsev_info, notes="Replaced.", start=t1,
+       components=[rep_new]).add()
+p.Component(name=tnm("comp_rep_super"), type=type_c).add()\
+ .subcomponent_connect(rep_new)
+def canonical(dicts):
+    return sorted(dicts, key=lambda d: json.dumps(d, sort_keys=True,
+                                                  default=str))
+per_edge = {
+    "properties": [{**prop.as_dict(), **rel.as_dict()} \
+                   for prop, rel in rep_new.get_all_properties()],
+    "connections": [{"name": c.other_vertex(rep_new).name, **c.as_dict()} \
+                    for c in rep_new.get_connections(exclude_subcomps=True)],
+    "flags": [f.as_dict() for f in rep_new.get_all_flags()],
+    "subcomps": [{"name": c.name} for c in rep_new.get_subcomponents()],
+    "supercomps": [{"name": c.name} for c in rep_new.get_supercomponents()]
+}
+d = rep_new.as_dict()
+assert(set(d) == set(rep_new.as_dict(bare=True)) | set(per_edge))
+for key, val in per_edge.items():
+    assert(len(val) == 1), key
+    assert(canonical(d[key]) == canonical(val)), key
+# At a time, only what is in effect then is included.
+d = rep_new.as_dict(at_time=t2)
+for key, val in per_edge.items():
+    assert(canonical(d[key]) == canonical(val)), key
+d = rep_new.as_dict(at_time=t1.time - 1)
+assert(d["properties"] == d["connections"] == d["flags"] == [])
+assert(d["subcomps"] == per_edge["subcomps"])
+
+# Test the igraph export and the analyses on it, on the components loaded in
+# bulk (connected 0 - 1 - 2, with 3 a subcomponent of 0) and the chain.
+print("Testing to_igraph().")
+gr = p.to_igraph(t2, include_properties=[ptype_hist])
+bulk_vs = [gr.vs.find(name=c) for c in bulk_comps]
+assert([v["type"] for v in bulk_vs] == [tnm("type_bulk")] * 4)
+assert([v["id"] for v in bulk_vs] == \
+       [p.Component.from_db(c).id() for c in bulk_comps])
+assert(gr.vs.find(name=comp_hist_1.name)[ptype_hist.name] == "1")
+assert(gr.vs.find(name=comp_hist_2.name)[ptype_hist.name] == "5")
+assert(bulk_vs[0][ptype_hist.name] is None)
+assert(p.connection_path(gr, bulk_comps[0], bulk_comps[2]) == bulk_comps[:3])
+assert(p.connection_path(gr, bulk_comps[0], bulk_comps[3]) == [])
+path = p.connection_path(gr, chain[0].name, chain[4].name)
+assert(path[:2] == [chain[0].name, chain[1].name] and len(path) == 4)
+assert(path[2] in (chain[2].name, chain[3].name) and path[3] == chain[4].name)
+groups = p.connected_groups(gr)
+assert(sorted(next(grp for grp in groups if bulk_comps[0] in grp)) == \
+       bulk_comps[:3])
+assert(sorted(next(grp for grp in groups if chain[0].name in grp)) == \
+       [c.name for c in chain])
+orphans = p.orphaned_components(gr)
+assert(bulk_comps[3] in orphans and bulk_comps[0] not in orphans)
+assert(rep_old.name not in gr.vs["name"]) # Disabled.
+
+# Test getting the values of a property type on many components at once.
+print("Testing values_at().")
+def ours(values):
+    return {nmt(k): v for k, v in values.items() if k.startswith(test_prefix)}
+assert(ours(ptype_hist.values_at(None, t2.time)) == \
+       {"comp_hist_1": ["1"], "comp_hist_2": ["5"]})
+assert(ours(ptype_hist.values_at(None, t3, batch_size=1)) == \
+       {"comp_hist_1": ["2"], "comp_hist_2": ["5"]}) # Changed at t3.
+assert(ours(ptype_hist.values_at(None, u2)) == \
+       {"comp_hist_1": ["2"], "comp_hist_2": ["5"], "comp_diff_1": ["7"]})
+assert(ptype_hist.values_at([comp_hist_1], t2) == {comp_hist_1.name: ["1"]})
+assert(ours(ptype_hist.values_at(type_b, t2)) == {"comp_hist_2": ["5"]})
+assert(ours(ptype_hist.values_at(tnm("type_a"), t2)) == {"comp_hist_1": ["1"]})
+assert(ptype_hist.values_at([], t2) == {})
+assert(ptype_hist.values_at([comp_hist_2], t1) == {}) # Not set yet.
+
+# Test the audit, on two overlapping connections whose component with the
+# smaller ID was disabled without disabling them.
+print("Testing audit().")
+comp_aud_1 = p.Component(name=tnm("comp_aud_1"), type=type_b).add()
+comp_aud_2 = p.Component(name=tnm("comp_aud_2"), type=type_b).add()
+if comp_aud_1.id() > comp_aud_2.id():
+    comp_aud_1, comp_aud_2 = comp_aud_2, comp_aud_1
+for start, end in ((t1, t5), (t2, t6)):
+    p.RelationConnection(inVertex=comp_aud_1, outVertex=comp_aud_2,
+                         start=start, end=end).add()
+p.g.t.V(comp_aud_1.id()).property("active", False).iterate()
+report = p.audit(workers=2, partition_size=100)
+overlaps = [i for i in report.issues \
+            if i["check"] == "overlapping_connections" and \
+               comp_aud_2.id() in [c["id"] for c in i["components"]]]
+assert(len(overlaps) == 1 and len(overlaps[0]["edges"]) == 2)
+assert(len([i for i in report.issues if i["check"] == "dangling_connections" \
+            and i["component"]["id"] == comp_aud_2.id()]) == 2)
+
+# Test streaming results in several batches.
+print("Testing _stream_traversal().")
+q = p.g.t.V().has("name", TextP.startingWith(tnm("comp_"))).id_()
+all_ids = q.clone().toList()
+assert(len(all_ids) > 6)
+assert(sorted(p.g._stream_traversal(q.clone(), 3)) == sorted(all_ids))
+pool = p.connection_pool()
+res = pool.submit(p.g.t.inject(1, 2).bytecode, timeout=5).all().result()
+assert([r.object for r in res] == [1, 2]) # As traversers.
+assert(pool.check() == 0)